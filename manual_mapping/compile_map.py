@@ -0,0 +1,17 @@
+# compile a map folder (assets/matrix/<map>) into a binary map bundle
+# usage: python manual_mapping/compile_map.py [assets/matrix/<map>]
+#
+# Maze loads <map>/maze.bundle instead of parsing the csv files as long as the
+# bundle was compiled from the current csv files.
+
+import sys
+
+from generative_agents.simulation.maze import BASE_PATH, Maze
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else BASE_PATH
+
+    maze = Maze(folder, use_bundle=False)
+    bundle_path = maze.save_bundle(folder)
+
+    print(f"compiled {len(maze.address_tiles)} addresses of {maze.maze_name} to {bundle_path}")
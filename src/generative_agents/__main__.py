@@ -1,35 +1,67 @@
 import asyncio
+import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import os
 import json
-from time import sleep, time
-from typing import List
+from time import sleep
+from typing import Deque, List, Optional
 from generative_agents import global_state
 
 from generative_agents.communication import api
 from generative_agents.communication.models import AgentDTO, RoundUpdateDTO
 from generative_agents.core.agent import Agent, AgentRunner
 from generative_agents.core.memory.spatial import MemoryTree
-from generative_agents.persistence.database import initialize_database
+from generative_agents.persistence.database import compact_memories, flush_accesses, initialize_database, restore_snapshot, save_snapshot
+from generative_agents.persistence.snapshot import exists as snapshot_exists
 from generative_agents.simulation.maze import Maze, BASE_PATH
+from generative_agents.simulation.scheduler import RoundScheduler
 
 
 class RoundUpdateSnapshots():
-    def __init__(self):
-        self.rounds = []
+    """
+    Keeps the round updates of the last <capacity> rounds. Older rounds are dropped,
+    or appended as json lines to <spill_path> if given.
+    """
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None):
+        self.rounds: Deque[RoundUpdateDTO] = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self._round_count = 0
 
     def add(self, time, agents: List[Agent]):
         agents_dto = [agent_runner.agent.to_dto() for agent_runner in agents.values()]
 
         converted_date_time = time.as_string()
         round_update = RoundUpdateDTO(
-            round=len(self.rounds), time=converted_date_time, agents=agents_dto)
-        self.rounds += [round_update]
+            round=self._round_count, time=converted_date_time, agents=agents_dto)
+
+        if self.spill_path and len(self.rounds) == self.rounds.maxlen:
+            with open(self.spill_path, "a") as f:
+                f.write(self.rounds[0].json() + "\n")
+
+        self.rounds.append(round_update)
+        self._round_count += 1
 
     def get(self, round: int):
-        return self.rounds[round]
+        if round < 0:
+            return self.rounds[round]
+
+        first_round = self._round_count - len(self.rounds)
+        if round >= first_round:
+            return self.rounds[round - first_round]
+
+        if self.spill_path and os.path.exists(self.spill_path):
+            with open(self.spill_path, "r") as f:
+                for line in f:
+                    round_update = RoundUpdateDTO(**json.loads(line))
+                    if round_update.round == round:
+                        return round_update
+
+        raise Exception(f"round {round} is no longer available")
 
     def get_all(self):
-        return self.rounds
+        """ returns the rounds that are still held in memory """
+        return list(self.rounds)
 
     @property
     def last(self):
@@ -37,16 +69,36 @@ class RoundUpdateSnapshots():
 
     @property
     def current_round(self):
-        return len(self.rounds)
+        return self._round_count
 
 
 
 class Simulation():
-    def __init__(self, round_updates: RoundUpdateSnapshots):
+    def __init__(self, round_updates: RoundUpdateSnapshots, max_concurrency: int = 4,
+                 snapshot_directory: Optional[str] = None, snapshot_every: int = 10,
+                 compact_every: int = 50):
+        """
+        ARGS:
+            snapshot_directory: if given, the agents' memories are saved there every
+                                <snapshot_every> rounds and an existing snapshot is resumed
+            compact_every: the agents' memories are compacted in the background every
+                           <compact_every> rounds, 0 disables the compaction
+        """
         self.maze = Maze()
+        self.scheduler = RoundScheduler(max_concurrency=max_concurrency)
         self.agents: List[Agent] = dict()
         self.__vision_start_tile = self.maze.get_random_tile()
-        initialize_database(True)
+        self.snapshot_directory = snapshot_directory
+        self.snapshot_every = snapshot_every
+        self.compact_every = compact_every
+        self._compaction_executor = ThreadPoolExecutor(max_workers=1)
+        self._compaction: Optional[Future] = None
+
+        state = {}
+        if snapshot_directory and snapshot_exists(snapshot_directory):
+            state = self.resume(snapshot_directory)
+        else:
+            initialize_database(True)
 
         # load the agents file
         with open(os.path.join(BASE_PATH, "agents/agent_backstory.json"), "r") as f:
@@ -60,10 +112,41 @@ class Simulation():
                                                                 emoji=agent['emoji'],
                                                                 activity="idle",
                                                                 description=agent['description'])
+            # agents of a restored snapshot continue with their plans and actions
+            if agent['name'] in state.get("agents", {}):
+                self.agents[agent['name']].agent.restore_state(state["agents"][agent['name']], self.maze)
         #[tile for tile in maze.address_tiles if "the Ville:artist's co-living space:Abigail Chen" in tile]
  
         self.round_updates = round_updates
 
+    def resume(self, snapshot_directory: str) -> dict[str, any]:
+        state = restore_snapshot(snapshot_directory)
+
+        if "time" in state:
+            global_state.time.time = datetime.datetime.fromisoformat(state["time"])
+            global_state.tick = state["tick"]
+        print(f"resumed snapshot {snapshot_directory} at tick {global_state.tick}")
+        return state
+
+    def save_snapshot(self):
+        written = save_snapshot(self.snapshot_directory, {"tick": global_state.tick,
+                                                          "time": global_state.time.time.isoformat(),
+                                                          "agents": {name: agent_runner.agent.to_state()
+                                                                     for name, agent_runner in self.agents.items()}})
+        print(f"saved {written} changed memories to {self.snapshot_directory}")
+
+    def compact_memories(self):
+        # a compaction still running from an earlier round is not started twice
+        if self._compaction and not self._compaction.done():
+            return
+
+        def run(current_time):
+            stats = compact_memories(current_time)
+            print(f"compacted memories: {stats['expired']} expired, {stats['merged']} merged, "
+                  f"{stats['cold']} moved to the cold tier")
+
+        self._compaction = self._compaction_executor.submit(run, global_state.time.time)
+
     def initialize_agent(self, name, age, innate_traits, location, emoji, activity, description): 
         agent = Agent(name=name, age=age, time=global_state.time, innate_traits=innate_traits, location=location, emoji=emoji, activity=activity, tile=self.maze.address_tiles[location][-1], tree=self.initialize_visible_memory_tree(), description=description)
         return AgentRunner(agent)
@@ -84,44 +167,15 @@ class Simulation():
         global_state.time.tick()
         print(
             f"round: {self.round_updates.current_round} time: {global_state.time.as_string()}")
-        
-        agents = [agent.agent for agent in self.agents.values()]
-
-        for name, agent_runner in self.agents.items():
-            start = time()
-            print(f"scheduling update for {name}")
-            agent = agent_runner.agent
-
-            next_tile = agent_runner.update(global_state.time, self.maze, agents)
-            old_tile = agent.scratch.tile
-
-            while agent.scratch.finished_action:
-                action = agent.scratch.finished_action.pop(0)
-                if action.event.subject in old_tile.events:
-                    del old_tile.events[action.event.subject]
-
-            event = agent.scratch.action.event
-            next_tile.events[event.subject] = agent.scratch.action.event
-            
-            object_action = agent.scratch.action.object_action
-            if object_action and object_action.event:
-                object_event = object_action.event
-                if object_action.address in self.maze.address_tiles:
-                    self.maze.address_tiles[object_action.address][0].events[object_event.subject] = object_event
-                else:
-                    print(f"WARNING: {object_action.address} not in maze")
-
-            agent.scratch.tile = next_tile
-            
-            print(agent.name.center(80, "-"))
-            if old_tile != next_tile:
-                print(f"{agent.scratch.name} moved from {old_tile} to {next_tile}")
-            else:
-                print(f"{agent.scratch.name} is still at {next_tile}")
-            print(f"{agent.scratch.name} is {agent.emoji}")
-            print(f"{agent.scratch.name} is {agent.description}")
-
-            print("updated agent in: ", time() - start, " seconds")
+
+        self.scheduler.run_round(self.agents, self.maze)
+        flush_accesses()
+
+        if self.snapshot_directory and global_state.tick % self.snapshot_every == 0:
+            self.save_snapshot()
+
+        if self.compact_every and global_state.tick % self.compact_every == 0:
+            self.compact_memories()
 
         updated_agents = {name: agent_runner.agent for name, agent_runner in self.agents.items()}
         self.round_updates.add(global_state.time, self.agents)
@@ -3,7 +3,7 @@ from typing import Callable, Coroutine, Dict, Set, Tuple
 from aiohttp import web
 import socketio
 
-from .models import AgentDTO
+from .models import AgentDTO, RoundDeltaDTO, RoundUpdateDTO
 
 from gevent import pywsgi
 
@@ -16,6 +16,12 @@ app = socketio.WSGIApp(sio)
 spawn_agent: Callable = None
 update_simulation: Callable = None
 
+# every <keyframe_interval> rounds the full round update is sent as 'update', the
+# rounds in between only send the changes to the previous round as 'delta'
+keyframe_interval = 10
+last_update: RoundUpdateDTO = None
+last_keyframe: int = None
+
 @sio.event
 def spawn(sid, data: AgentDTO):
     if not spawn_agent:
@@ -27,21 +33,41 @@ def spawn(sid, data: AgentDTO):
 def watch(sid):
     print("Client attached to server", sid)
     sids.add(sid)
+    keyframe(sid)
+
+@sio.event
+def keyframe(sid):
+    """ Sends the full state to a client that attached late or missed deltas. """
+    if last_update:
+        sio.emit('update', last_update.dict(), to=sid)
 
 def updater():
+    global last_update
+    global last_keyframe
+
     while True:   
         update = update_simulation()
-        # emit pydantic model as json dict
-        sio.emit('update', update.dict())
+
+        if last_update is None or update.round - last_keyframe >= keyframe_interval:
+            # emit pydantic model as json dict
+            sio.emit('update', update.dict())
+            last_keyframe = update.round
+        else:
+            delta = RoundDeltaDTO.between(last_update, update, keyframe=last_keyframe)
+            sio.emit('delta', delta.dict(exclude_none=True))
+
+        last_update = update
         sio.sleep(0.01)
 
 def init_app():
     sio.start_background_task(updater)
     return app
 
-def start(update: Callable, spawn_agent_function: Callable):
+def start(update: Callable, spawn_agent_function: Callable, keyframe_every: int = 10):
     global spawn_agent
     global update_simulation
+    global keyframe_interval
     spawn_agent = spawn_agent_function
     update_simulation = update
+    keyframe_interval = keyframe_every
     pywsgi.WSGIServer(('', 8000), init_app()).serve_forever()
\ No newline at end of file
@@ -1,4 +1,6 @@
-from typing import List
+from array import array
+import sys
+from typing import List, Optional
 from pydantic import BaseModel
 
 class MovementDTO(BaseModel):
@@ -18,4 +20,60 @@ class AgentDTO(BaseModel):
 class RoundUpdateDTO(BaseModel):
     round: int
     time: str
-    agents: List[AgentDTO]
\ No newline at end of file
+    agents: List[AgentDTO]
+
+
+# fields of an agent whose changes are sent in a RoundDeltaDTO
+_TRACKED_FIELDS = ("location", "emoji", "activity", "description")
+
+
+class AgentChangeDTO(BaseModel):
+    name: str
+    location: Optional[str] = None
+    emoji: Optional[str] = None
+    activity: Optional[str] = None
+    description: Optional[str] = None
+
+class RoundDeltaDTO(BaseModel):
+    """
+    Changes of a round relative to the previous round. <positions> holds the new
+    (col, row) of the agents in <moved> as little endian uint16 pairs.
+    """
+    round: int
+    time: str
+    keyframe: int
+    moved: List[str] = []
+    positions: bytes = b""
+    changed: List[AgentChangeDTO] = []
+    added: List[AgentDTO] = []
+    removed: List[str] = []
+
+    @classmethod
+    def between(cls, previous: RoundUpdateDTO, current: RoundUpdateDTO, keyframe: int) -> 'RoundDeltaDTO':
+        previous_agents = {agent.name: agent for agent in previous.agents}
+        current_names = {agent.name for agent in current.agents}
+
+        delta = cls(round=current.round, time=current.time, keyframe=keyframe,
+                    removed=[name for name in previous_agents if name not in current_names])
+        positions = array("H")
+
+        for agent in current.agents:
+            old = previous_agents.get(agent.name)
+            if not old:
+                delta.added.append(agent)
+                continue
+
+            if agent.movement != old.movement:
+                delta.moved.append(agent.name)
+                positions.extend((agent.movement.col, agent.movement.row))
+
+            changes = {field: getattr(agent, field) for field in _TRACKED_FIELDS
+                       if getattr(agent, field) != getattr(old, field)}
+            if changes:
+                delta.changed.append(AgentChangeDTO(name=agent.name, **changes))
+
+        if sys.byteorder != "little":
+            positions.byteswap()
+        delta.positions = positions.tobytes()
+
+        return delta
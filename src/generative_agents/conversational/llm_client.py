@@ -0,0 +1,214 @@
+import asyncio
+from concurrent.futures import Future
+import json
+import threading
+from typing import Optional
+
+import aiohttp
+from haystack import component
+
+
+class JsonObjectTracker:
+    """
+    Follows a reply token by token and detects where its top-level JSON object is
+    closed. Braces inside strings, including escaped quotes, are ignored. Text in
+    front of the object, e.g. whitespace, is skipped.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.length = 0
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        Consumes the next piece of the reply. Returns the length of the reply up to and
+        including the closing brace of the top-level object, once it is closed.
+        """
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return self.length + i + 1
+
+        self.length += len(text)
+        return None
+
+
+class LLMClient:
+    """
+    Client for the OpenAI compatible chat completion endpoint of the llama.cpp server.
+
+    All requests go through one event loop running in a background thread and one
+    pooled aiohttp session, and every prompt is sent as its own request. Batching
+    happens on the server, which decodes the concurrent requests of its parallel slots
+    together. At most max_in_flight requests are open at any time; everything else
+    waits in the client.
+
+    The client can be used from synchronous code (generate) and from other threads
+    (submit).
+
+    Requests with "stream": True in their generation kwargs are streamed: the reply
+    is followed while it is generated and the stream is closed as soon as the
+    top-level JSON object is complete, which makes the server stop generating
+    instead of running on to max_tokens.
+    """
+
+    def __init__(self, api_base_url: str, model: str, generation_kwargs: dict[str, any] = None,
+                 api_key: str = "secret", max_in_flight: int = 8, timeout: float = 600):
+        self.api_base_url = api_base_url.rstrip("/")
+        self.model = model
+        self.generation_kwargs = generation_kwargs or {}
+        self.api_key = api_key
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+    def generate(self, prompt: str, generation_kwargs: dict[str, any] = None) -> dict[str, list]:
+        """
+        Blocking call, returns {"replies": [...], "meta": [...]} like the haystack generators.
+        """
+        return self.submit(prompt, generation_kwargs).result()
+
+    def submit(self, prompt: str, generation_kwargs: dict[str, any] = None) -> Future:
+        """
+        Sends the prompt once a request slot is free and returns a future of the reply.
+        """
+        self._ensure_started()
+
+        payload = {
+            **self.generation_kwargs,
+            **(generation_kwargs or {}),
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+        result = Future()
+        asyncio.run_coroutine_threadsafe(self._send(payload, result), self._loop)
+        return result
+
+    def _ensure_started(self):
+        if self._loop:
+            return
+
+        with self._start_lock:
+            if self._loop:
+                return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-client", daemon=True)
+            thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._loop = loop
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                              headers={"Authorization": f"Bearer {self.api_key}"})
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def _send(self, payload: dict[str, any], result: Future):
+        try:
+            async with self._semaphore:
+                async with self._session.post(f"{self.api_base_url}/chat/completions", json=payload) as response:
+                    if response.status != 200:
+                        raise Exception(f"LLM server returned {response.status}: {await response.text()}")
+                    if payload.get("stream"):
+                        completion = await self._read_stream(response)
+                    else:
+                        completion = await response.json()
+        except Exception as e:
+            result.set_exception(e)
+            return
+
+        result.set_result(self._to_output(completion))
+
+    @staticmethod
+    async def _read_stream(response: aiohttp.ClientResponse) -> dict[str, any]:
+        """
+        Collects the server sent events of a streamed completion into a completion.
+        Stops reading once the JSON object in the reply is closed, leaving the block
+        closes the connection and the server cancels the generation.
+        """
+        tracker = JsonObjectTracker()
+        content = ""
+        completion = {"model": None, "usage": {}}
+        finish_reason = None
+
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+
+            chunk = json.loads(data)
+            completion["model"] = chunk.get("model", completion["model"])
+            completion["usage"] = chunk.get("usage") or completion["usage"]
+            if not chunk.get("choices"):
+                continue
+
+            choice = chunk["choices"][0]
+            finish_reason = choice.get("finish_reason") or finish_reason
+            delta = choice.get("delta", {}).get("content") or ""
+
+            end = tracker.feed(delta)
+            if end is not None:
+                content += delta[:end - len(content)]
+                finish_reason = finish_reason or "stop"
+                break
+            content += delta
+
+        completion["choices"] = [{"index": 0, "finish_reason": finish_reason,
+                                  "message": {"role": "assistant", "content": content}}]
+        return completion
+
+    @staticmethod
+    def _to_output(completion: dict[str, any]) -> dict[str, list]:
+        replies = []
+        meta = []
+
+        for choice in completion["choices"]:
+            replies.append(choice["message"]["content"])
+            meta.append({
+                "model": completion.get("model"),
+                "index": choice.get("index"),
+                "finish_reason": choice.get("finish_reason"),
+                "usage": completion.get("usage", {}),
+            })
+
+        return {"replies": replies, "meta": meta}
+
+
+@component
+class PooledGenerator:
+    """
+    Haystack generator that sends its prompts through a shared LLMClient.
+    """
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+
+    @component.output_types(replies=list[str], meta=list[dict[str, any]])
+    def run(self, prompt: str, generation_kwargs: Optional[dict[str, any]] = None):
+        return self.client.generate(prompt, generation_kwargs)
@@ -1,8 +1,9 @@
 from enum import Enum
+from functools import lru_cache
 from typing import Type
 from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import MODEL_CACHE_SIZE, cached_enum, grammar_pipeline
 
 template = """Given a sentence identify the subject, predicate, and object from the sentence.
 
@@ -16,6 +17,7 @@ class Z(BaseModel):
     a: str = 5
 
 
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
 def _model_from_predefined_subject(enum: Enum) -> Type[BaseModel]:
     class ActionEvent(BaseModel):
         subject: enum
@@ -26,7 +28,7 @@ def _model_from_predefined_subject(enum: Enum) -> Type[BaseModel]:
 
 
 def action_event_triple(name: str, action_description: str, address: str = None, ) -> str:
-    model = _model_from_predefined_subject(enum=Enum("Subject", {name: name}))
+    model = _model_from_predefined_subject(enum=cached_enum("Subject", [name]))
 
     action_event = grammar_pipeline.run(model=model, prompt_template=template, template_variables={
         "name": name,
@@ -1,8 +1,9 @@
 from enum import Enum
+from functools import lru_cache
 from typing import Type
 from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import MODEL_CACHE_SIZE, cached_enum, grammar_pipeline
 """
 TODO 
 
@@ -21,6 +22,7 @@ For {{action_description}}, to which area should {{name}} go in "{{sector}}"?
 """
 
 
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
 def model_from_enum(dynamic_enum: Enum) -> Type[BaseModel]:
     class ActionArenaLocation(BaseModel):
         reasoning: str = Field(
@@ -30,7 +32,7 @@ def model_from_enum(dynamic_enum: Enum) -> Type[BaseModel]:
 
 
 def action_area_locations(name: str, current_area: str, current_sector: str, sector: str, sector_arenas: str, action_description: str) -> str:
-    areas = Enum("Areas", {arena: arena for arena in sector_arenas.split(", ")})
+    areas = cached_enum("Areas", sector_arenas.split(", "))
     model = model_from_enum(areas)
 
     action_arena_location = grammar_pipeline.run(model=model, prompt_template=template, template_variables={
@@ -1,8 +1,9 @@
 from enum import Enum
+from functools import lru_cache
 from typing import Type
 from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import MODEL_CACHE_SIZE, cached_enum, grammar_pipeline
 
 template = """Your task is to identify the next object for an action. You need to output valid JSON.
 Current activity: {{action_description}}
@@ -11,13 +12,14 @@ Which object is the most relevant one, you MUST pick one?
 """
 
 
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
 def model_from_enum(dynamic_enum: Enum) -> Type[BaseModel]:
     class ActionObjectLocation(BaseModel):
         next_object: dynamic_enum
     return ActionObjectLocation
 
 def action_location_game_object(action_description: str, available_objects: str) -> str:
-    objects = Enum("Objects", {obj: obj for obj in available_objects.split(", ")})
+    objects = cached_enum("Objects", available_objects.split(", "))
     model = model_from_enum(objects)
 
     action_object_location = grammar_pipeline.run(model=model, prompt_template=template, template_variables={
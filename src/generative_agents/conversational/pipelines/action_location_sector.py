@@ -1,8 +1,9 @@
 from enum import Enum
+from functools import lru_cache
 from typing import Type
 from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import MODEL_CACHE_SIZE, cached_enum, grammar_pipeline
 
 template = """Choose an appropriate area from the area options for a given activity. Stay in the current area if the activity can be done there. Only go out if the activity needs to take place in another place.
 Also if the activity cannot be done in the available options, try to identify the closest area that can be used for the activity.
@@ -14,6 +15,7 @@ The following areas are nearby: [{{available_sectors_nearby}}].
 For "{{curr_action_description}}", where should {{agent_name}} go?"""
 
 
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
 def model_from_enum(dynamic_enum: Enum) -> Type[BaseModel]:
     class ActionSectorLocation(BaseModel):
         reasoning: str = Field(
@@ -25,7 +27,7 @@ def model_from_enum(dynamic_enum: Enum) -> Type[BaseModel]:
 
 def action_sector_locations(agent_name: str, agent_home: str, agent_home_arenas: str, agent_current_sector: str, agent_current_sector_arenas: str, available_sectors_nearby: str, curr_action_description: str) -> str:
     possible_sectors = ",".join([agent_home, agent_current_sector, available_sectors_nearby]).replace(", ", ",")
-    areas = Enum("Areas", {sector: sector for sector in possible_sectors.split(",") if sector})
+    areas = cached_enum("Areas", [sector for sector in possible_sectors.split(",") if sector])
     model = model_from_enum(areas)
 
     action_sector_location = grammar_pipeline.run(model=model, prompt_template=template, template_variables={
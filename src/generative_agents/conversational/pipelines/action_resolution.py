@@ -0,0 +1,65 @@
+from enum import Enum
+from functools import lru_cache
+from typing import List, Type
+from pydantic import BaseModel, Field
+
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import MODEL_CACHE_SIZE, cached_enum, grammar_pipeline
+
+template = """Plan how {{agent_name}} carries out an activity. Choose the place and the object for the activity from the possible values. Stay in the current area if the activity can be done there. Only go out if the activity needs to take place in another place.
+Then describe the action and the state of the chosen object while it is used.
+
+{{agent_name}} lives in [{{agent_home}}].
+{{agent_name}} is currently in [{{agent_current_sector}}], in the [{{agent_current_arena}}].
+Places are given as "area:room:object".
+
+Activity: {{agent_name}} is {{action_description}}"""
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def model_from_addresses(addresses: Enum) -> Type[BaseModel]:
+    class ResolvedAction(BaseModel):
+        reasoning: str = Field(
+            description="Reasoning for the place of the activity.")
+        address: addresses
+        emoji: str = Field(
+            description="Maximum two emojis that best represent the activity.")
+        predicate: str = Field(description="The action being performed")
+        object: str = Field(description="The entity that the action is being performed on")
+        object_state: str = Field(
+            description="The new state of the chosen object when it has been used. This is always filled in.")
+        object_emoji: str = Field(
+            description="Maximum two emojis that best represent the state of the object.")
+
+    return ResolvedAction
+
+
+def resolve_action(agent_name: str, agent_home: str, agent_current_sector: str, agent_current_arena: str,
+                   addresses: List[str], action_description: str) -> BaseModel:
+    """
+    Determines the address, emoji, event triple and object state of an action in one
+    call, instead of the chain of action_sector_locations, action_area_locations,
+    action_location_game_object, action_pronunciatio, action_event_triple and
+    describe_object_state. The address is one of the given "sector:arena:game object"
+    addresses.
+    """
+    model = model_from_addresses(cached_enum("Addresses", addresses))
+
+    return grammar_pipeline.run(model=model, prompt_template=template, template_variables={
+        "agent_name": agent_name,
+        "agent_home": agent_home,
+        "agent_current_sector": agent_current_sector,
+        "agent_current_arena": agent_current_arena,
+        "action_description": action_description
+    })
+
+
+if __name__ == "__main__":
+    print(resolve_action(agent_name="John Doe",
+                         agent_home="John Doe's apartment",
+                         agent_current_sector="Hobbs Cafe",
+                         agent_current_arena="cafe",
+                         addresses=["John Doe's apartment:kitchen:stove",
+                                    "John Doe's apartment:bedroom:bed",
+                                    "Hobbs Cafe:cafe:cafe customer seating",
+                                    "Hobbs Cafe:cafe:piano"],
+                         action_description="taking a nap"))
@@ -2,9 +2,7 @@ from pydantic import BaseModel, Field
 
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
-template = """You are {{agent}}. You will write about the personality and observations of {{agent}} based on a given event and related events.
-Context
-{{identity}}
+template = """You will write about the personality and observations of {{agent}} based on a given event and related events.
 {{agent}} perceived the following event: {{event_description}}
 He remembered the following related events: {{events}}
 He thought the following about the event: {{thoughts}}
@@ -18,9 +16,8 @@ class Context(BaseModel):
 
 
 def contextualize_event(agent: str, identity: str, event_description: str, events: str, thoughts: str) -> str:
-    context = grammar_pipeline.run(model=Context, prompt_template=template, template_variables={
+    context = grammar_pipeline.run(model=Context, prompt_template=template, agent=agent, identity=identity, template_variables={
         "agent": agent,
-        "identity": identity,
         "event_description": event_description,
         "events": events,
         "thoughts": thoughts
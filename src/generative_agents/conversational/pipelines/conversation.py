@@ -2,12 +2,7 @@ from pydantic import BaseModel, Field
 
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
-template = """You will act as a person in a role-playing game. You are in a conversation with another person. You will be given a context and a conversation so far. You need to output valid JSON describing the next utterance and whether the conversation ended with your utterance.
-You are {{agent}}. Your identity is: 
-{{identity}}
-
-Here is the memory that is in {{agent}}'s head:
-{{memory}}
+template = """You are in a conversation with another person. You will be given a context and a conversation so far. You need to output valid JSON describing the next utterance and whether the conversation ended with your utterance.
 
 Past Context:
 {{past_context}}
@@ -32,10 +27,9 @@ class ConversationRound(BaseModel):
 
 
 def run_conversation(agent: str, identity: str, memory: str, past_context: str, location: str, agent_action: str, agent_with: str, agent_with_action: str, conversation: str) -> str:
-    conversation_round = grammar_pipeline.run(model=ConversationRound, prompt_template=template, template_variables={
+    conversation_round = grammar_pipeline.run(model=ConversationRound, prompt_template=template,
+                                              agent=agent, identity=identity, memories=memory, template_variables={
         "agent": agent,
-        "identity": identity,
-        "memory": memory,
         "past_context": past_context,
         "location": location,
         "agent_action": agent_action,
@@ -4,14 +4,8 @@ from pydantic import BaseModel, Field
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
 
-template = """You act as {{name}} in a roleplay game. Your identity is:
-{{identity}}
-
-[Statements]
-{{statements}}
-
-Given the statements above, what is the most important thing that {{name}} should remember as they plan for {{today}}?
-If there is any scheduling information, be as specific as possible (include date, time, and location if stated in the statement)
+template = """Given the memory above, what is the most important thing that {{name}} should remember as they plan for {{today}}?
+If there is any scheduling information, be as specific as possible (include date, time, and location if stated in the memory)
 Write the response from {{name}}'s perspective and be as brief as possible."""
 
 
@@ -21,23 +15,16 @@ class Remember(BaseModel):
 
 
 def find_things_to_remember(name: str, identity: str, statements: str, today: str) -> str:
-    remember = grammar_pipeline.run(model=Remember, prompt_template=template, template_variables={
+    remember = grammar_pipeline.run(model=Remember, prompt_template=template,
+                                    agent=name, identity=identity, memories=statements, template_variables={
         "name": name,
-        "identity": identity,
-        "statements": statements,
         "today": today
     })
 
     return remember.things_i_should_remember
 
 
-template = """You are {{name}}. Your identity is:
-{{identity}}
-
-[Statements]
-{{statements}}
-
-Given the statements above, how might we summarize {{name}}'s feelings about their days up to now?
+template = """Given the memory above, how might we summarize {{name}}'s feelings about their days up to now?
 Write the response from {{name}}'s perspective and be as brief as possible."""
 
 
@@ -47,19 +34,15 @@ class Feelings(BaseModel):
 
 
 def find_feelings(name: str, identity: str, statements: str) -> str:
-    feelings = grammar_pipeline.run(model=Feelings, prompt_template=template, template_variables={
-        "name": name,
-        "identity": identity,
-        "statements": statements
+    feelings = grammar_pipeline.run(model=Feelings, prompt_template=template,
+                                    agent=name, identity=identity, memories=statements, template_variables={
+        "name": name
     })
 
     return feelings.feelings
 
 
-template = """You are {{name} acting in a role play game. Your identity is:
-{{identity}}
-
-{{name}}'s status from {{yesterday}}:
+template = """{{name}}'s status from {{yesterday}}:
 {{current_activity}}
 
 {{name}}'s thoughts at the end of {{yesterday}}:
@@ -74,23 +57,19 @@ class Reflections(BaseModel):
 
 
 def define_current_status(name: str, yesterday: str, today: str, current_activity: str, thought_note: str, plan_note: str, identity: str) -> str:
-    status = grammar_pipeline.run(model=Reflections, prompt_template=template, template_variables={
+    status = grammar_pipeline.run(model=Reflections, prompt_template=template, agent=name, identity=identity, template_variables={
         "name": name,
         "yesterday": yesterday,
         "today": today,
         "current_activity": current_activity,
         "thought_note": thought_note,
-        "plan_note": plan_note,
-        "identity": identity
+        "plan_note": plan_note
     })
 
     return status.status
 
 
-template = """You are {{name}}. Your identity is:
-{{identity}}
-
-{{name}} has reflected and planned the following for today based on your feelings yesterday: 
+template = """{{name}} has reflected and planned the following for today based on your feelings yesterday: 
 {{feelings_for_today}}
 
 Today is {{today}}. What is {{name}}'s plan today in broad-strokes? (Mention for each activity the time in 12-hour clock format.)"""
@@ -108,9 +87,8 @@ class DailyPlan(BaseModel):
 
 
 def create_daily_plan(name: str, identity: str, today: str, feelings_for_today: str) -> list[dict[str, str]]:
-    plan = grammar_pipeline.run(model=DailyPlan, prompt_template=template, template_variables={
+    plan = grammar_pipeline.run(model=DailyPlan, prompt_template=template, agent=name, identity=identity, template_variables={
         "name": name,
-        "identity": identity,
         "today": today,
         "feelings_for_today": feelings_for_today
     })
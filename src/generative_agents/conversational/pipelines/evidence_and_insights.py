@@ -1,7 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import cached_model, grammar_pipeline
 
 template = """You are infering standalone insights from statments.
 
@@ -14,7 +14,7 @@ What {{number_of_insights}} high-level standalone insights can you infer from th
 def evidence_and_insights(statements: list[str], number_of_insights: int) -> list[str]:
     insights = {f"Insight {i}": (str, ...) for i in range(1, number_of_insights + 1)}
 
-    NumberOfInsights = create_model("ReflectionPoints", **insights)
+    NumberOfInsights = cached_model("ReflectionPoints", **insights)
 
     reflection_points = grammar_pipeline.run(model=NumberOfInsights, prompt_template=template, template_variables={
         "statements": statements,
@@ -3,10 +3,7 @@ from pydantic import BaseModel, Field
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
 
-template = """You are {{name}}. Your identity is:
-{{identity}}
-
-Today is {{today}}. What is {{name}}'s plan today in broad-strokes? (Mention for each activity the time in 12-hour clock format.)
+template = """Today is {{today}}. What is {{name}}'s plan today in broad-strokes? (Mention for each activity the time in 12-hour clock format.)
 {{name}} will wake up and complete the morning routine at {{wake_up_hour}}"""
 
 
@@ -22,9 +19,8 @@ class DailyPlan(BaseModel):
 
 
 def create_daily_plan(name: str, identity: str, today: str, wake_up_hour: str) -> list[dict[str, str]]:
-    plan = grammar_pipeline.run(model=DailyPlan, prompt_template=template, template_variables={
+    plan = grammar_pipeline.run(model=DailyPlan, prompt_template=template, agent=name, identity=identity, template_variables={
         "name": name,
-        "identity": identity,
         "today": today,
         "wake_up_hour": wake_up_hour
     })
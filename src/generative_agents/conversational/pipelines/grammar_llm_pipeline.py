@@ -1,22 +1,51 @@
+from collections import OrderedDict
+from enum import Enum
 import json
 import os
 import hashlib
 import pickle
+import threading
+from typing import Callable, Hashable, Iterable, Optional, Tuple, Type
 
 from colorama import Back, Fore, Style
 from haystack import Pipeline, component
 from haystack.core.component import Component
 from haystack.components.builders import DynamicPromptBuilder
 from haystack_integrations.components.generators.llama_cpp import LlamaCppGenerator
-from haystack.components.generators.openai import OpenAIGenerator
-from haystack.utils import Secret
 
 from llama_cpp import LlamaGrammar
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 from pydantic_core import from_json
 
-from generative_agents import global_state
-from generative_agents.utils import colored, generate_tick_hash_from_signature
+from generative_agents.conversational.llm_client import LLMClient, PooledGenerator
+from generative_agents.persistence.llm_cache import LLMCache
+from generative_agents.utils import colored, hash_string
+
+# The prompts of an agent are laid out from the most to the least stable segment: the
+# system segment shared by the calls of all agents, the identity of the agent, its
+# memories and last the task of the pipeline. Consecutive calls of an agent then share
+# a long prefix, which the llama.cpp server keeps in the KV cache of the agent's slot
+# (cache_prompt). Calls that are not made for an agent get the task template only.
+SYSTEM_SEGMENT = "You act as a character in a role play game that simulates the daily life of the people in a small village."
+IDENTITY_SEGMENT = """You are {{layout_agent}}. Your identity is:
+{{layout_identity}}"""
+MEMORIES_SEGMENT = """Here is the memory that is in {{layout_agent}}'s head:
+{{layout_memories}}"""
+
+# token budget of the values in a reply without a maxLength / maxItems in the schema
+STRING_TOKENS = 200
+ARRAY_ITEMS = 24
+# the budget is the estimated size of the reply times the margin, within the bounds
+MAX_TOKENS_MARGIN = 1.5
+MAX_TOKENS_BOUNDS = (64, 4096)
+
+# number of parallel slots of the llama.cpp server (--parallel), every agent is pinned
+# to one of them. 0 lets the server pick a slot for every request.
+SERVER_SLOTS = 4
+
+# number of output models, enums, compiled models and grammars kept per cache. Models
+# built from the places of the maze differ between calls, so the caches are bounded.
+MODEL_CACHE_SIZE = 512
 
 
 def get_output_hint(model: BaseModel, indent: int=2) -> dict[str, dict[str, any]]:
@@ -69,6 +98,143 @@ def get_output_hint(model: BaseModel, indent: int=2) -> dict[str, dict[str, any]
     return _get_field_definitions(schema, new_indent=indent)
 
 
+class CompiledModel:
+    """
+    Everything the pipeline derives from an output model: the JSON schema sent with the
+    request, which the server turns into a grammar, the output hint appended to the
+    prompts and the token budget of the reply.
+    """
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.schema = model.model_json_schema()
+        self.schema_json = json.dumps(self.schema, indent=4)
+        self.prompt_suffix = "\n\n### Answer in valid JSON. Output hint:\n" + get_output_hint(model) + "\n###"
+        self.max_tokens = max_tokens_of(self.schema)
+
+
+class BoundedCache:
+    """ Thread safe mapping that keeps the <size> most recently used entries. """
+    def __init__(self, size: int = MODEL_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, create: Callable[[], any]) -> any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # created outside of the lock, the first entry stored for a key wins
+        value = create()
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# output models are created once per structure, so the compiled models can be looked
+# up by the model class
+_compiled_models = BoundedCache()
+_models = BoundedCache()
+_enums = BoundedCache()
+_grammars = BoundedCache()
+
+
+def _estimate_tokens(schema: dict[str, any], definitions: dict[str, any]) -> int:
+    """ Rough number of tokens of a JSON value matching the schema, ~3 characters a token. """
+    if "$ref" in schema:
+        return _estimate_tokens(definitions[schema["$ref"].split("/")[-1]], definitions)
+    for combination in ("anyOf", "oneOf", "allOf"):
+        if combination in schema:
+            return max(_estimate_tokens(option, definitions) for option in schema[combination])
+
+    if "enum" in schema:
+        return max(len(json.dumps(value)) for value in schema["enum"]) // 3 + 2
+    if "const" in schema:
+        return len(json.dumps(schema["const"])) // 3 + 2
+
+    _type = schema.get("type")
+    if _type == "object":
+        # key, quotes, colon and comma around every value
+        return 2 + sum(len(name) // 3 + 4 + _estimate_tokens(property, definitions)
+                       for name, property in schema.get("properties", {}).items())
+    if _type == "array":
+        items = schema.get("maxItems", ARRAY_ITEMS)
+        return 2 + items * (_estimate_tokens(schema.get("items", {}), definitions) + 1)
+    if _type == "string":
+        return schema["maxLength"] // 3 + 2 if "maxLength" in schema else STRING_TOKENS
+    if _type in ("integer", "number", "boolean", "null"):
+        return 4
+    return STRING_TOKENS
+
+
+def max_tokens_of(schema: dict[str, any]) -> int:
+    """ max_tokens for a reply of the schema, a small answer can't run on for thousands of tokens. """
+    lower, upper = MAX_TOKENS_BOUNDS
+    tokens = int(_estimate_tokens(schema, schema.get("$defs", {})) * MAX_TOKENS_MARGIN)
+    return min(max(tokens, lower), upper)
+
+
+def compile_model(model: Type[BaseModel]) -> CompiledModel:
+    return _compiled_models.get_or_create(model, lambda: CompiledModel(model))
+
+
+def cached_model(name: str, **fields: Tuple[type, any]) -> Type[BaseModel]:
+    """
+    create_model that returns the same model class for the same name and fields, keyed
+    on the field names, types and field definitions (description, constraints, ...).
+    """
+    key = (name, tuple((field, annotation, repr(definition)) for field, (annotation, definition) in fields.items()))
+    return _models.get_or_create(key, lambda: create_model(name, **fields))
+
+
+def cached_enum(name: str, values: Iterable[str]) -> Type[Enum]:
+    """ Enum with value == name for every value, the same class for the same values. """
+    key = (name, tuple(values))
+    return _enums.get_or_create(key, lambda: Enum(name, {value: value for value in key[1]}))
+
+
+def layout_prompt(task_template: str, template_variables: dict[str, any], agent: Optional[str] = None,
+                  identity: Optional[str] = None, memories: Optional[str] = None) -> tuple[str, dict[str, any]]:
+    """
+    Puts the task template behind the stable segments of the prompt. Without agent and
+    identity the task template is the whole prompt.
+    INPUT:
+        task_template: the template of the pipeline, without identity and memories
+        agent: name of the agent the call is made for
+        identity: the agent's identity, from Scratch.identity
+        memories: the memories the task is about
+    OUTPUT:
+        the prompt template and its template variables
+    """
+    segments = []
+    if agent is not None or identity is not None:
+        segments.append(SYSTEM_SEGMENT)
+    if identity is not None:
+        segments.append(IDENTITY_SEGMENT)
+    if memories is not None:
+        segments.append(MEMORIES_SEGMENT)
+    segments.append(task_template)
+
+    return "\n\n".join(segments), {**template_variables,
+                                    "layout_agent": agent,
+                                    "layout_identity": identity,
+                                    "layout_memories": memories}
+
+
+def slot_of(agent: Optional[str]) -> Optional[int]:
+    """ The server slot the calls of the agent are sent to, None if any slot will do. """
+    if not agent or SERVER_SLOTS <= 0:
+        return None
+    return int(hash_string(agent)[:8], 16) % SERVER_SLOTS
+
+
 def escape_json_string(input_str):
     escaped_str = (
         input_str.replace("\n", "\\n").replace("\r", "\\r")
@@ -79,15 +245,17 @@ def escape_json_string(input_str):
 class PydanticToJSONSchema:
     @component.output_types(schema=str)
     def run(self, model: BaseModel):
-        return {"schema": json.dumps(model.model_json_schema(), indent=4)}
+        return {"schema": compile_model(model).schema_json}
 
 @component
 class GrammarGenerator:
     @component.output_types(generation_kwargs=dict[str, any])
     def run(self, schema: str):
+        grammar = _grammars.get_or_create(schema, lambda: LlamaGrammar.from_json_schema(schema))
+
         return {"generation_kwargs": {
                     "extra_body": {
-                        "grammar": LlamaGrammar.from_json_schema(schema)
+                        "grammar": grammar
                     }    
                 }}
 
@@ -106,74 +274,133 @@ class LLMOutputParser:
 
 @component
 class PrintableGenerator:
-    def __init__(self, c: Component, input_name: str, output_name: str):
+    # generation kwargs that do not change the reply, they are not part of the cache key
+    uncached_kwargs = ("id_slot", "stream")
+
+    def __init__(self, c: Component, input_name: str, output_name: str,
+                 cache: LLMCache = None, model: str = "", generation_kwargs: dict[str, any] = None):
         self.component = c
         self.__haystack_input__ = c.__haystack_input__
         self.__haystack_output__ = c.__haystack_output__
         self.input_name = input_name
         self.output_name = output_name
+        self.cache = cache
+        self.model = model
+        self.generation_kwargs = generation_kwargs or {}
         if hasattr(c, "warm_up"):
             c.warm_up()
 
     def run(self, **kwargs):
-        hash_key = generate_tick_hash_from_signature(**kwargs)
-        cache_dir = f".generation_cache/llm/tick_{global_state.tick}"
-        os.makedirs(cache_dir, exist_ok=True)
-        cache_file_path = f"{cache_dir}/{hash_key}.json"
- 
-        with colored(Style.BRIGHT, Fore.CYAN, Back.BLACK):
-            print(kwargs[self.input_name])
+        self._print_input(kwargs)
 
-        if os.path.exists(cache_file_path):
-            output = json.load(open(cache_file_path, "r"))
-        else:
+        key = self._cache_key(kwargs)
+        output = self.cache.get(key) if self.cache else None
+        if output is None:
             output = self.component.run(**kwargs)
-            json.dump(output, open(cache_file_path, "w"), indent=4)
+            if self.cache:
+                self.cache.put(key, output)
+
+        self._print_output(output)
+        return output
+
+    def _cache_key(self, kwargs: dict[str, any]) -> str:
+        if not self.cache:
+            return None
 
+        generation_kwargs = {key: value for key, value in
+                             {**self.generation_kwargs, **(kwargs.get("generation_kwargs") or {})}.items()
+                             if key not in self.uncached_kwargs}
+        return self.cache.key(kwargs[self.input_name], self.model, generation_kwargs)
+
+    def _print_input(self, kwargs: dict[str, any]):
+        with colored(Style.BRIGHT, Fore.CYAN, Back.BLACK):
+            print(kwargs[self.input_name])
+
+    def _print_output(self, output: dict[str, any]):
         with colored(Style.BRIGHT, Fore.GREEN, Back.BLACK):
             out = output[self.output_name][-1] if isinstance(output[self.output_name], list) else output[self.output_name]
             print(json.dumps(json.loads(out), indent=4))
 
-        return output
-
 class _GrammarPipeline:
-    def __init__(self):
-        self.pipe = Pipeline()
-
-        # print current working directory
-        print(os.getcwd())
-
-        generator = OpenAIGenerator(
-            api_key=Secret.from_token("secret"),
-            model="models/Meta-Llama-3-8B-Instruct-Q8_0.gguf",
+    def __init__(self, max_in_flight: int = 8):
+        # one pooled client for all pipelines - it limits the number of open requests of
+        # the concurrently updated agents to the server
+        self.client = LLMClient(
             api_base_url="http://localhost:30091/v1/",
+            model="models/Meta-Llama-3-8B-Instruct-Q8_0.gguf",
             generation_kwargs={
                 "max_tokens": 4096,
                 "temperature": 0.8,
-                "top_p": 0.8
-            }
+                "top_p": 0.8,
+                "cache_prompt": True,
+                "stream": True
+            },
+            max_in_flight=max_in_flight
         )
+        self.cache = LLMCache()
 
-        printable = PrintableGenerator(generator, "prompt", "replies")
+        # agents are updated concurrently and a haystack pipeline keeps run state on
+        # its graph, so every thread gets its own pipeline instance
+        self._local = threading.local()
 
-        self.pipe.add_component("prompt", instance=DynamicPromptBuilder())
-        self.pipe.add_component("llm", printable)
-        self.pipe.add_component("output_parser", LLMOutputParser())
+        # print current working directory
+        print(os.getcwd())
 
-        self.pipe.connect("prompt.prompt", "llm.prompt")
-        self.pipe.connect("llm.replies", "output_parser.replies")
-
-    def run(
-        self, model: BaseModel, prompt_template: str, template_variables: dict[str, any]
-    ): 
-        prompt_template += "\n\n### Answer in valid JSON. Output hint:\n" + get_output_hint(model) + "\n###"
+    @property
+    def pipe(self) -> Pipeline:
+        if not hasattr(self._local, "pipe"):
+            self._local.pipe = self._create_pipeline()
+        return self._local.pipe
+
+    def _create_pipeline(self) -> Pipeline:
+        pipe = Pipeline()
+
+        pipe.add_component("prompt", instance=DynamicPromptBuilder())
+        pipe.add_component("llm", self._create_generator())
+        pipe.add_component("output_parser", LLMOutputParser())
+
+        pipe.connect("prompt.prompt", "llm.prompt")
+        pipe.connect("llm.replies", "output_parser.replies")
+        return pipe
+
+    def _create_generator(self) -> PrintableGenerator:
+        return PrintableGenerator(PooledGenerator(self.client), "prompt", "replies",
+                                  cache=self.cache,
+                                  model=self.client.model,
+                                  generation_kwargs=self.client.generation_kwargs)
+
+    @staticmethod
+    def _prepare(model: BaseModel, prompt_template: str, template_variables: dict[str, any],
+                 agent: Optional[str], identity: Optional[str],
+                 memories: Optional[str]) -> tuple[str, dict[str, any], dict[str, any]]:
+        compiled = compile_model(model)
+        prompt_template, template_variables = layout_prompt(prompt_template + compiled.prompt_suffix,
+                                                            template_variables, agent, identity, memories)
 
         generation_kwargs = {
+            "max_tokens": compiled.max_tokens,
             "response_format": {
                 "type": "json_object",
-                "schema": model.model_json_schema()
+                "schema": compiled.schema
             }
         }
+        slot = slot_of(agent)
+        if slot is not None:
+            generation_kwargs["id_slot"] = slot
+        return prompt_template, template_variables, generation_kwargs
+
+    def run(
+        self, model: BaseModel, prompt_template: str, template_variables: dict[str, any],
+        agent: Optional[str] = None, identity: Optional[str] = None, memories: Optional[str] = None
+    ):
+        """
+        Renders the prompt, generates the reply and parses it into the model.
+        ARGS:
+            agent: name of the agent the call is made for, its calls go to the same server slot
+            identity, memories: put in front of the template, see layout_prompt
+        """
+        prompt_template, template_variables, generation_kwargs = self._prepare(
+            model, prompt_template, template_variables, agent, identity, memories)
 
         output = self.pipe.run(data={
                 "prompt": {
@@ -1,7 +1,7 @@
 
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import cached_model, grammar_pipeline
 from typing import Dict, List
 
 from pydantic import BaseModel
@@ -9,13 +9,9 @@ from pydantic import BaseModel
 hours = ["12:00 AM", "01:00 AM", "02:00 AM", "03:00 AM", "04:00 AM", "05:00 AM", "06:00 AM", "07:00 AM", "08:00 AM", "09:00 AM", "10:00 AM", "11:00 AM",
          "12:00 PM", "01:00 PM", "02:00 PM", "03:00 PM", "04:00 PM", "05:00 PM", "06:00 PM", "07:00 PM", "08:00 PM", "09:00 PM", "10:00 PM", "11:00 PM"]
 
-template = """You are a character in a role play game. You are thinking about your day and create an hourly schedule. 
+template = """You are thinking about your day and create an hourly schedule. 
 Note: In this villiage neither cars, nor bikes exist. The only way to get around is by walking.
 
-You will act as {{name}}.
-Your identity is: 
-{{identity}}
-
 Here is today's plan in broad-strokes:
 {%- for start_time, activity in daily_plan.items() %}
 {{loop.index}}.) {{activity}} at {{start_time}}
@@ -26,11 +22,10 @@ How does {{name}}'s complete hourly schedule look for today? You must follow the
 
 def create_hourly_schedule(name: str, identity: str, daily_plan: list[dict[str, str]], wake_up_hour: str) -> str:
     # TODO use create_model like in task_decomposition.py - freeze the ones until wake_up_hour to make it fixed
-    HourlySchedule = create_model("HourlySchedule", **{hour: (str, Field(..., description=f"Brief activity at this time. Must not be empty", min_length=2)) for hour in hours})
+    HourlySchedule = cached_model("HourlySchedule", **{hour: (str, Field(..., description=f"Brief activity at this time. Must not be empty", min_length=2)) for hour in hours})
 
-    schedule = grammar_pipeline.run(model=HourlySchedule, prompt_template=template, template_variables={
+    schedule = grammar_pipeline.run(model=HourlySchedule, prompt_template=template, agent=name, identity=identity, template_variables={
         "name": name,
-        "identity": identity,
         "daily_plan": daily_plan, 
         "wake_up_hour": wake_up_hour
     })
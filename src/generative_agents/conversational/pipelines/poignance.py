@@ -2,10 +2,7 @@ from functools import lru_cache
 from pydantic import BaseModel, Field
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
-template = """You are {{agent_name}}. You are rating the importance of an event and supposed to return a valid json response.
-
-Here is a brief description of {{agent_name}}:
-{{agent_identity}}
+template = """You are rating the importance of an event and supposed to return a valid json response.
 
 How would you rate the {{type_}} "{{description}}"?
 """
@@ -15,9 +12,8 @@ class Poignance(BaseModel):
 
 @lru_cache(maxsize=2048)
 def rate_poignance(agent_name: str, agent_identity: str, type_: str, description: str) -> int:
-    poignance = grammar_pipeline.run(model=Poignance, prompt_template=template, template_variables={
-        "agent_name": agent_name,
-        "agent_identity": agent_identity,
+    poignance = grammar_pipeline.run(model=Poignance, prompt_template=template,
+                                     agent=agent_name, identity=agent_identity, template_variables={
         "type_": type_,
         "description": description
     })
@@ -1,7 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import cached_model, grammar_pipeline
 
 template = """You are reflecting on the subjects in the statements. You need to determine the most salient high-level questions we can answer about the subjects in the statements.
 {memory}}
@@ -12,7 +12,7 @@ Given only the information above, what are {{count}} most salient high-level que
 def reflection_points(memory: str, count: int) -> list[str]:
     questions = {f"Option {i}": (str, ...) for i in range(1, count + 1)}
 
-    ReflectionPoints = create_model("ReflectionPoints", **questions)
+    ReflectionPoints = cached_model("ReflectionPoints", **questions)
 
     reflection_points = grammar_pipeline.run(model=ReflectionPoints, prompt_template=template, template_variables={
         "memory": memory,
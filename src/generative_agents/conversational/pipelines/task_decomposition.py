@@ -2,43 +2,47 @@
 import datetime
 from enum import Enum
 from typing import Literal
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field
 
-from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
+from generative_agents.conversational.pipelines.grammar_llm_pipeline import cached_model, grammar_pipeline
 from generative_agents.utils import get_time_string, hour_string_to_time, time_string_to_time
 
 
-template = """You are in a roleplay and act as an agent. You will be asked to decompose a task into subtasks.
+template = """You will be asked to decompose a task into subtasks.
 Break down the task in subtasks 5 minute increments. At the end no time should be left. Include a hint on main task in all subtasks.
 
-{{identity}}
-
 Today is {{today}}. {{task_context}}
-In minimum 5 minutes increments, what are the subtasks that {{name}} does when {{name}} is "{{task_description}}" from {{task_start_time}} ~ {{task_end_time}}? (total duration in minutes: {{task_duration}})"""
+In minimum 5 minutes increments, what are the subtasks that {{name}} does when {{name}} is "{{task_description}}" from {{task_start_time}} ~ {{task_end_time}}? (total duration in minutes: {{task_duration}})
+The subtasks start at:
+{{subtask_start_times}}"""
 
 def create_decomposition_schedule(name: str, identity: str, task_description: str, task_start_time: str, task_end_time: str, task_duration: int, today: str, task_context: str) -> list[dict[str, str]]:
 
     # iterate all 5 minutes increments
     subtasks = {}
+    start_times = []
 
     # startime in datetime format from xx:xx AM/PM
     start_time = time_string_to_time(task_start_time)
 
     for minutes in range(0, task_duration, 5):
         next_task_start_time = start_time + datetime.timedelta(minutes=minutes)
-        subtasks[f"Subtask {minutes//5+1}/{task_duration // 5}"] = (str, Field(..., description=f"The 5 minutes activity planned at {get_time_string(next_task_start_time)}."))
+        subtask = f"Subtask {minutes//5+1}/{task_duration // 5}"
+        # the start time is part of the prompt, the model only depends on the duration
+        subtasks[subtask] = (str, Field(..., description="The 5 minutes activity planned at the start time of the subtask."))
+        start_times.append(f"{subtask}: {get_time_string(next_task_start_time)}")
 
-    DecompositionSchedule = create_model("DecompositionSchedule", **subtasks)
+    DecompositionSchedule = cached_model("DecompositionSchedule", **subtasks)
 
-    schedule = grammar_pipeline.run(model=DecompositionSchedule, prompt_template=template, template_variables={
+    schedule = grammar_pipeline.run(model=DecompositionSchedule, prompt_template=template, agent=name, identity=identity, template_variables={
         "name": name,
-        "identity": identity,
         "task_description": task_description,
         "task_start_time": task_start_time,
         "task_end_time": task_end_time,
         "task_duration": task_duration,
         "today": today,
-        "task_context": task_context
+        "task_context": task_context,
+        "subtask_start_times": "\n".join(start_times)
     })
     return [(task, 5) for task in schedule.model_dump().values()]
 
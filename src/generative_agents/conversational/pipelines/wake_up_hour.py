@@ -3,9 +3,7 @@ from pydantic import BaseModel, Field
 from generative_agents.conversational.pipelines.grammar_llm_pipeline import grammar_pipeline
 
 
-template = """You are in a roleplay game and act as an agent. Your task is to estimate the wake up hour of an agent.
-You are {{agent_name}}. Your identity is: 
-{{agent_identity}}. 
+template = """Your task is to estimate the wake up hour of an agent.
 
 {{agent_lifestyle}}.
     
@@ -17,9 +15,8 @@ class WakeUpHour(BaseModel):
     wake_up_hour: int = Field(gt=0, lt=13, description="time in 12-hour clock format")
 
 def estimate_wake_up_hour(agent_name: str, agent_identity: str, agent_lifestyle: str) -> str:
-    wake_up_hour = grammar_pipeline.run(model=WakeUpHour, prompt_template=template, template_variables={
+    wake_up_hour = grammar_pipeline.run(model=WakeUpHour, prompt_template=template, agent=agent_name, identity=agent_identity, template_variables={
         "agent_name": agent_name,
-        "agent_identity": agent_identity,
         "agent_lifestyle": agent_lifestyle
     })
 
@@ -12,7 +12,7 @@ from generative_agents.core.cognitive_components.plan import Plan
 from generative_agents.core.cognitive_components.retrieval import Retrieval
 from generative_agents.core.memory.associative import AssociativeMemory
 from generative_agents.core.memory.spatial import MemoryTree
-from generative_agents.core.memory.scratch import Scratch
+from generative_agents.core.memory.scratch import Scratch, decode_state, encode_state
 from generative_agents.core.whisper.whisper import whisper
 from generative_agents.simulation.maze import Maze, Tile
 from generative_agents.persistence.database import initialize_agent
@@ -50,6 +50,32 @@ class Agent:
                                  row=self.scratch.tile.y)
         )
 
+    def to_state(self) -> dict[str, any]:
+        """ The json serializable state of the agent besides its memories, saved with snapshots. """
+        return {"emoji": self.emoji,
+                "activity": self.activity,
+                "description": getattr(self, "description", None),
+                "scratch": self.scratch.to_state(),
+                "last_entries": encode_state(self.associative_memory.last_entries.entries)}
+
+    def restore_state(self, state: dict[str, any], maze: Maze):
+        """ Continues from a state of to_state, the memories are restored by the database. """
+        self.emoji = state["emoji"]
+        self.activity = state["activity"]
+        if state["description"] is not None:
+            self.description = state["description"]
+        self.scratch.restore_state(state["scratch"], maze)
+        for event in decode_state(state["last_entries"], maze):
+            self.associative_memory.last_entries.put(event)
+
+        # the tile events are not part of the snapshot, the current action is placed again
+        action = self.scratch.action
+        if action:
+            self.scratch.tile.events[action.event.subject] = action.event
+            if action.object_action and action.object_action.event and action.object_action.address in maze.address_tiles:
+                maze.address_tiles[action.object_action.address][0].events[action.object_action.event.subject] = \
+                    action.object_action.event
+
     @staticmethod
     def from_dto(dto: AgentDTO, maze: Maze, time: SimulationTime):
         return Agent(name=dto.name,
@@ -1,6 +1,5 @@
 import datetime
 from functools import lru_cache
-import random
 
 from haystack import component
 
@@ -35,6 +34,8 @@ class Execution:
             # <target_tiles> is a list of tile coordinates where the persona may go
             # to execute the current action. The goal is to pick one of them.
             target_tiles = None
+            # <target_address> is set if the persona heads to a named address of the maze.
+            target_address = None
 
             if "<persona>" in plan:
                 # Executing persona-persona interaction.
@@ -62,11 +63,11 @@ class Execution:
                 # executing their action.
                 x = int(plan.split()[1])
                 y = int(plan.split()[2])
-                target_tiles = [[x, y]]
+                target_tiles = [maze.get_tile(x, y)]
 
             elif "<random>" in plan:
                 # Executing a random location action.
-                target_tiles = [maze.get_random_tile(self.agent.scratch.tile)]
+                target_tiles = [maze.get_random_tile(self.agent.scratch.tile, rng=self.agent.scratch.rng)]
             else:
                 # This is our default execution. We simply take the persona to the
                 # location where the current action is taking place.
@@ -77,57 +78,58 @@ class Execution:
                     fallback_plan = ":".join(plan.split(":")[0:-1])
 
                     if fallback_plan not in maze.address_tiles:
-                        fallback_plan = random.choice(
+                        fallback_plan = self.agent.scratch.rng.choice(
                             list(maze.address_tiles.keys()))
 
-                    target_tiles = maze.address_tiles[fallback_plan]
+                    target_address = fallback_plan
                 else:
-                    target_tiles = maze.address_tiles[plan]
-
-            # There are sometimes more than one tile returned from this (e.g., a tabe
-            # may stretch many coordinates). So, we sample a few here. And from that
-            # random sample, we will take the closest ones.
-            if len(target_tiles) < 4:
-                target_tiles = random.sample(
-                    list(target_tiles), len(target_tiles))
-            else:
-                target_tiles = random.sample(list(target_tiles), 4)
+                    target_address = plan
+
+                target_tiles = maze.address_tiles[target_address]
 
             # If possible, we want personas to occupy different tiles when they are
             # headed to the same location on the maze. It is ok if they end up on the
             # same time, but we try to lower that probability.
             # We take care of that overlap here.
-            persona_name_set = set(agents)
-            new_target_tiles = []
-            for tile in target_tiles:
-                curr_event_set = tile.events
-                pass_curr_tile = False
-                for j in curr_event_set:
-                    if j[0] in persona_name_set:
-                        pass_curr_tile = True
-                if not pass_curr_tile:
-                    new_target_tiles += [tile]
-            if len(new_target_tiles) == 0:
-                new_target_tiles = target_tiles
-            target_tiles = new_target_tiles
-            # Now that we've identified the target tile, we find the shortest path to
-            # one of the target tiles.
+            # The events of a tile are keyed by their subject, an agent's own event
+            # does not block the tile it stands on.
+            persona_name_set = set(agents) - {self.agent.name}
+
+            def is_occupied(tile):
+                for subject in tile.events:
+                    if subject in persona_name_set:
+                        return True
+                return False
+
             curr_tile = self.agent.scratch.tile
-            closest_target_tile = None
-            path = None
-            for i in target_tiles:
-                # path_finder takes a collision_mze and the curr_tile coordinate as
-                # an input, and returns a list of coordinate tuples that becomes the
-                # path.
-                # e.g., [(0, 1), (1, 1), (1, 2), (1, 3), (1, 4)...]
-                curr_path = maze.find_path(curr_tile, i)
-
-                if not closest_target_tile:
-                    closest_target_tile = i
-                    path = curr_path
-                elif len(curr_path) < len(path):
-                    closest_target_tile = i
-                    path = curr_path
+            path = []
+
+            if target_address and maze.distance_tables and target_address in maze.distance_tables:
+                # A precomputed distance table walks down to the closest tile of the
+                # whole address without a search. The tiles are only sampled if another
+                # persona already occupies that tile.
+                path = maze.find_path_to_address(curr_tile, target_address)
+                if path and is_occupied(path[-1]):
+                    path = []
+
+            if not path:
+                # There are sometimes more than one tile returned from this (e.g., a tabe
+                # may stretch many coordinates). So, we sample a few here. And from that
+                # random sample, we will take the closest ones.
+                if len(target_tiles) < 4:
+                    target_tiles = self.agent.scratch.rng.sample(
+                        list(target_tiles), len(target_tiles))
+                else:
+                    target_tiles = self.agent.scratch.rng.sample(list(target_tiles), 4)
+
+                new_target_tiles = [tile for tile in target_tiles if not is_occupied(tile)]
+                if len(new_target_tiles) == 0:
+                    new_target_tiles = target_tiles
+                target_tiles = new_target_tiles
+
+                # One multi-target search returns the path to the closest of the target
+                # tiles, e.g., [(0, 1), (1, 1), (1, 2), (1, 3), (1, 4)...]
+                path = maze.find_path_to_nearest(curr_tile, target_tiles)
 
             # Actually setting the <planned_path> and <action_path_set>. We cut the
             # first element in the planned_path because it includes the curr_tile.
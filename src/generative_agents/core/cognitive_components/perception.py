@@ -4,14 +4,12 @@
 from copy import deepcopy
 from dataclasses import asdict
 from functools import lru_cache
-import math
-from operator import itemgetter
 from haystack import component
 
 from generative_agents.conversational.pipelines.poignance import rate_poignance
 from generative_agents.core.events import Event, EventType, PerceivedEvent
 from generative_agents.core.whisper.whisper import whisper
-from generative_agents.simulation.maze import Level, Maze
+from generative_agents.simulation.maze import Maze
 from generative_agents.utils import timeit
 
 
@@ -51,43 +49,28 @@ class Perception:
 
         # PERCEIVE EVENTS.
         # We will perceive events that take place in the same arena as the
-        # persona's current arena.
-        current_arena = self.agent.scratch.tile.get_path(Level.ARENA)
+        # persona's current arena. The maze indexes the tiles with events by arena and
+        # returns them ordered by the distance to the persona's current tile, with
+        # the closest ones getting priorities.
+        nearby_events = maze.get_nearby_events(self.agent.scratch.tile,
+                                               self.agent.scratch.vision_radius)
 
         # We do not perceive the same event twice (this can happen if an object_ is
-        # extended across multiple tiles).
+        # extended across multiple tiles). We perceive only 
+        # persona.scratch.att_bandwidth of the closest events. If the bandwidth is 
+        # larger, then it means the persona can perceive more elements within a small area.
         percept_events_dict = dict()
-        # We will order our percept based on the distance, with the closest ones
-        # getting priorities.
-        percept_events_list = []
-        # First, we put all events that are occuring in the nearby tiles into the
-        # percept_events_list
-        for tile in nearby_tiles:
-            if not tile.events or tile.get_path(Level.ARENA) != current_arena:
-                continue
-
-            # This calculates the distance between the persona's current tile,
-            # and the target tile.
-            dist = math.dist([tile.x, tile.y], [
-                             self.agent.scratch.tile.x, self.agent.scratch.tile.y])
-
-            # Add any relevant events to our temp set/list with the distant info.
-            
-            try:
-                for event in tile.events.values():
-                    if event.spo_summary not in percept_events_dict:
-                        percept_events_list += [[dist, event]]
-                        percept_events_dict[event.spo_summary] = event
-                        whisper(self.agent.name, f"nearby event {event.description}")
-            except Exception as e:
-                print(e)
-        # We sort, and perceive only persona.scratch.att_bandwidth of the closest
-        # events. If the bandwidth is larger, then it means the persona can perceive
-        # more elements within a small area.
-        percept_events_list = sorted(percept_events_list, key=itemgetter(0))
         perceived_events = []
-        for dist, event in percept_events_list[:self.agent.scratch.attention_bandwith]:
-            perceived_events += [event]
+
+        for dist, tile in nearby_events:
+            for event in tile.events.values():
+                if len(perceived_events) >= self.agent.scratch.attention_bandwith:
+                    break
+
+                if event.spo_summary not in percept_events_dict:
+                    perceived_events += [event]
+                    percept_events_dict[event.spo_summary] = event
+                    whisper(self.agent.name, f"nearby event {event.description}")
 
         # Storing events.
         # <ret_events> is a list of <ConceptNode> instances from the persona's
@@ -2,18 +2,18 @@
 import datetime
 from enum import Enum
 from functools import lru_cache
-import random
+from generative_agents import global_state
 from generative_agents.utils import get_time_string, timeit
 from haystack import component
 
 from generative_agents.conversational.pipelines.poignance import rate_poignance
 
 from generative_agents.core.events import Action, Event, EventType, ObjectAction, PerceivedEvent
+from generative_agents.core.task_graph import TaskGraph
 from generative_agents.core.whisper.whisper import whisper
 from generative_agents.persistence.database import ConversationFilling
 from generative_agents.simulation.maze import Level
 from generative_agents.simulation.time import DayType
-from generative_agents.persistence import database
 
 
 from generative_agents.conversational.pipelines.wake_up_hour import estimate_wake_up_hour
@@ -28,6 +28,7 @@ from generative_agents.conversational.pipelines.action_location_game_object impo
 from generative_agents.conversational.pipelines.object_event import describe_object_state
 from generative_agents.conversational.pipelines.action_pronunciatio import action_pronunciatio
 from generative_agents.conversational.pipelines.action_event_tripple import action_event_triple
+from generative_agents.conversational.pipelines.action_resolution import resolve_action
 from generative_agents.conversational.pipelines.summarize_chat_relationship import summarize_chat_relationship
 from generative_agents.conversational.pipelines.conversation import run_conversation
 from generative_agents.conversational.pipelines.conversation_summary import conversation_summary
@@ -45,6 +46,9 @@ class ReactionMode(Enum):
     
 @component
 class Plan:
+    # maximum number of addresses offered to the fused action resolution
+    max_fused_addresses = 200
+
     def __init__(self, agent):
         self.agent = agent
 
@@ -191,10 +195,12 @@ class Plan:
         self.agent.associative_memory.add(perceived_plan)
 
     def _generate_daily_plan_and_current_status(self):
-        retrieved_events = self._get_related_to_text(
-            f"{self.agent.name}'s plan for {self.agent.scratch.time.as_string()}.", EventType.PLAN)
-        retrieved_events += self._get_related_to_text(
-            f"Important recent events for {self.agent.name}'s life.")
+        plans, recent_events = self.agent.associative_memory.retrieve_many(
+            [f"{self.agent.name}'s plan for {self.agent.scratch.time.as_string()}.",
+             f"Important recent events for {self.agent.name}'s life."],
+            [EventType.PLAN, None], limit=50)
+        # the 5 most relevant plans and the 50 most relevant recent events
+        retrieved_events = plans[EventType.PLAN][:5] + recent_events[None]
 
         statements = "[Statements]\n"
 
@@ -208,17 +214,6 @@ class Plan:
                                         statements,
                                         self.agent.scratch.current_activity)
 
-    def _get_related_to_text(self, text: str,  event_type: EventType = None):
-        if event_type:
-            memories = database.get_by_type(self.agent.name, text, event_type.value)
-        else:
-            memories = database.get(self.agent.name, text)
-
-        return [PerceivedEvent.from_db_entry(memory.text, memory.metadata) for memory in memories]
-
-    def _get_related_events(self, event: PerceivedEvent, event_type: EventType = None):
-        return self._get_related_to_text(event.description, event_type)
-    
     def _determine_action(self):
 
         def needs_decomposition(action_description: str, action_duration: int):
@@ -293,45 +288,95 @@ class Plan:
         # persona.scratch.f_daily_schedule += [["sleeping", 1440 - x_emergency]]
 
         action_description, action_duration = self.agent.scratch.daily_schedule[current_index]
-
-        action_game_object = None
-        next_address = ""
         whisper(
             self.agent.name, f"determined next action: {action_description}")
-        action_sector = self._generate_next_action_sector(action_description)
+
+        resolved = None
+        if global_state.fused_action_resolution:
+            resolved = self._resolve_action_fused(action_description)
+        if not resolved:
+            resolved = self._resolve_action_staged(action_description)
+        next_address, tile, action_pronouncio, action_event, object_action = resolved
+
+        minutes_from_now = self.agent.time.time.hour * 60 + self.agent.time.time.minute
+
+        planned_end = 0
+        for _, duration in self.agent.scratch.daily_schedule[:current_index+1]:
+            planned_end += int(duration)
+
+        minutes_left = planned_end - minutes_from_now + 1
+
+        next_action = Action(address=next_address,
+                             start_time=self.agent.scratch.time.time,
+                             duration=minutes_left,
+                             emoji=action_pronouncio,
+                             event=Event(subject=self.agent.name,
+                                         predicate=action_event[1],
+                                         object_=action_event[2],
+                                         description=action_description,
+                                         depth=0,
+                                         tile=tile
+                                         ),
+                             object_action=object_action)
+
+        if self.agent.scratch.action:
+            self.agent.scratch.finished_action.append(
+                self.agent.scratch.action)
+        self.agent.scratch.action = next_action
+
+    def _resolve_action_staged(self, action_description):
+        """
+        Determines the address, emoji, event triple and object action of a new action
+        with one LLM call per step. The address chain, the emoji and the event triple
+        do not depend on each other and are generated concurrently.
+        """
+        graph = TaskGraph()
+        graph.add("sector", lambda: self._generate_next_action_sector(action_description))
+        graph.add("arena", lambda action_sector: self._generate_next_action_arena(
+            action_description, action_sector), after=["sector"])
+        graph.add("address", lambda action_arena: self._generate_next_action_game_object(
+            action_description, action_arena), after=["arena"])
+        graph.add("pronunciatio", lambda: self._generate_action_pronunciatio(action_description))
+        graph.add("event", lambda: self._generate_action_event_triple(action_description))
+
+        def object_description(next_address):
+            if next_address == "<random>":
+                return None
+            return self._generate_action_object_description(next_address, action_description)
+
+        def object_pronunciatio(description):
+            return self._generate_action_pronunciatio(description[0]) if description else None
+
+        graph.add("object_description", object_description, after=["address"])
+        graph.add("object_pronunciatio", object_pronunciatio, after=["object_description"])
+        results = graph.run()
 
         whisper(self.agent.name,
-                f"determined next sector: {action_sector}")
-        action_arena = self._generate_next_action_arena(
-            action_description, action_sector)
-        whisper(self.agent.name, f"determined next arena: {action_arena}")
-        next_address = self._generate_next_action_game_object(
-            action_description, action_arena)
+                f"determined next sector: {results['sector']}")
+        whisper(self.agent.name, f"determined next arena: {results['arena']}")
 
+        next_address = results["address"]
         address_parts = next_address.split(":")
         tile = self.agent.spatial_memory[address_parts[0]][address_parts[1]
                                                             ][address_parts[2]].game_objects[address_parts[3]]
 
         whisper(self.agent.name,
-                f"determined next game object: {action_game_object}")
+                f"determined next game object: {next_address}")
 
-        action_pronouncio = self._generate_action_pronunciatio(
-            action_description)
+        action_pronouncio = results["pronunciatio"]
         whisper(self.agent.name,
                 f"determined next pronouncio: {action_pronouncio}")
 
-        action_event = self._generate_action_event_triple(action_description)
+        action_event = results["event"]
         whisper(self.agent.name,
                 f"determined next event triple: {action_event}")
 
         object_action = None
-        if next_address != "<random>":
-            action_object_desctiption, tripplet = self._generate_action_object_description(
-                next_address, action_description)
+        if results["object_description"]:
+            action_object_desctiption, tripplet = results["object_description"]
             whisper(
                 self.agent.name, f"determined next object description: {action_object_desctiption}")
-            action_object_pronunciatio = self._generate_action_pronunciatio(
-                action_object_desctiption)
+            action_object_pronunciatio = results["object_pronunciatio"]
             whisper(
                 self.agent.name, f"determined next object pronouncio: {action_object_pronunciatio}")
             subject, predicate, object_ = tripplet
@@ -347,31 +392,51 @@ class Plan:
                                                      depth=0,
                                                      tile=tile))
 
-        minutes_from_now = self.agent.time.time.hour * 60 + self.agent.time.time.minute
-
-        planned_end = 0
-        for _, duration in self.agent.scratch.daily_schedule[:current_index+1]:
-            planned_end += int(duration)
-
-        minutes_left = planned_end - minutes_from_now + 1
+        return next_address, tile, action_pronouncio, action_event, object_action
 
-        next_action = Action(address=next_address,
-                             start_time=self.agent.scratch.time.time,
-                             duration=minutes_left,
-                             emoji=action_pronouncio,
-                             event=Event(subject=self.agent.name,
-                                         predicate=action_event[1],
-                                         object_=action_event[2],
-                                         description=action_description,
-                                         depth=0,
-                                         tile=tile
-                                         ),
-                             object_action=object_action)
-
-        if self.agent.scratch.action:
-            self.agent.scratch.finished_action.append(
-                self.agent.scratch.action)
-        self.agent.scratch.action = next_action
+    def _resolve_action_fused(self, action_description):
+        """
+        Determines the address, emoji, event triple and object action of a new action
+        with a single LLM call. The address is chosen from the game objects of the
+        home sector, the current sector and the other known sectors, up to
+        <max_fused_addresses> addresses.
+        RETURNS:
+            same as _resolve_action_staged, None if the answer could not be used
+        """
+        world = self.agent.scratch.tile.world
+        sectors = [self.agent.scratch.home.sector, self.agent.scratch.tile.sector,
+                   *self.agent.spatial_memory[world].sectors.keys()]
+        addresses = self.agent.spatial_memory.get_accessible_addresses(world, sectors)[:self.max_fused_addresses]
+        if not addresses:
+            return None
+
+        try:
+            resolved = resolve_action(agent_name=self.agent.name,
+                                      agent_home=self.agent.scratch.home.sector,
+                                      agent_current_sector=self.agent.scratch.tile.sector,
+                                      agent_current_arena=self.agent.scratch.tile.arena,
+                                      addresses=addresses,
+                                      action_description=action_description)
+        except Exception as e:
+            whisper(self.agent.name, f"fused action resolution failed, falling back to the staged chain: {e}")
+            return None
+
+        sector, arena, game_object = resolved.address.value.split(":")
+        next_address = f"{world}:{resolved.address.value}"
+        tile = self.agent.spatial_memory[world][sector][arena].game_objects[game_object]
+        whisper(self.agent.name, f"determined next address: {next_address}, event triple: "
+                f"{self.agent.name}, {resolved.predicate}, {resolved.object}, object state: {resolved.object_state}")
+
+        object_action = ObjectAction(address=next_address,
+                                     emoji=resolved.object_emoji,
+                                     event=Event(subject=next_address,
+                                                 predicate="is",
+                                                 object_=resolved.object_state,
+                                                 description=f"{game_object} is {resolved.object_state}",
+                                                 depth=0,
+                                                 tile=tile))
+
+        return next_address, tile, resolved.emoji, (self.agent.name, resolved.predicate, resolved.object), object_action
 
     def _should_react(self, focused_event: dict[str, list[PerceivedEvent]], agents: dict[str, 'Agent']):
         """
@@ -498,7 +563,19 @@ class Plan:
                                         utterance=utterance, end=end)]
         description = self._generate_conversation_summary(filling)
 
-        self._create_react_action(inserted_action=description,
+        # the state the chat replaces, restored if the scheduler drops the reaction
+        scratch = self.agent.scratch
+        previous_state = {"action": scratch.action,
+                          "finished_action": list(scratch.finished_action),
+                          "chatting_with": scratch.chatting_with,
+                          "chat": scratch.chat,
+                          "chatting_with_buffer": scratch.chatting_with_buffer,
+                          "chatting_end_time": scratch.chatting_end_time,
+                          "daily_schedule": list(scratch.daily_schedule) if scratch.daily_schedule else scratch.daily_schedule,
+                          "planned_path": scratch.planned_path,
+                          "action_path_set": scratch.action_path_set}
+
+        chat_event = self._create_react_action(inserted_action=description,
                                   inserted_action_duration=10,
                                   action_address=f"<persona> {agent_with.name}",
                                   action_event=(
@@ -512,19 +589,32 @@ class Plan:
                                   filling=filling,
                                   action_start_time=action_start_time)
 
-        Plan(agent_with)._create_react_action(inserted_action=description,
-                                        inserted_action_duration=10,
-                                        action_address=f"<persona> {self.agent.name}",
-                                        action_event=(
-                                            agent_with.name, "chat with", self.agent.name),
-                                        chatting_with=agent_with.name,
-                                        chat="-",
-                                        chatting_with_buffer={
-                                            agent_with.name: 800},
-                                        chatting_end_time=None,
-                                        action_pronunciatio="💬",
-                                        filling=filling,
-                                        action_start_time=action_start_time)
+        # agent_with might be updated concurrently, so its reaction is applied in the
+        # commit phase of the round.
+        agent_with_name = agent_with.name
+
+        def react(agents: dict[str, 'Agent']):
+            Plan(agents[agent_with_name])._create_react_action(inserted_action=description,
+                                            inserted_action_duration=10,
+                                            action_address=f"<persona> {self.agent.name}",
+                                            action_event=(
+                                                agent_with_name, "chat with", self.agent.name),
+                                            chatting_with=agent_with_name,
+                                            chat="-",
+                                            chatting_with_buffer={
+                                                agent_with_name: 800},
+                                            chatting_end_time=None,
+                                            action_pronunciatio="💬",
+                                            filling=filling,
+                                            action_start_time=action_start_time)
+
+        def rollback():
+            for name, value in previous_state.items():
+                setattr(self.agent.scratch, name, value)
+            if not conversation or chat_event.id != conversation.id:
+                self.agent.associative_memory.remove(chat_event, conversation)
+
+        self.agent.scratch.pending_reactions.append((agent_with_name, react, rollback))
 
         if end:
             duration_minutes = round(
@@ -680,12 +770,12 @@ class Plan:
         persona_context = [context for _, context in no_self_event_retrieved.items(
         ) if ":" not in context["curr_event"].subject]
         if persona_context:
-            return random.choice(persona_context)
+            return self.agent.scratch.rng.choice(persona_context)
 
         non_idle_context = [context for _, context in no_self_event_retrieved.items(
         ) if "idle" not in context["curr_event"].description]
         if non_idle_context:
-            return random.choice(non_idle_context)
+            return self.agent.scratch.rng.choice(non_idle_context)
 
         return None
     
@@ -778,7 +868,7 @@ class Plan:
         if chatting_with_buffer:
             self.agent.scratch.chatting_with_buffer = {**self.agent.scratch.chatting_with_buffer, **chatting_with_buffer}
         self.agent.scratch.chatting_end_time = chatting_end_time
-        self.agent.associative_memory.add(event)
+        return self.agent.associative_memory.add(event)
 
     def _rate_perception_poignancy(self, event_type: EventType, description: str) -> float:
         if "idle" in description:
@@ -5,6 +5,7 @@ from haystack import component
 
 from generative_agents.conversational.pipelines.poignance import rate_poignance
 from generative_agents.core.events import Event, EventType, PerceivedEvent
+from generative_agents.core.task_graph import TaskGraph
 from generative_agents.core.whisper.whisper import whisper
 from generative_agents.persistence.database import ConversationFilling
 
@@ -35,18 +36,25 @@ class Reflection:
         if last_conversation and last_conversation.filling and last_conversation.filling[-1].end:
             evidence = [last_conversation.id]
 
-            planning_thought = self._generate_planning_thought_on_conversation(
-                last_conversation.filling)
-            whisper(self.agent.name, f"planning thought is {planning_thought}")
-            planning_thought = f"For {self.agent.scratch.name}'s planning: {planning_thought}"
-            self._add_reflection_thought(planning_thought, evidence)
+            # both thoughts only depend on the conversation, they are generated
+            # concurrently and added to the memory in order
+            graph = TaskGraph()
+            graph.add("planning_thought", lambda: self._generate_planning_thought_on_conversation(
+                last_conversation.filling))
+            graph.add("memo_thought", lambda: self._generate_memo_on_conversation(
+                last_conversation.filling))
+            graph.add("planning_event", lambda planning_thought: self._create_reflection_thought(
+                f"For {self.agent.scratch.name}'s planning: {planning_thought}", evidence), after=["planning_thought"])
+            graph.add("memo_event", lambda memo_thought: self._create_reflection_thought(
+                f"{self.agent.name} {memo_thought}", evidence), after=["memo_thought"])
+            results = graph.run()
+
+            whisper(self.agent.name, f"planning thought is {results['planning_thought']}")
+            self.agent.associative_memory.add(results["planning_event"])
             whisper(self.agent.name, f"added reflection thought")
 
-            memo_thought = self._generate_memo_on_conversation(
-                last_conversation.filling)
-            memo_thought = f"{self.agent.name} {memo_thought}"
-            whisper(self.agent.name, f"memo thought is {memo_thought}")
-            self._add_reflection_thought(memo_thought, evidence)
+            whisper(self.agent.name, f"memo thought is {results['memo_event'].description}")
+            self.agent.associative_memory.add(results["memo_event"])
         
         return {}
 
@@ -65,17 +73,22 @@ class Reflection:
         whisper(self.agent.name, f"generated {focal_points} focal points")
         # Retrieve the relevant Nodes object for each of the focal points.
         # <retrieved> has keys of focal points, and values of the associated Nodes.
-        retrieved = self.agent.associative_memory.retrieve_relevant_entries(
-            focal_points)
+        retrieved = self.agent.associative_memory.retrieve_many(
+            focal_points, limit=max(1, 50 // len(focal_points)))
 
-        whisper(self.agent.name, f"retrieved {len(retrieved)} relevant nodes")
+        whisper(self.agent.name, f"retrieved {sum(len(nodes[None]) for nodes in retrieved)} relevant nodes")
 
         # For each of the focal points, generate thoughts and save it in the
         # agent's memory.
         for nodes in retrieved:
-            thoughts = self._generate_insights_and_evidence(nodes, 5)
-            for thought, evidence in thoughts.items():
-                self._add_reflection_thought(thought, evidence)
+            thoughts = self._generate_insights_and_evidence(nodes[None], 5)
+
+            graph = TaskGraph()
+            for i, (thought, evidence) in enumerate(thoughts.items()):
+                graph.add(f"thought {i}", lambda thought=thought, evidence=evidence:
+                          self._create_reflection_thought(thought, evidence))
+            for perceived_event in graph.run().values():
+                self.agent.associative_memory.add(perceived_event)
 
     def _generate_reflection_points(self, num_points: int):
             memories = self.agent.associative_memory.get_most_recent_memories(num_points)
@@ -96,21 +109,27 @@ class Reflection:
 
         # TODO parse the output properly
         statements = '\n'.join(
-            [f'{str(count)}. {node.embedding_key}' for count, node in enumerate(memories, 1)])
+            [f'{str(count)}. {node.description}' for count, node in enumerate(memories, 1)])
 
         return evidence_and_insights(statements=statements, number_of_insights=num_insights)
 
     def _add_reflection_thought(self, thought: str, evidence: list[str]):
+        self.agent.associative_memory.add(self._create_reflection_thought(thought, evidence))
+
+    def _create_reflection_thought(self, thought: str, evidence: list[str]) -> PerceivedEvent:
         created = self.agent.scratch.time
         expiration = created + datetime.timedelta(days=30)
-        s, p, o = action_event_triple(self.agent.name, thought)
 
-        thought_poignancy = self._rate_perception_poignancy(EventType.THOUGHT, thought)
+        # the triple and the poignancy are independent LLM calls
+        graph = TaskGraph()
+        graph.add("triple", lambda: action_event_triple(self.agent.name, thought))
+        graph.add("poignancy", lambda: self._rate_perception_poignancy(EventType.THOUGHT, thought))
+        results = graph.run()
 
-        perceived_event = PerceivedEvent(subject=s, predicate=p, object_=o, description=thought,
-                                         event_type=EventType.THOUGHT, poignancy=thought_poignancy,
-                                         filling=evidence, expiration=expiration, created=created)
-        self.agent.associative_memory.add(perceived_event)
+        s, p, o = results["triple"]
+        return PerceivedEvent(subject=s, predicate=p, object_=o, description=thought,
+                              event_type=EventType.THOUGHT, poignancy=results["poignancy"],
+                              filling=evidence, expiration=expiration, created=created)
 
     def _rate_perception_poignancy(self, event_type: EventType, description: str) -> float:
         if "idle" in description:
@@ -1,11 +1,11 @@
 from dataclasses import dataclass, field
 from queue import LifoQueue
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
 from generative_agents.persistence import database
-from generative_agents.core.events import PerceivedEvent
+from generative_agents.core.events import EventType, PerceivedEvent
 
 @dataclass
 class LastEntryStore:
@@ -31,6 +31,13 @@ class LastEntryStore:
         del self.entry_hashmap[entry.id]
         self.entry_hashmap = {key: value - 1 for key, value in self.entry_hashmap.items()}
 
+    def remove(self, id: str):
+        if id not in self.entry_hashmap:
+            return
+
+        del self.entries[self.entry_hashmap[id]]
+        self.entry_hashmap = {entry.id: i for i, entry in enumerate(self.entries)}
+
     def _put(self, event: PerceivedEvent):
         if event.id in self.entry_hashmap:
             index = self.entry_hashmap[event.id]
@@ -58,19 +65,54 @@ class AssociativeMemory:
         self.last_entries.put(db_event)
         return db_event
 
+    def remove(self, event: PerceivedEvent, active_conversation: Optional[PerceivedEvent] = None):
+        """
+        Removes a chat memory that did not take place and makes <active_conversation>
+        the active conversation with its object again.
+        """
+        database.delete(self.agent_name, [event.id])
+        database.set_active_chat(self.agent_name, event.object_,
+                                 active_conversation.id if active_conversation else None)
+        self.last_entries.remove(event.id)
+
     @property
     def latest_events_summary(self):
         return [event.spo_summary for event in self.last_entries.entries]
 
     def retrieve_relevant_entries(self, context: List[str], limit=50) -> List[PerceivedEvent]:
-        memories = []
+        """
+        Retrieves limit // len(context) memories per context element, without duplicates.
+        """
+        memories = dict()
+
+        for retrieved in self.retrieve_many(context, limit=max(1, limit // len(context))):
+            for memory in retrieved[None]:
+                memories.setdefault(memory.id, memory)
+
+        return list(memories.values())
+
+    def retrieve_many(self, queries: List[str], types: List[Optional[EventType]] = None,
+                      limit=50) -> List[Dict[Optional[EventType], List[PerceivedEvent]]]:
+        """
+        Retrieves the memories relevant to each query for each type (None for memories
+        of any type) in one batch.
+        INPUT:
+            queries: texts to retrieve memories for
+            types: memory types to retrieve separately, all memories by default
+            limit: number of memories per query and type
+        OUTPUT:
+            one dict per query from the type to the retrieved memories
+        """
+        if not queries:
+            return []
+
+        types = types or [None]
+        memories = database.get_many(self.agent_name, queries, types, limit=limit)
+
+        return [{type_: [PerceivedEvent.from_db_entry(memory) for memory in per_type[i]]
+                 for i, type_ in enumerate(types)}
+                for per_type in memories]
 
-        for context_element in context:
-            memories += database.get(self.agent_name, context_element, limit=limit // len(context))
-        
-        memories = database.get(self.agent_name, context, limit=50)
-        return [PerceivedEvent.from_db_entry(memory) for memory in memories]
-    
     def last_conversation_with(self, agent_name: str) -> PerceivedEvent:
         last_chat = database.get_last_chat(self.agent_name, agent_name)
         return PerceivedEvent.from_db_entry(last_chat) if last_chat else None
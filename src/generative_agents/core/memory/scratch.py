@@ -1,15 +1,66 @@
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, is_dataclass
 import datetime
-from typing import Tuple
+import random
+from typing import Callable, Tuple
 
 from generative_agents.conversational.pipelines.identity import formulate_identity
 from generative_agents.simulation.time import SimulationTime
+from generative_agents.core import events
 from generative_agents.core.events import Action
-from generative_agents.simulation.maze import Tile
+from generative_agents.persistence.database import ConversationFilling
+from generative_agents.simulation.maze import Maze, Tile
 from generative_agents.utils import hash_string
 from generative_agents import global_state
 
+# scratch attributes that are not part of the saved state: the time is the simulation
+# clock, the random source is reseeded every round and reactions only live in a round
+_TRANSIENT_FIELDS = ("time", "rng", "pending_reactions")
+
+
+def encode_state(value: any) -> any:
+    """
+    Converts a scratch value to json: tiles, datetimes, conversation fillings and the
+    dataclasses of generative_agents.core.events are tagged dicts.
+    """
+    if isinstance(value, Tile):
+        return {"__tile__": [value.x, value.y]}
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, ConversationFilling):
+        return {"__filling__": value.model_dump()}
+    if isinstance(value, events.EventType):
+        return {"__event_type__": value.value}
+    if is_dataclass(value):
+        return {"__event__": type(value).__name__,
+                **{f.name: encode_state(getattr(value, f.name)) for f in fields(value)}}
+    if isinstance(value, (list, tuple)):
+        return [encode_state(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_state(item) for key, item in value.items()}
+    return value
+
+
+def decode_state(value: any, maze: Maze) -> any:
+    """ Inverse of encode_state, tiles are looked up in the maze. """
+    if isinstance(value, list):
+        return [decode_state(item, maze) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    if "__tile__" in value:
+        return maze.get_tile(*value["__tile__"])
+    if "__datetime__" in value:
+        return datetime.datetime.fromisoformat(value["__datetime__"])
+    if "__filling__" in value:
+        return ConversationFilling(**value["__filling__"])
+    if "__event_type__" in value:
+        return events.EventType(value["__event_type__"])
+    if "__event__" in value:
+        cls = getattr(events, value["__event__"])
+        return cls(**{key: decode_state(item, maze) for key, item in value.items() if key != "__event__"})
+    return {key: decode_state(item, maze) for key, item in value.items()}
+
 @dataclass
 class Scratch():
     name: str
@@ -46,9 +97,29 @@ class Scratch():
     # e.g., ["Dolores Murphy"] = self.vision_r
     chatting_with_buffer = dict()
 
+    # random source of the agent, reseeded by the scheduler every round
+    rng: random.Random = field(default_factory=random.Random)
+    # reactions on other agents as (name of the other agent, reaction, rollback), applied
+    # in the commit phase of the round. rollback undoes the agent's own part of a dropped
+    # reaction.
+    pending_reactions: list[Tuple[str, Callable[[dict[str, 'Agent']], None], Callable[[], None]]] = field(default_factory=list)
+
     _identity: Tuple[str, str] = ("", "")
     _last_tick: int = -1
 
+    def to_state(self) -> dict[str, any]:
+        """ The json serializable plans, action and chat state, saved with snapshots. """
+        # chatting_with_buffer is a class attribute until it is first assigned
+        names = [name for name in [*vars(self), "chatting_with_buffer"] if name not in _TRANSIENT_FIELDS]
+        return {name: encode_state(getattr(self, name)) for name in names}
+
+    def restore_state(self, state: dict[str, any], maze: Maze):
+        """ Continues from a state of to_state. """
+        for name, value in state.items():
+            setattr(self, name, decode_state(value, maze))
+        self._identity = tuple(self._identity)
+        self.time = global_state.time
+
     def should_reflect(self):
         if (self.reflection_trigger_counter <= 0): 
             return True 
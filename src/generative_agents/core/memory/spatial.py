@@ -160,5 +160,27 @@ class MemoryTree:
             return None
         return x
     
+    def get_accessible_addresses(self, curr_world, sectors):
+        """
+        Returns the addresses of all accessible game objects in the given sectors of
+        the world, in the order of the sectors.
+
+        INPUT
+            curr_world: the world the sectors are in
+            sectors: sector names, unknown sectors are skipped
+        OUTPUT
+            list of "sector:arena:game object" addresses
+        EXAMPLE OUTPUT
+            ["Hobbs Cafe:cafe:cafe customer seating", "Hobbs Cafe:cafe:piano", ...]
+        """
+        addresses = []
+        for sector in dict.fromkeys(sectors):
+            sector_memory = self.tree[curr_world][sector]
+            if not sector_memory:
+                continue
+            for arena, arena_memory in sector_memory.arenas.items():
+                addresses += [f"{sector}:{arena}:{game_object}" for game_object in arena_memory.game_objects]
+        return addresses
+
     def __deepcopy__(self, memo):
         return MemoryTree(tree=self.tree.copy())
\ No newline at end of file
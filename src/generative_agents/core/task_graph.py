@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+class _Task:
+    def __init__(self, name: str, func: Callable, after: List[str]):
+        self.name = name
+        self.func = func
+        self.after = after
+        self.claimed = False
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class TaskGraph:
+    """
+    Runs the LLM calls of an agent step by their dependencies: a task starts as soon
+    as the tasks it runs after are done, so independent calls go out concurrently
+    and dependent ones chain. A task gets the results of its dependencies as
+    positional arguments, in the order they are declared.
+
+    The tasks must not have side effects that depend on each other (e.g. adding
+    memories), those stay in the calling code after run.
+
+    Ready tasks are handed to a shared thread pool, but the calling thread runs every
+    task that no worker has picked up yet itself. So a graph always makes progress,
+    even if it is run from inside a task of another graph while the pool is busy.
+
+    EXAMPLE:
+        graph = TaskGraph()
+        graph.add("sector", lambda: generate_sector(description))
+        graph.add("arena", lambda sector: generate_arena(description, sector), after=["sector"])
+        graph.add("emoji", lambda: generate_emoji(description))
+        results = graph.run()  # {"sector": ..., "arena": ..., "emoji": ...}
+    """
+    max_workers = 16
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self):
+        self._tasks: Dict[str, _Task] = {}
+        self._condition = threading.Condition()
+
+    def add(self, name: str, func: Callable, after: List[str] = ()) -> str:
+        """
+        Declares a task.
+        ARGS:
+            name: unique name of the task, the key of its result
+            func: called with the results of the <after> tasks
+            after: names of the tasks that have to be done first, declared before
+        """
+        if name in self._tasks:
+            raise Exception(f"Task {name} is already declared")
+        for dependency in after:
+            if dependency not in self._tasks:
+                raise Exception(f"Task {name} runs after unknown task {dependency}")
+
+        self._tasks[name] = _Task(name, func, list(after))
+        return name
+
+    def run(self) -> Dict[str, any]:
+        """
+        Runs all tasks and returns their results by name. If a task raises, no new
+        tasks are started and the error of the first failed task is raised once the
+        running ones are done.
+        """
+        pending = list(self._tasks.values())
+        submitted: List[_Task] = []
+
+        while True:
+            with self._condition:
+                failed = [task for task in self._tasks.values() if task.error]
+                if not failed:
+                    ready = [task for task in pending
+                             if all(self._tasks[dependency].done for dependency in task.after)]
+                    pending = [task for task in pending if task not in ready]
+                    submitted += ready
+                else:
+                    ready = []
+                    # tasks no worker has picked up yet are not started anymore
+                    for task in submitted:
+                        if not task.claimed:
+                            task.claimed = task.done = True
+
+                unclaimed = [task for task in submitted if not task.claimed]
+                running = [task for task in submitted if task.claimed and not task.done]
+
+                if failed and not running:
+                    raise failed[0].error
+                if not pending and not unclaimed and not running:
+                    return {name: task.result for name, task in self._tasks.items()}
+                if not unclaimed and not ready:
+                    # everything left waits for a running task
+                    self._condition.wait()
+                    continue
+
+            # all but one ready task go to the pool, the calling thread runs the first
+            # unclaimed one itself
+            for task in ready[1:]:
+                self._get_executor().submit(self._run_task, task)
+            if unclaimed:
+                self._run_task(unclaimed[0])
+
+    def _run_task(self, task: _Task):
+        with self._condition:
+            if task.claimed:
+                return
+            task.claimed = True
+
+        try:
+            task.result = task.func(*[self._tasks[dependency].result for dependency in task.after])
+        except BaseException as e:
+            task.error = e
+
+        with self._condition:
+            task.done = True
+            self._condition.notify_all()
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.max_workers, thread_name_prefix="llm-task")
+            return cls._executor
@@ -3,4 +3,7 @@ from generative_agents.simulation.time import SimulationTime
 
 tick = 0
 verbose = False
+# resolve the address, emoji, event and object state of a new action in one LLM call
+# instead of the staged chain, see Plan._resolve_action_fused
+fused_action_resolution = False
 time = SimulationTime(10, from_time_string="08:58")
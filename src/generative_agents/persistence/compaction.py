@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from generative_agents.persistence.qdrant_wrapper import QdrantCollection
+from generative_agents.persistence.vector_store import VectorStore, to_number
+
+
+class CompactionPlan(NamedTuple):
+    # ids of the entries past their expiration date
+    expired: List[str]
+    # id of a merged entry -> id of the entry it was merged into
+    merged: Dict[str, str]
+    # keeper id -> payload fields updated by the merge
+    keepers: Dict[str, Dict[str, any]]
+    # ids of the entries moved to the cold tier
+    cold: List[str]
+
+
+class MemoryCompactor:
+    """
+    Background compaction of the memories of an agent:
+
+    - entries past their expiration date are dropped
+    - observations and events with the same subject, predicate and object whose
+      vectors are nearly identical are merged into the newest one, which counts them
+    - entries that were not accessed for <cold_after_hours> and have a poignancy
+      below <cold_poignancy> are moved to the cold tier of the collection
+
+    The plan is computed from a scan of the store without holding any lock, apply
+    only runs the resulting deletes and moves.
+    """
+
+    def __init__(self, merge_similarity: float = 0.95, cold_after_hours: float = 48,
+                 cold_poignancy: float = 0.3, memory_types: tuple[str, ...] = ("observation", "event")):
+        self.merge_similarity = merge_similarity
+        self.cold_after_hours = cold_after_hours
+        self.cold_poignancy = cold_poignancy
+        self.memory_types = memory_types
+
+    def plan(self, store: VectorStore, current_time: datetime) -> CompactionPlan:
+        ids, payloads, vectors = store.scan()
+        now = current_time.timestamp()
+
+        expired = [id for id, payload in zip(ids, payloads)
+                   if to_number(payload.get("expiration_date")) <= now]
+        expired_set = set(expired)
+
+        groups: Dict[Tuple[str, str, str, str], List[int]] = {}
+        for i, (id, payload) in enumerate(zip(ids, payloads)):
+            if id in expired_set or payload.get("memory_type") not in self.memory_types:
+                continue
+            key = (payload["memory_type"], payload.get("subject"), payload.get("predicate"), payload.get("object_"))
+            groups.setdefault(key, []).append(i)
+
+        merged: Dict[str, str] = {}
+        keepers: Dict[str, Dict[str, any]] = {}
+        for rows in groups.values():
+            if len(rows) > 1:
+                self._merge_group(rows, ids, payloads, vectors, merged, keepers)
+
+        cold_before = now - self.cold_after_hours * 3600
+        cold = [id for id, payload in zip(ids, payloads)
+                if id not in expired_set and id not in merged
+                and payload.get("memory_type") in self.memory_types
+                and to_number(payload.get("last_accessed_at")) < cold_before
+                and payload.get("poignancy", 1.0) < self.cold_poignancy]
+
+        return CompactionPlan(expired, merged, keepers, cold)
+
+    def _merge_group(self, rows: List[int], ids: List[str], payloads: List[Dict[str, any]], vectors: np.ndarray,
+                     merged: Dict[str, str], keepers: Dict[str, Dict[str, any]]):
+        # newest first, every entry that is not merged yet keeps the ones similar to it
+        rows = sorted(rows, key=lambda row: to_number(payloads[row].get("created_at")), reverse=True)
+        similarities = vectors[rows] @ vectors[rows].T
+
+        for i, keeper in enumerate(rows):
+            if ids[keeper] in merged:
+                continue
+
+            group = [j for j in range(i + 1, len(rows))
+                     if ids[rows[j]] not in merged and similarities[i, j] >= self.merge_similarity]
+            if not group:
+                continue
+
+            members = [keeper] + [rows[j] for j in group]
+            for row in members[1:]:
+                merged[ids[row]] = ids[keeper]
+
+            last_accessed = max(members, key=lambda row: to_number(payloads[row].get("last_accessed_at")))
+            keepers[ids[keeper]] = {
+                "count": sum(payloads[row].get("count", 1) for row in members),
+                "poignancy": max(payloads[row].get("poignancy", 0.0) for row in members),
+                "last_accessed_at": payloads[last_accessed].get("last_accessed_at"),
+            }
+
+    def apply(self, collection: QdrantCollection, plan: CompactionPlan) -> Dict[str, Optional[str]]:
+        """
+        Applies a plan to the collection it was computed for. Entries deleted or added
+        since the scan are left alone.
+        RETURNS:
+            id of every removed entry -> id of the entry it was merged into, None if expired
+        """
+        keepers = {id: payload for id, payload in plan.keepers.items() if collection.store.retrieve(id, with_vector=False)}
+        merged = [id for id, keeper in plan.merged.items() if keeper in keepers]
+
+        for id, payload in keepers.items():
+            collection.store.set_payload([id], payload)
+        collection.delete(plan.expired + merged)
+        collection.move_to_cold(plan.cold)
+        collection.mark_touched(list(keepers))
+
+        return {**{id: None for id in plan.expired}, **{id: plan.merged[id] for id in merged}}
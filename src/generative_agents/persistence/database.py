@@ -1,19 +1,63 @@
 from abc import ABC
+from datetime import datetime
 from enum import Enum
+from functools import wraps
+import os
+import shutil
+import threading
 from time import sleep
 from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
 
 from qdrant_client import QdrantClient
-from qdrant_client import models
 
+from generative_agents import global_state
+from generative_agents.persistence.compaction import MemoryCompactor
+from generative_agents.persistence.embedding_table import EmbeddingTable
+from generative_agents.persistence import embeddings
 from generative_agents.persistence.qdrant_wrapper import TimeAndImportanceWrapper, TimeAndImportanceBaseSchema
+from generative_agents.persistence.vector_store import DiskVectorStore, SharedNumpyVectorStore
+from generative_agents.persistence import snapshot
 
 import sqlite3
 
+# "numpy" keeps the memories of an agent in a SharedNumpyVectorStore, "qdrant" in a
+# collection of a local in-memory qdrant client
+VECTOR_STORE_BACKEND = "numpy"
+# precision of the shared memory vectors of the numpy backend: "float32", "float16"
+# or "int8", see EmbeddingTable. With VECTOR_RESCORE the exact vectors are kept in
+# VECTOR_EXACT_PATH on disk to re-score the best candidates of a search.
+VECTOR_PRECISION = "float32"
+VECTOR_RESCORE = True
+VECTOR_EXACT_PATH = ".generation_cache/exact_vectors.f32"
+# re-rank retrieved memories by recency, poignancy and relevance as in the generative
+# agents paper instead of by relevance only, see TimeAndImportanceWrapper
+MEMORY_RERANK = False
+# compaction moves cold memories of an agent to a disk store in <agent name> below
+COLD_MEMORY_DIRECTORY = ".generation_cache/cold_memories"
+
 _collections: Dict[str, TimeAndImportanceWrapper] = {}
-_client = QdrantClient(":memory:")
-_connection = sqlite3.connect('conversation.db')
+# collections restored from a snapshot that are not picked up by initialize_agent yet
+_restored: Dict[str, TimeAndImportanceWrapper] = {}
+# exact match index (agent, hash_key) -> memory id, mirrored in the memory_hashes table
+_hash_index: Dict[Tuple[str, str], str] = {}
+_client: Optional[QdrantClient] = None
+_compactor = MemoryCompactor()
+# vectors of the numpy stores, shared by all agents, created with the first store
+_embedding_table: Optional[EmbeddingTable] = None
+_connection = sqlite3.connect('conversation.db', check_same_thread=False)
+# agents are updated concurrently, the lock guards the sqlite connection, the
+# collections by agent and the snapshots. The vector stores lock themselves, so
+# encoding and searching the memories of different agents runs concurrently.
+_lock = threading.RLock()
+
+
+def _synchronized(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
 
 
 class MemoryType(Enum):
@@ -39,20 +83,31 @@ class MemoryEntry(TimeAndImportanceBaseSchema):
     keywords: List[str] = []
     filling: List[str | ConversationFilling] = []
 
-    hash_key: str = None
+    hash_key: Optional[str] = None
+    # number of near duplicate observations merged into this entry by compaction
+    count: int = 1
 
 
+@_synchronized
 def initialize_database(recreate: bool = False):
     if recreate:
         _connection.execute('DROP TABLE IF EXISTS active_conversations')
         _connection.execute('DROP TABLE IF EXISTS last_conversations')
+        _connection.execute('DROP TABLE IF EXISTS memory_hashes')
+        shutil.rmtree(COLD_MEMORY_DIRECTORY, ignore_errors=True)
 
     _connection.execute(
         'CREATE TABLE IF NOT EXISTS active_conversations (agent TEXT, with_agent TEXT, conversation_id TEXT, PRIMARY KEY (agent, with_agent))')
     _connection.execute(
         'CREATE TABLE IF NOT EXISTS last_conversations (agent TEXT, with_agent TEXT, conversation_id TEXT, PRIMARY KEY (agent, with_agent))')
+    _connection.execute(
+        'CREATE TABLE IF NOT EXISTS memory_hashes (agent TEXT, hash_key TEXT, memory_id TEXT, PRIMARY KEY (agent, hash_key))')
     _connection.commit()
 
+    _hash_index.clear()
+    for agent, hash_key, memory_id in _connection.execute('SELECT agent, hash_key, memory_id FROM memory_hashes'):
+        _hash_index[(agent, hash_key)] = memory_id
+
 
 def _get_active_conversation_id(agent_name: str, with_agent_name: str):
     cursor = _connection.execute(
@@ -76,26 +131,119 @@ def _set_last_conversation_id(agent_name: str, with_agent_name: str, conversatio
                         (agent_name, with_agent_name, conversation_id))
     _connection.commit()
 
+def _set_memory_hash(agent_name: str, hash_key: str, memory_id: str):
+    if _hash_index.get((agent_name, hash_key)) == memory_id:
+        return
+
+    _hash_index[(agent_name, hash_key)] = memory_id
+    _connection.execute('INSERT OR REPLACE INTO memory_hashes (agent, hash_key, memory_id) VALUES (?, ?, ?)',
+                        (agent_name, hash_key, memory_id))
+    _connection.commit()
+
+def _remap_memory_hashes(agent_name: str, removed: Dict[str, Optional[str]]):
+    """ Points the hashes of removed memories to the memories they were merged into. """
+    changed = [(hash_key, removed[memory_id]) for (agent, hash_key), memory_id in _hash_index.items()
+               if agent == agent_name and memory_id in removed]
+    for hash_key, memory_id in changed:
+        if memory_id:
+            _set_memory_hash(agent_name, hash_key, memory_id)
+        else:
+            del _hash_index[(agent_name, hash_key)]
+            _connection.execute('DELETE FROM memory_hashes WHERE agent = ? AND hash_key = ?', (agent_name, hash_key))
+    _connection.commit()
+
 def _delete_active_conversation_id(agent_name: str, with_agent_name: str):
     _connection.execute(
         'DELETE FROM active_conversations WHERE agent = ? AND with_agent = ?', (agent_name, with_agent_name))
     _connection.commit()
 
+def _create_collection(agent_name: str) -> TimeAndImportanceWrapper:
+    global _client, _embedding_table
+
+    # the dimension of the embedding model, this loads the model
+    dimension = embeddings.dimension()
+    cold_store = DiskVectorStore(os.path.join(COLD_MEMORY_DIRECTORY, agent_name), dimension)
+
+    if VECTOR_STORE_BACKEND == "numpy":
+        if _embedding_table is None:
+            exact_path = VECTOR_EXACT_PATH if VECTOR_RESCORE and VECTOR_PRECISION != "float32" else None
+            _embedding_table = EmbeddingTable(dimension, VECTOR_PRECISION, exact_path)
+        return TimeAndImportanceWrapper(
+            client=None, collection_name=agent_name, data_schema=MemoryEntry, store=SharedNumpyVectorStore(_embedding_table),
+            importance_field="poignancy", cold_store=cold_store, rerank=MEMORY_RERANK)
+    elif VECTOR_STORE_BACKEND == "qdrant":
+        if not _client:
+            _client = QdrantClient(":memory:")
+        return TimeAndImportanceWrapper(
+            client=_client, collection_name=agent_name, data_schema=MemoryEntry, importance_field="poignancy",
+            cold_store=cold_store, rerank=MEMORY_RERANK)
+    else:
+        raise Exception(f"Unknown vector store backend {VECTOR_STORE_BACKEND}")
+
+@_synchronized
 def initialize_agent(agent_name: str):
     if agent_name in _collections:
         raise Exception(f"Agent {agent_name} already exists")
 
-    _collections[agent_name] = TimeAndImportanceWrapper(
-        client=_client, collection_name=agent_name, data_schema=MemoryEntry)
+    # agents of a restored snapshot continue with their memories
+    _collections[agent_name] = _restored.pop(agent_name, None) or _create_collection(agent_name)
+
+
+@_synchronized
+def save_snapshot(directory: str, state: Dict[str, any] = None) -> int:
+    """
+    Writes the memories changed since the last snapshot and the conversation tables
+    to the snapshot directory, see snapshot.save.
+    """
+    return snapshot.save(directory, _collections, _connection, state or {})
+
+
+@_synchronized
+def restore_snapshot(directory: str) -> Dict[str, any]:
+    """
+    Restores the memories and the conversation tables of a snapshot. The memories are
+    picked up by initialize_agent, so call this before the agents are created.
+    RETURNS:
+        the state saved with the snapshot
+    """
+    def create_collection(agent_name: str) -> TimeAndImportanceWrapper:
+        # the cold tier is restored from the snapshot as well, its files may hold a
+        # later state than the snapshot
+        shutil.rmtree(os.path.join(COLD_MEMORY_DIRECTORY, agent_name), ignore_errors=True)
+        _restored[agent_name] = _create_collection(agent_name)
+        return _restored[agent_name]
+
+    state = snapshot.restore(directory, _connection, create_collection)
+    initialize_database(False)
+
+    return state
+
+
+def _get_collection(agent_name: str) -> TimeAndImportanceWrapper:
+    collection = _collections.get(agent_name)
+    if collection is None:
+        raise Exception(f"Agent {agent_name} does not exist")
+    return collection
 
 
 def add(agent_name: str, memory_entry: MemoryEntry) -> MemoryEntry:
-    if agent_name not in _collections:
-        initialize_agent(agent_name)
+    with _lock:
+        if agent_name not in _collections:
+            initialize_agent(agent_name)
+        collection = _collections[agent_name]
 
-    collection = _collections[agent_name]
+    # the entry is encoded and stored without the database lock
     memory_entry = collection.add([memory_entry])[0]
 
+    with _lock:
+        _index_memory(agent_name, memory_entry)
+    return memory_entry
+
+
+def _index_memory(agent_name: str, memory_entry: MemoryEntry):
+    if memory_entry.hash_key:
+        _set_memory_hash(agent_name, memory_entry.hash_key, memory_entry.id)
+
     if memory_entry.memory_type == MemoryType.CHAT.value:
         _set_active_conversation_id(
             agent_name, memory_entry.object_, memory_entry.id)
@@ -106,71 +254,120 @@ def add(agent_name: str, memory_entry: MemoryEntry) -> MemoryEntry:
             _delete_active_conversation_id(
                 agent_name, memory_entry.object_)
 
-    return memory_entry
 
+@_synchronized
+def flush_accesses():
+    """
+    Writes the access times recorded by the reads of all agents, called once per round.
+    """
+    for collection in _collections.values():
+        collection.flush_accesses()
+
+
+def compact_memories(current_time: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Runs the memory compaction of all agents, see MemoryCompactor. The plan of an
+    agent is computed without holding the database lock, so this can run in a
+    background thread while the agents keep reading and adding memories.
+    RETURNS:
+        number of expired, merged and cold memories
+    """
+    current_time = current_time or global_state.time.time
+    stats = {"expired": 0, "merged": 0, "cold": 0}
+
+    for agent_name, collection in list(_collections.items()):
+        # the stores lock themselves
+        plan = _compactor.plan(collection.store, current_time)
+        if not (plan.expired or plan.merged or plan.cold):
+            continue
+
+        with _lock:
+            removed = _compactor.apply(collection, plan)
+            _remap_memory_hashes(agent_name, removed)
+
+        stats["expired"] += len(plan.expired)
+        stats["merged"] += len(plan.merged)
+        stats["cold"] += len(plan.cold)
+
+    return stats
+
+
+def delete(agent_name: str, memory_ids: List[str]):
+    """
+    Removes memories of an agent, e.g. the chat of a reaction the scheduler dropped.
+    Conversations pointing to them are no longer active.
+    """
+    collection = _get_collection(agent_name)
+
+    with _lock:
+        collection.delete(memory_ids)
+        _remap_memory_hashes(agent_name, {id: None for id in memory_ids})
+        _connection.executemany('DELETE FROM active_conversations WHERE agent = ? AND conversation_id = ?',
+                                [(agent_name, id) for id in memory_ids])
+        _connection.commit()
+
+def set_active_chat(agent_name: str, with_agent_name: str, conversation_id: Optional[str]):
+    """ Makes a conversation the active one again, None ends the active conversation. """
+    with _lock:
+        if conversation_id:
+            _set_active_conversation_id(agent_name, with_agent_name, conversation_id)
+        else:
+            _delete_active_conversation_id(agent_name, with_agent_name)
 
 def get(agent_name: str, context: str, limit=50) -> MemoryEntry:
-    if not agent_name in _collections:
-        raise Exception(f"Agent {agent_name} does not exist")
+    return _get_collection(agent_name).get_relevant_entries(context, limit=limit)
 
-    result_set = _collections[agent_name].get_relevant_entries(context, limit=limit)
-    return result_set
+def get_many(agent_name: str, contexts: List[str], memory_types: List[Optional[MemoryType | str]], limit=50) -> List[List[List[MemoryEntry]]]:
+    """
+    Retrieves the memories of several contexts and memory types (None for all types)
+    in one batch.
+    RETURNS:
+        result[context][memory type]
+    """
+    collection = _get_collection(agent_name)
 
-def get_by_hash(agent_name: str, hash_key:str):
-    if not agent_name in _collections:
-        raise Exception(f"Agent {agent_name} does not exist")
+    filters = [{"memory_type": memory_type.value if isinstance(memory_type, Enum) else memory_type} if memory_type else None
+               for memory_type in memory_types]
 
-    collection = _collections[agent_name]
+    return collection.get_relevant_entries_many(contexts, filters, limit=limit)
 
-    filter = models.Filter(
-        must=[
-            models.FieldCondition(
-                key="hash_key",
-                match=models.MatchText(text=hash_key),
-            )
-        ]
-    )
+def get_by_hash(agent_name: str, hash_key:str) -> List[MemoryEntry]:
+    """
+    Exact match lookup of the memories with the given hash key, without a vector search.
+    """
+    collection = _get_collection(agent_name)
 
-    result_set = collection.get_relevant_entries(query="", filter=filter)
-    return result_set
+    id = _hash_index.get((agent_name, hash_key))
+    if not id:
+        return []
 
-def get_by_type(agent_name: str, context: str, memory_type: MemoryType):
-    if not agent_name in _collections:
-        raise Exception(f"Agent {agent_name} does not exist")
+    memory_entry = collection.get_by_id(id)
+    return [memory_entry] if memory_entry else []
 
-    collection = _collections[agent_name]
+def get_by_type(agent_name: str, context: str, memory_type: MemoryType | str):
+    collection = _get_collection(agent_name)
 
-    filter = models.Filter(
-        must=[
-            models.FieldCondition(
-                key="memory_type",
-                match=models.MatchText(text=memory_type.value),
-            )
-        ]
-    )
+    if isinstance(memory_type, Enum):
+        memory_type = memory_type.value
 
-    result_set = collection.get_relevant_entries(context, filter=filter)
+    result_set = collection.get_relevant_entries(context, filter={"memory_type": memory_type})
     return result_set
 
 def get_last_chat(agent_name, with_agent_name) -> Optional[MemoryEntry]:
-    if not agent_name in _collections:
-        raise Exception(f"Agent {agent_name} does not exist")
+    collection = _get_collection(agent_name)
 
-    collection = _collections[agent_name]
-
-    id = _get_last_conversation_id(agent_name, with_agent_name)
+    with _lock:
+        id = _get_last_conversation_id(agent_name, with_agent_name)
 
     return collection.get_by_id(id)
 
 def get_active_chat(agent_name, with_agent_name) -> Optional[MemoryEntry]:
-    if not agent_name in _collections:
-        raise Exception(f"Agent {agent_name} does not exist")
+    collection = _get_collection(agent_name)
 
-    collection = _collections[agent_name]
+    with _lock:
+        id = _get_active_conversation_id(agent_name, with_agent_name)
 
-    id = _get_active_conversation_id(agent_name, with_agent_name)
-    record = collection.get_by_id(id)
-    return MemoryEntry(**record.payload) if record else None
+    return collection.get_by_id(id)
 
 if __name__ == '__main__':
 
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+from typing import List
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Persistent per-sentence embedding cache.
+
+    All vectors live in one memory mapped float32 matrix (vectors.f32), the mapping
+    from the sentence hash to the matrix row is kept in a dict and persisted in a
+    small sqlite index. Rows are only ever appended, so a row id stays valid for the
+    lifetime of the store.
+    """
+
+    _initial_capacity = 1024
+
+    def __init__(self, directory: str, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, row INTEGER)')
+        self._connection.commit()
+
+        self._rows = dict(self._connection.execute('SELECT hash, row FROM rows'))
+        self._size = len(self._rows)
+
+        capacity = self._initial_capacity
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * dimension))
+        self._open(capacity)
+
+    def __len__(self):
+        return self._size
+
+    def lookup(self, keys: List[str]) -> np.ndarray:
+        """ Returns the row of every key, -1 for unknown keys. """
+        return np.fromiter((self._rows.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """ Returns a copy of the vectors in the given rows. """
+        matrix = self._matrix
+        return np.array(matrix[rows], dtype=np.float32)
+
+    def append(self, keys: List[str], vectors: np.ndarray) -> np.ndarray:
+        """ Stores the vectors of new keys and returns the rows of all keys. """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+
+        with self._lock:
+            rows = self.lookup(keys)
+            new = []
+            seen = set()
+            for i, key in enumerate(keys):
+                if rows[i] < 0 and key not in seen:
+                    seen.add(key)
+                    new.append(i)
+            if not new:
+                return rows
+
+            if self._size + len(new) > self._matrix.shape[0]:
+                self._open(max(self._matrix.shape[0] * 2, self._size + len(new)))
+
+            new_rows = np.arange(self._size, self._size + len(new))
+            self._matrix[new_rows] = vectors[new]
+            self._matrix.flush()
+
+            # write the index after the vectors, an interrupted append leaves unused rows only
+            self._connection.executemany('INSERT OR REPLACE INTO rows (hash, row) VALUES (?, ?)',
+                                         [(keys[i], int(row)) for i, row in zip(new, new_rows)])
+            self._connection.commit()
+
+            for i, row in zip(new, new_rows):
+                self._rows[keys[i]] = int(row)
+            self._size += len(new)
+
+            return self.lookup(keys)
+
+    def _open(self, capacity: int):
+        if hasattr(self, "_matrix"):
+            self._matrix.flush()
+
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < capacity * 4 * self.dimension:
+                f.truncate(capacity * 4 * self.dimension)
+
+        # the reference is swapped once the larger mapping exists, a concurrent get still
+        # reads the old mapping, which stays valid until its last reference is gone
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                 shape=(capacity, self.dimension))
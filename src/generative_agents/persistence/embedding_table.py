@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class EmbeddingTable:
+    """
+    Content addressed table of normalized vectors, shared by the memory stores of all
+    agents. Identical vectors - the same text embedded by the cached model - are
+    stored once and referenced by their row, so an event perceived by several agents
+    costs one vector instead of one per agent.
+
+    Every row returned by intern is a reference the store has to give back with
+    release. A row without references is freed and reused by the next new vector,
+    so deletes, merges and moves to the cold tier do not grow the table: it stays as
+    large as the most vectors referenced at any one time. A row id stays valid as
+    long as it is referenced.
+
+    The vectors are kept in <precision>: float32, float16 (half the memory) or int8
+    with a float32 scale per row (a quarter of the memory). Scores are computed from
+    the reduced precision rows in chunks, so no full float32 copy of the table is
+    ever made. With an <exact_path> the float32 vectors are also written to a memory
+    mapped file there, which exact_scores reads to re-score the best candidates.
+    """
+
+    _initial_capacity = 1024
+    # rows decoded to float32 at a time while scoring
+    _chunk_size = 4096
+
+    def __init__(self, dimension: int, precision: str = "float32", exact_path: Optional[str] = None):
+        if precision not in PRECISIONS:
+            raise Exception(f"Unknown precision {precision}, expected one of {PRECISIONS}")
+
+        self.dimension = dimension
+        self.precision = precision
+        self.dtype = np.dtype(np.float32)
+        self.exact_path = exact_path
+
+        self._codes = np.zeros((self._initial_capacity, dimension), dtype=precision)
+        self._scales = np.ones(self._initial_capacity, dtype=np.float32)
+        self._exact = None
+        if exact_path:
+            os.makedirs(os.path.dirname(exact_path) or ".", exist_ok=True)
+            # a new table starts with an empty file
+            open(exact_path, "wb").close()
+            self._open_exact(self._initial_capacity)
+
+        self._rows: Dict[bytes, int] = {}
+        self._keys: Dict[int, bytes] = {}
+        self._refs = np.zeros(self._initial_capacity, dtype=np.int64)
+        self._free: List[int] = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """ Number of referenced rows. """
+        return self._size - len(self._free)
+
+    @property
+    def exact(self) -> bool:
+        """ Whether the scores are approximate and exact_scores can re-score them. """
+        return self._exact is not None and self.precision != "float32"
+
+    def intern(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Returns the row of every vector and adds a reference to it. Vectors that are not
+        in the table yet are written to a free row or appended.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        rows = np.empty(vectors.shape[0], dtype=np.int64)
+
+        with self._lock:
+            for i, vector in enumerate(vectors):
+                key = hashlib.sha1(vector.tobytes()).digest()
+                row = self._rows.get(key)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        if self._size == self._codes.shape[0]:
+                            self._grow()
+                        row = self._size
+                        self._size += 1
+
+                    self._codes[row], self._scales[row] = self._encode(vector)
+                    if self._exact is not None:
+                        self._exact[row] = vector
+                    self._rows[key] = row
+                    self._keys[row] = key
+                self._refs[row] += 1
+                rows[i] = row
+
+        return rows
+
+    def release(self, rows: np.ndarray):
+        """ Gives back one reference to every row, rows without references are freed. """
+        with self._lock:
+            for row in np.asarray(rows, dtype=np.int64).reshape(-1):
+                self._refs[row] -= 1
+                if self._refs[row] == 0:
+                    del self._rows[self._keys.pop(int(row))]
+                    self._free.append(int(row))
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """ Returns the (decoded) float32 vectors of the rows. """
+        codes, scales = self._codes, self._scales
+        rows = np.asarray(rows, dtype=np.int64)
+        return self._decode(codes[rows], scales[rows])
+
+    def exact_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """ The float32 vectors of the rows, exact if they are kept on disk, decoded otherwise. """
+        with self._lock:
+            exact = self._exact
+        if exact is None:
+            return self.get(rows)
+        return np.array(exact[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+    def scores(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Similarities of the vectors in <rows> to the normalized queries, (rows, queries).
+        If the rows cover most of the table, the whole table is scored and the rows
+        are picked from the result, which is cheaper than gathering them first.
+        """
+        with self._lock:
+            codes, scales, size = self._codes, self._scales, self._size
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        if rows.shape[0] * 2 >= size:
+            return self._score_chunks(codes[:size], scales[:size], queries)[rows]
+        return self._score_chunks(codes[rows], scales[rows], queries)
+
+    def exact_scores(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """ Exact float32 similarities of the rows to the queries, (rows, queries). """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        with self._lock:
+            exact = self._exact
+        if exact is None:
+            return self.scores(queries, rows)
+        return np.asarray(exact[rows]) @ queries.T
+
+    def _score_chunks(self, codes: np.ndarray, scales: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        if self.precision == "float32":
+            return codes @ queries.T
+
+        scores = np.empty((codes.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], self._chunk_size):
+            end = start + self._chunk_size
+            scores[start:end] = codes[start:end].astype(np.float32) @ queries.T
+        if self.precision == "int8":
+            scores *= scales[:, np.newaxis]
+        return scores
+
+    def _encode(self, vector: np.ndarray):
+        if self.precision == "int8":
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            return np.round(vector / scale).astype(np.int8), scale
+        return vector, 1.0
+
+    def _decode(self, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        vectors = codes.astype(np.float32)
+        if self.precision == "int8":
+            vectors *= scales[..., np.newaxis]
+        return vectors
+
+    def _grow(self):
+        capacity = self._codes.shape[0] * 2
+
+        codes = np.zeros((capacity, self.dimension), dtype=self.precision)
+        codes[:self._size] = self._codes[:self._size]
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        refs = np.zeros(capacity, dtype=np.int64)
+        refs[:self._size] = self._refs[:self._size]
+        self._codes, self._scales, self._refs = codes, scales, refs
+
+        if self._exact is not None:
+            self._open_exact(capacity)
+
+    def _open_exact(self, capacity: int):
+        if self._exact is not None:
+            self._exact.flush()
+
+        with open(self.exact_path, "ab") as f:
+            if f.tell() < capacity * 4 * self.dimension:
+                f.truncate(capacity * 4 * self.dimension)
+
+        self._exact = np.memmap(self.exact_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
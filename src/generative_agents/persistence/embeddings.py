@@ -0,0 +1,172 @@
+from abc import ABC, abstractmethod
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from generative_agents.persistence.embedding_store import EmbeddingStore
+from generative_agents.utils import hash_string
+
+# "sentence-transformers" runs the model with torch, "onnx" exports it once and runs it
+# with onnxruntime on the CPU, dynamically quantized to int8 if EMBEDDING_QUANTIZE is set
+EMBEDDING_BACKEND = "sentence-transformers"
+# any sentence-transformers model with mean pooling, e.g. the much smaller
+# "sentence-transformers/all-MiniLM-L6-v2" (384 dimensions)
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDING_QUANTIZE = True
+EMBEDDING_CACHE_DIR = ".generation_cache"
+
+
+class EmbeddingBackend(ABC):
+    model_name: str
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        pass
+
+    @abstractmethod
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        """ Returns the embeddings of the sentences as a (sentences, dimension) float32 array. """
+        pass
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    def __init__(self, model_name: str):
+        # imported here, torch is only loaded once something is embedded
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self._model = SentenceTransformer(model_name)
+
+    @property
+    def dimension(self) -> int:
+        return self._model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        return np.asarray(self._model.encode(sentences, convert_to_numpy=True), dtype=np.float32)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Runs a sentence-transformers model with onnxruntime: the model is exported to
+    <cache_dir>/onnx/<model> on first use and, if <quantize> is set, dynamically
+    quantized to int8, which encodes several times faster on the CPU. The embedding
+    is the mean of the token embeddings, normalized, like the sentence-transformers
+    models with mean pooling.
+    """
+    batch_size = 32
+    max_length = 384
+
+    def __init__(self, model_name: str, quantize: bool = True, cache_dir: str = EMBEDDING_CACHE_DIR):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise Exception("The onnx embedding backend needs optimum, install it with pip install optimum[onnxruntime]")
+
+        self.model_name = model_name
+        directory = os.path.join(cache_dir, "onnx", model_name.replace("/", "__"))
+
+        if not os.path.exists(os.path.join(directory, "model.onnx")):
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            model.save_pretrained(directory)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(directory)
+
+        file_name = "model.onnx"
+        if quantize:
+            file_name = "model_quantized.onnx"
+            if not os.path.exists(os.path.join(directory, file_name)):
+                quantizer = ORTQuantizer.from_pretrained(directory)
+                quantizer.quantize(save_dir=directory,
+                                   quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+
+        self._model = ORTModelForFeatureExtraction.from_pretrained(directory, file_name=file_name)
+        self._tokenizer = AutoTokenizer.from_pretrained(directory)
+
+    @property
+    def dimension(self) -> int:
+        return self._model.config.hidden_size
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        embeddings = []
+        for start in range(0, len(sentences), self.batch_size):
+            inputs = self._tokenizer(sentences[start:start + self.batch_size], padding=True, truncation=True,
+                                     max_length=self.max_length, return_tensors="np")
+            tokens = self._model(**inputs).last_hidden_state
+
+            mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+            pooled = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            embeddings.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+
+        return np.concatenate(embeddings).astype(np.float32) if embeddings else np.empty((0, self.dimension), np.float32)
+
+
+class CachedBackend(EmbeddingBackend):
+    """
+    Looks up every sentence in a persistent embedding store first, only the sentences
+    that are not cached yet are sent to the backend - in one batch.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, directory: str):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.store = EmbeddingStore(directory, backend.dimension)
+
+    @property
+    def dimension(self) -> int:
+        return self.backend.dimension
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        keys = [hash_string(sentence) for sentence in sentences]
+        rows = self.store.lookup(keys)
+
+        if (rows < 0).any():
+            missing = list({keys[i]: sentences[i] for i in np.flatnonzero(rows < 0)}.items())
+            embeddings = self.backend.encode([sentence for _, sentence in missing])
+            self.store.append([key for key, _ in missing], embeddings)
+            rows = self.store.lookup(keys)
+
+        return self.store.get(rows)
+
+
+_backend: Optional[EmbeddingBackend] = None
+_lock = threading.Lock()
+
+
+def create_backend(backend: str = None, model_name: str = None, quantize: bool = None) -> EmbeddingBackend:
+    """ Creates the cached embedding backend, by default the one configured above. """
+    backend = backend or EMBEDDING_BACKEND
+    model_name = model_name or EMBEDDING_MODEL
+    quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+
+    if backend == "sentence-transformers":
+        model, suffix = SentenceTransformerBackend(model_name), ""
+    elif backend == "onnx":
+        model, suffix = OnnxBackend(model_name, quantize), "__onnx-int8" if quantize else "__onnx"
+    else:
+        raise Exception(f"Unknown embedding backend {backend}")
+
+    # quantized embeddings differ slightly, so every backend gets its own cache
+    return CachedBackend(model, os.path.join(EMBEDDING_CACHE_DIR, "embed", model_name.replace("/", "__") + suffix))
+
+
+def get_backend() -> EmbeddingBackend:
+    """ The embedding backend of the simulation, loaded on first use. """
+    global _backend
+
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def encode(sentences: List[str]) -> np.ndarray:
+    return get_backend().encode(sentences)
+
+
+def dimension() -> int:
+    return get_backend().dimension
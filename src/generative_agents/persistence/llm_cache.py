@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Optional
+
+from generative_agents import global_state
+
+
+class LLMCache:
+    """
+    Content addressed store for LLM responses in a single sqlite file.
+
+    Entries are keyed on the normalized prompt, the model and the generation kwargs,
+    so a response is reused across ticks and runs. With tick_scoped=True the current
+    tick becomes part of the key, which reproduces a simulation run step by step.
+
+    The cache keeps at most max_entries entries and max_bytes bytes of responses and
+    evicts the least recently used entries when it grows beyond that. export_to and
+    import_from move the entries between machines, e.g. to replay a simulated day
+    without a single LLM call.
+    """
+
+    def __init__(self, path: str = ".generation_cache/llm.sqlite", tick_scoped: bool = False,
+                 max_entries: int = 500_000, max_bytes: int = 2 * 1024 ** 3):
+        self.path = path
+        self.tick_scoped = tick_scoped
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, output TEXT, size INTEGER, last_used_at REAL)')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at)')
+        self._connection.commit()
+
+        self._entries, self._bytes = self._connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """ Strips trailing whitespace of every line and leading/trailing blank lines. """
+        return "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+
+    def key(self, prompt: str, model: str, generation_kwargs: dict[str, any]) -> str:
+        signature = {
+            "prompt": self.normalize_prompt(prompt),
+            "model": model,
+            "generation_kwargs": generation_kwargs or {},
+        }
+        if self.tick_scoped:
+            signature["tick"] = global_state.tick
+
+        return hashlib.sha256(json.dumps(signature, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict[str, any]]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT output FROM responses WHERE key = ?', (key,)).fetchone()
+
+            if not row:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                'UPDATE responses SET last_used_at = ? WHERE key = ?', (time(), key))
+            self._connection.commit()
+
+        return json.loads(row[0])
+
+    def put(self, key: str, output: dict[str, any]):
+        serialized = json.dumps(output)
+
+        with self._lock:
+            self._insert(key, serialized)
+            self._connection.commit()
+            self._evict()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._entries,
+                "bytes": self._bytes}
+
+    def export_to(self, path: str) -> int:
+        """
+        Writes all entries as json lines to path and returns the number of entries.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT key, output FROM responses').fetchall()
+
+        with open(path, "w") as f:
+            for key, output in rows:
+                f.write(json.dumps({"key": key, "output": json.loads(output)}) + "\n")
+
+        return len(rows)
+
+    def import_from(self, path: str) -> int:
+        """
+        Reads entries written by export_to and returns the number of imported entries.
+        """
+        count = 0
+        with open(path, "r") as f, self._lock:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._insert(entry["key"], json.dumps(entry["output"]))
+                count += 1
+
+            self._connection.commit()
+            self._evict()
+
+        return count
+
+    def _insert(self, key: str, serialized: str):
+        row = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row:
+            self._entries -= 1
+            self._bytes -= row[0]
+
+        self._connection.execute('INSERT OR REPLACE INTO responses (key, output, size, last_used_at) VALUES (?, ?, ?, ?)',
+                                 (key, serialized, len(serialized), time()))
+        self._entries += 1
+        self._bytes += len(serialized)
+
+    def _evict(self):
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+
+        # evict down to 90% so we do not evict on every insert
+        target_entries = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9)
+
+        cursor = self._connection.execute('SELECT key, size FROM responses ORDER BY last_used_at ASC')
+        evicted = []
+        for key, size in cursor:
+            if self._entries <= target_entries and self._bytes <= target_bytes:
+                break
+            evicted.append((key,))
+            self._entries -= 1
+            self._bytes -= size
+
+        self._connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        self._connection.commit()
+        self.evictions += len(evicted)
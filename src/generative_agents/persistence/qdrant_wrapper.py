@@ -1,26 +1,24 @@
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type, TypeVar
 import uuid
+
+import numpy as np
 from pydantic import BaseModel, Field
 
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient, models
+from qdrant_client import QdrantClient
 
 from datetime import datetime
 
 from generative_agents import global_state
-from generative_agents.persistence.cachable_sentence_transformer import CachableSentenceTransformer
-
+from generative_agents.persistence import embeddings
+from generative_agents.persistence.vector_store import QdrantVectorStore, StoredPoint, VectorStore
 
-_model = CachableSentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-
-DIMENSION = 768
 
 class BaseSchema(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     content: str
-    vector: List[float] = None
+    vector: Optional[List[float]] = None
 
 
 class TimeAndImportanceBaseSchema(BaseSchema):
@@ -34,93 +32,226 @@ T = TypeVar("T", bound=BaseSchema)
 K = TypeVar("K", bound=TimeAndImportanceBaseSchema)
 
 
+class CollectionChanges(NamedTuple):
+    # ids of the entries added or changed in the store, written with their vectors
+    dirty: List[str]
+    # ids of the entries whose payload changed in the store, written without vectors
+    touched: List[str]
+    # ids of the entries moved to the cold tier
+    cold: List[str]
+    # ids of the removed entries
+    deleted: List[str]
+
+
 class QdrantCollection:
-    _rerank_limit: int = 200
+    # number of nearest neighbours the wrappers re-rank
+    rerank_limit: int = 200
 
-    def __init__(self, client: QdrantClient,
+    def __init__(self, client: Optional[QdrantClient],
                  collection_name: str,
                  data_schema: Type[T],
-                 decay_rate: float = Field(default=0.01)):
+                 decay_rate: float = Field(default=0.01),
+                 store: Optional[VectorStore] = None,
+                 cold_store: Optional[VectorStore] = None):
+        """
+        ARGS:
+            client: qdrant client, only used if no store is given
+            store: vector store of the collection, a qdrant collection of the client by default
+            cold_store: store of the entries moved out of <store> by move_to_cold
+        """
         self.client = client
         self.collection_name = collection_name
         self.data_schema = data_schema
         self.decay_rate = decay_rate
-
-        if collection_name not in self.client.get_collections():
-            vectors_config = models.VectorParams(size=DIMENSION,
-                                                 distance=models.Distance.COSINE)
-            self.client.create_collection(
-                collection_name, vectors_config=vectors_config)
-            self.client.create_payload_index(
-                self.collection_name, field_name="memory_type", field_schema="keyword")
-            self.client.create_payload_index(
-                self.collection_name, field_name="created", field_schema="integer")
+        if store is None:
+            store = QdrantVectorStore(client, collection_name, embeddings.dimension())
+        self.store = store
+        self.cold_store = cold_store
+        # ids of the entries read since the last flush_accesses and when they were read
+        self._accessed: Dict[str, datetime] = {}
+        # ids of the entries changed, moved and removed since the last snapshot
+        self._dirty: set[str] = set()
+        self._touched: set[str] = set()
+        self._cold: set[str] = set()
+        self._deleted: set[str] = set()
+
+    def _encode_query(self, query) -> np.ndarray:
+        return self._encode_queries([query])[0]
+
+    def _encode_queries(self, queries: List) -> np.ndarray:
+        """ Encodes the queries in one batch, list queries are joined to one text. """
+        queries = [", ".join(query) if type(query) == list else query for query in queries]
+        return embeddings.encode(queries)
 
     def _get_relevant_entries_with_scores(self, query, filter=None, limit=5) -> List[Tuple[T, float]]:
-        
-        if type(query) == list:
-            query = ", ".join(query)
-
-        query_vector = _model.encode(query)
-        try:
-            points = self.client.search(collection_name=self.collection_name,
-                                    query_filter=filter,
-                                    limit=limit,
-                                    query_vector=query_vector, 
-                                    with_vectors=True)
-        except Exception as e:
-            raise Exception(f"Error raised by Qdrant: {e}")              
+        points = self.store.search(self._encode_query(query), limit=limit, filter=filter)
 
-        result = []
-        for point in points:
-            _id = point.id
-            score = point.score
-            payload = point.payload
-            payload["vector"] = point.vector
-            result.append((self.data_schema(id=_id, **payload), score))
-
-        return result
+        return [(self._to_entry(point), point.score) for point in points]
 
     def get_relevant_entries(self, query, filter=None, limit=5) -> List[T]:
         result = self._get_relevant_entries_with_scores(query, filter, limit)
         result = [entry for entry, _ in result]
-        return self.add(result, new_vectors=False)
+        return self._mark_accessed(result)
+
+    def flush_accesses(self):
+        """
+        Writes the access times of the entries read since the last flush to the store.
+        Reads only record the access, so they never write to the store themselves.
+        """
+        if not self._accessed:
+            return
+
+        accessed, self._accessed = self._accessed, {}
+
+        by_time: Dict[datetime, List[str]] = {}
+        for id, accessed_at in accessed.items():
+            by_time.setdefault(accessed_at, []).append(id)
+
+        if self.cold_store is not None:
+            # entries read from the cold tier are used again, so they move back
+            cold = [id for id in accessed if self.cold_store.retrieve(id, with_vector=False)]
+            moved = self._move(cold, self.cold_store, self.store)
+            self._cold.difference_update(moved)
+            self._dirty.update(moved)
+
+        for accessed_at, ids in by_time.items():
+            self.store.set_payload(ids, {"last_accessed_at": accessed_at})
+        # only the access time changed, snapshots write these entries without vectors
+        self.mark_touched(list(accessed))
+
+    def pop_changes(self) -> CollectionChanges:
+        """ Returns the ids of the entries changed, moved and removed since the last call. """
+        dirty, self._dirty = self._dirty, set()
+        touched, self._touched = self._touched - dirty, set()
+        cold, self._cold = self._cold, set()
+        deleted, self._deleted = self._deleted, set()
+        return CollectionChanges(list(dirty), list(touched), list(cold), list(deleted))
+
+    def mark_dirty(self, ids: List[str]):
+        self._dirty.update(ids)
+
+    def mark_touched(self, ids: List[str]):
+        """ Marks entries of the store whose payload changed, but not their vector. """
+        self._touched.update(ids)
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+
+        self.store.delete(ids)
+        if self.cold_store is not None:
+            self.cold_store.delete(ids)
+
+        for id in ids:
+            self._accessed.pop(id, None)
+            self._dirty.discard(id)
+            self._touched.discard(id)
+            self._cold.discard(id)
+        self._deleted.update(ids)
+
+    def move_to_cold(self, ids: List[str]):
+        """
+        Moves entries to the cold tier, which is only searched if the entries in the
+        store do not match a query well. Snapshots write them to the cold tier.
+        """
+        if self.cold_store is None:
+            return
+
+        moved = self._move(ids, self.store, self.cold_store)
+        self._dirty.difference_update(moved)
+        self._touched.difference_update(moved)
+        self._cold.update(moved)
+
+    @staticmethod
+    def _move(ids: List[str], source: VectorStore, target: VectorStore) -> List[str]:
+        # retrieve returns the exact vectors if the source keeps them, so a move does not
+        # store the decoded vectors of a reduced precision store
+        points = [point for point in (source.retrieve(id) for id in ids) if point]
+        if not points:
+            return []
+
+        moved = [point.id for point in points]
+        target.upsert(moved, np.asarray([point.vector for point in points], dtype=np.float32),
+                      [point.payload for point in points])
+        source.delete(moved)
+        return moved
+
+    def _mark_accessed(self, entries: List[T]) -> List[T]:
+        if "last_accessed_at" not in self.data_schema.model_fields:
+            return entries
+
+        current_time = global_state.time.time
+        for entry in entries:
+            entry.last_accessed_at = current_time
+            self._accessed[entry.id] = current_time
+        return entries
 
     def get_by_id(self, id: str) -> Optional[T]:
-        points = self.client.retrieve(collection_name=self.collection_name,
-                                        ids=[id])
-        return points[0] if points else None
+        if not id:
+            return None
+
+        point = self.store.retrieve(id, with_vector=False)
+        if point is None and self.cold_store is not None:
+            point = self.cold_store.retrieve(id, with_vector=False)
+        return self._to_entry(point) if point else None
 
     def add(self, entries: List[T], new_vectors=True) -> List[T]:
         if any([not isinstance(entry, self.data_schema) for entry in entries]):
             raise Exception("Entries must be of type {}".format(
                 self.data_schema.__name__))
 
+        if not entries:
+            return entries
+
         ids = [entry.id for entry in entries]
-        payloads = [entry.model_dump(exclude=["id"]) for entry in entries]
+        # the vector is stored by the vector store, not as part of the payload
+        payloads = [entry.model_dump(exclude=["id", "vector"]) for entry in entries]
 
+        # the entries do not keep the encoded vectors, reads return them without vectors as well
         if new_vectors or not all([entry.vector for entry in entries]):
-            vectors = _model.encode([entry.content for entry in entries])
+            vectors = embeddings.encode([entry.content for entry in entries])
         else:
             vectors = [entry.vector for entry in entries]
 
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=models.Batch(
-                ids=ids,
-                payloads=payloads,
-                vectors=vectors
-            )
-        )
+        self.store.upsert(ids, vectors, payloads)
+        self._dirty.update(ids)
+        self._cold.difference_update(ids)
+        self._deleted.difference_update(ids)
 
         return entries
 
+    def _to_entry(self, point: StoredPoint) -> T:
+        return self.data_schema(id=point.id, **point.payload, vector=point.vector)
 
-class TimeAndImportanceWrapper(QdrantCollection):
-    rerank_limit = 200
 
-    def __init__(self, client: QdrantClient, collection_name: str, data_schema: Type[K], decay_rate: float = 0.01):
-        self.collection = super().__init__(client, collection_name, data_schema, decay_rate=decay_rate)
+class TimeAndImportanceWrapper(QdrantCollection):
+    """
+    Retrieves the entries most similar to the query. With rerank, retrieval works as
+    in the generative agents paper: the <rerank_limit> entries most similar to the
+    query are re-ranked by the weighted sum of recency, importance and relevance, each
+    one min-max normalized over the candidates.
+
+    recency decays exponentially with the hours since the entry was last accessed,
+    importance is read from <importance_field> of the entries.
+    """
+    recency_weight: float = 1.0
+    importance_weight: float = 1.0
+    relevance_weight: float = 1.0
+    # the cold tier is searched as well if no entry of the store is more similar
+    cold_search_threshold: float = 0.5
+
+    def __init__(self, client: Optional[QdrantClient], collection_name: str, data_schema: Type[K], decay_rate: float = 0.01,
+                 store: Optional[VectorStore] = None, importance_field: str = "importance",
+                 cold_store: Optional[VectorStore] = None, rerank: bool = False):
+        """
+        ARGS:
+            importance_field: payload field with the importance of an entry
+            rerank: re-rank by recency, importance and relevance instead of relevance only
+        """
+        self.collection = super().__init__(client, collection_name, data_schema, decay_rate=decay_rate, store=store,
+                                           cold_store=cold_store)
+        self.importance_field = importance_field
+        self.rerank = rerank
 
     def add(self, entries: List[K], new_vectors=True) -> List[K]:
         current_time = global_state.time.time
@@ -131,43 +262,84 @@ class TimeAndImportanceWrapper(QdrantCollection):
         return super().add(entries, new_vectors)
 
     def get_relevant_entries(self, query, filter=None, limit=5) -> List[K]:
-        candiates = super()._get_relevant_entries_with_scores(
-            query, filter, self.rerank_limit)
+        return self.get_relevant_entries_many([query], [filter], limit)[0][0]
+
+    def get_relevant_entries_many(self, queries: List, filters: List[Optional[Dict[str, any]]], limit=5) -> List[List[List[K]]]:
+        """
+        Retrieves the entries of several queries and filters at once: the queries are
+        encoded in one batch and scored against all entries in one matrix product.
+        RETURNS:
+            result[query][filter], the best <limit> entries of each pair
+        """
+        query_vectors = self._encode_queries(queries)
+        fields = ["last_accessed_at", self.importance_field]
+        candidate_limit = self.rerank_limit if self.rerank else limit
+        candidates = self.store.search_columns_many(query_vectors, candidate_limit, fields, filters)
         current_time = global_state.time.time
 
-        combined_scores = [(entry, self._get_combined_score(
-            entry, score, current_time)) for entry, score in candiates]
-        combined_scores.sort(key=lambda x: x[1], reverse=True)
-
         result = []
+        for query_vector, per_filter in zip(query_vectors, candidates):
+            result.append([])
+            for filter, (ids, relevance, columns) in zip(filters, per_filter):
+                if self.cold_store is not None and len(self.cold_store) and \
+                        (not ids or relevance.max() < self.cold_search_threshold):
+                    ids, relevance, columns = self._add_cold_candidates(query_vector, fields, filter, candidate_limit,
+                                                                        ids, relevance, columns)
+
+                if not ids:
+                    result[-1].append([])
+                    continue
+
+                scores = relevance
+                if self.rerank:
+                    scores = self._get_combined_scores(relevance, columns["last_accessed_at"],
+                                                       columns[self.importance_field], current_time)
+                result[-1].append(self._mark_accessed(self._resolve(ids, np.argsort(-scores, kind="stable"), limit)))
 
-        for entry, _ in combined_scores[: limit]:
-            entry.last_accessed_at = current_time
-            result += [entry]
-
-        return self.add(result, new_vectors=False)
-
-    def _get_entry_date(self, field: str, entry: K) -> datetime:
-        """Return the value of the date field of a document."""
-        return getattr(entry, field)
-
-    def _get_combined_score(
-        self,
-        entry: K,
-        vector_relevance: float,
-        current_time: datetime,
-    ) -> float:
-        """Return the combined score for a document."""
-        hours_passed = self._get_hours_passed(
-            current_time,
-            self._get_entry_date("last_accessed_at", entry),
-        )
-        score = (1.0 - self.decay_rate) ** hours_passed
-        score += entry.importance
-        score += vector_relevance
-        return score
+        return result
+
+    def _resolve(self, ids: List[str], order: np.ndarray, limit: int) -> List[K]:
+        """
+        The first <limit> entries of the ranked candidates that still exist. Compaction
+        may delete or merge a candidate between the search and its lookup.
+        """
+        entries = []
+        for i in order:
+            entry = self.get_by_id(ids[i])
+            if entry is not None:
+                entries.append(entry)
+                if len(entries) == limit:
+                    break
+        return entries
+
+    def _add_cold_candidates(self, query_vector: np.ndarray, fields: List[str], filter: Optional[Dict[str, any]],
+                             limit: int, ids: List[str], relevance: np.ndarray, columns: Dict[str, np.ndarray]):
+        """ Appends the <limit> best candidates of the cold tier that are not in the store. """
+        cold_ids, cold_relevance, cold_columns = self.cold_store.search_columns(query_vector, limit, fields, filter)
+        known = set(ids)
+        new = [i for i, id in enumerate(cold_ids) if id not in known]
+        if not new:
+            return ids, relevance, columns
+
+        return (ids + [cold_ids[i] for i in new],
+                np.concatenate([relevance, cold_relevance[new]]),
+                {field: np.concatenate([columns[field], cold_columns[field][new]]) for field in fields})
+
+    def _get_combined_scores(self, relevance: np.ndarray, last_accessed_at: np.ndarray,
+                             importance: np.ndarray, current_time: datetime) -> np.ndarray:
+        """Return the combined scores of the candidates, last_accessed_at as timestamps."""
+        hours_passed = (current_time.timestamp() - last_accessed_at) / 3600
+        recency = (1.0 - self.decay_rate) ** hours_passed
+
+        return (self.recency_weight * self._normalize(recency)
+                + self.importance_weight * self._normalize(importance)
+                + self.relevance_weight * self._normalize(relevance))
 
     @staticmethod
-    def _get_hours_passed(time: datetime, ref_time: datetime) -> float:
-        """Get the hours passed between two datetimes."""
-        return (time - ref_time).total_seconds() / 3600
+    def _normalize(values: np.ndarray) -> np.ndarray:
+        """Min-max normalizes the values to [0, 1], missing values count as the minimum."""
+        values = np.nan_to_num(values, nan=np.nanmin(values) if not np.isnan(values).all() else 0.0)
+        spread = values.max() - values.min()
+        if spread == 0:
+            return np.full_like(values, 0.5)
+        return (values - values.min()) / spread
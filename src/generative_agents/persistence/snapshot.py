@@ -0,0 +1,242 @@
+import json
+import os
+import sqlite3
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from generative_agents.persistence.qdrant_wrapper import QdrantCollection
+from generative_agents.persistence.vector_store import VectorStore
+
+SNAPSHOT_VERSION = 2
+# an agent's segments are consolidated into one at this many segments, or once they
+# hold CONSOLIDATE_RATIO times more entries than the agent has memories (at least
+# CONSOLIDATE_MIN_ENTRIES)
+MAX_SEGMENTS = 50
+CONSOLIDATE_RATIO = 2
+CONSOLIDATE_MIN_ENTRIES = 1000
+
+MANIFEST_FILE = "manifest.json"
+CONVERSATION_FILE = "conversation.db"
+
+
+def _read_manifest(directory: str) -> Dict[str, any]:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"version": SNAPSHOT_VERSION, "generation": 0, "agents": {}}
+
+    with open(path, "r") as f:
+        manifest = json.load(f)
+
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise Exception(f"Snapshot {directory} has version {manifest['version']}, expected {SNAPSHOT_VERSION}")
+    return manifest
+
+
+def _write_json(path: str, data: Dict[str, any]):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def exists(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+
+def _payload_columns(collection: QdrantCollection, ids: List[str],
+                     payloads: List[Dict[str, any]]) -> Dict[str, List[any]]:
+    payloads = [collection.data_schema(id=id, **payload).model_dump(mode="json", exclude={"id", "vector"})
+                for id, payload in zip(ids, payloads)]
+    return {field: [payload.get(field) for payload in payloads] for field in payloads[0]} if payloads else {}
+
+
+def _retrieve(store: VectorStore, ids: List[str], with_vector: bool = True) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+    points = [point for point in (store.retrieve(id, with_vector=with_vector) for id in ids) if point]
+    vectors = np.asarray([point.vector for point in points] if with_vector else [], dtype=np.float32)
+    return [point.id for point in points], [point.payload for point in points], vectors.reshape(-1, store.dimension)
+
+
+def _retrieve_payloads(collection: QdrantCollection, ids: List[str]) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+    """ The payloads of the entries, from the tier that holds them. """
+    found, payloads, vectors = _retrieve(collection.store, ids, with_vector=False)
+    if collection.cold_store is not None:
+        known = set(found)
+        cold_ids, cold_payloads, _ = _retrieve(collection.cold_store, [id for id in ids if id not in known],
+                                               with_vector=False)
+        found, payloads = found + cold_ids, payloads + cold_payloads
+    return found, payloads, vectors
+
+
+def _write_segment(path: str, collection: QdrantCollection, hot: Tuple[List[str], List[Dict[str, any]], np.ndarray],
+                   cold: Tuple[List[str], List[Dict[str, any]], np.ndarray],
+                   touched: Tuple[List[str], List[Dict[str, any]], np.ndarray], deleted: List[str]) -> int:
+    hot_ids, hot_payloads, hot_vectors = hot
+    cold_ids, cold_payloads, cold_vectors = cold
+    touched_ids, touched_payloads, _ = touched
+
+    np.concatenate([hot_vectors, cold_vectors]).astype(np.float32).tofile(path + ".f32")
+    _write_json(path + ".json", {
+        "ids": hot_ids,
+        "cold_ids": cold_ids,
+        "dimension": int(hot_vectors.shape[1]),
+        "columns": _payload_columns(collection, hot_ids + cold_ids, hot_payloads + cold_payloads),
+        "touched": {"ids": touched_ids,
+                    "columns": _payload_columns(collection, touched_ids, touched_payloads)},
+        "deleted": deleted,
+    })
+    return len(hot_ids) + len(cold_ids) + len(touched_ids)
+
+
+def _should_consolidate(agent: Dict[str, any], collection: QdrantCollection) -> bool:
+    if len(agent["segments"]) >= MAX_SEGMENTS:
+        return True
+    size = len(collection.store) + (len(collection.cold_store) if collection.cold_store is not None else 0)
+    return agent["entries"] > CONSOLIDATE_RATIO * max(size, CONSOLIDATE_MIN_ENTRIES)
+
+
+def save(directory: str, collections: Dict[str, QdrantCollection], connection: sqlite3.Connection,
+         state: Dict[str, any]) -> int:
+    """
+    Writes the entries changed since the last snapshot as a new segment per agent and
+    a copy of the conversation tables. The manifest is replaced last, so an
+    interrupted snapshot leaves the previous one intact.
+
+    A segment consists of <segment>.f32 with the raw float32 vectors of its entries
+    and <segment>.json with the ids of the entries of the store and of the cold tier,
+    their payload fields as columns, the payloads of the entries whose payload only
+    changed (e.g. their access time), which are written without vectors, and the ids
+    of the removed entries. Loading applies the segments in order, so later versions
+    of an entry replace older ones.
+
+    Once an agent has MAX_SEGMENTS segments or its segments hold CONSOLIDATE_RATIO
+    times more entries than it has memories, its memories are written to one new
+    segment instead, which replaces all of its segments.
+    ARGS:
+        directory: snapshot directory, created if missing
+        collections: memory collections by agent name
+        connection: connection of the conversation database
+        state: json serializable simulation state stored in the manifest
+    RETURNS:
+        number of entries written
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    generation = manifest["generation"] + 1
+    written = 0
+    # segment files replaced by a consolidation, removed once the manifest is written
+    obsolete: List[str] = []
+
+    for agent_name, collection in collections.items():
+        changes = collection.pop_changes()
+        agent = manifest["agents"].setdefault(
+            agent_name, {"directory": f"agent-{len(manifest['agents']):03d}", "segments": [], "entries": 0})
+
+        agent_directory = os.path.join(directory, agent["directory"])
+        os.makedirs(agent_directory, exist_ok=True)
+        segment = f"segment-{generation:06d}"
+        path = os.path.join(agent_directory, segment)
+
+        if agent["segments"] and _should_consolidate(agent, collection):
+            # the whole state of the agent, the changes are part of it
+            empty = ([], [], np.empty((0, collection.store.dimension), dtype=np.float32))
+            entries = _write_segment(path, collection, collection.store.scan(),
+                                     collection.cold_store.scan() if collection.cold_store is not None else empty,
+                                     empty, [])
+            obsolete += [os.path.join(agent_directory, old) for old in agent["segments"]]
+            agent["segments"], agent["entries"] = [segment], entries
+            written += entries
+            continue
+
+        if not any(changes):
+            continue
+
+        cold_store = collection.cold_store if collection.cold_store is not None else collection.store
+        entries = _write_segment(path, collection,
+                                 _retrieve(collection.store, changes.dirty),
+                                 _retrieve(cold_store, changes.cold),
+                                 _retrieve_payloads(collection, changes.touched),
+                                 changes.deleted)
+
+        agent["segments"].append(segment)
+        agent["entries"] += entries + len(changes.deleted)
+        written += entries
+
+    conversation_path = os.path.join(directory, CONVERSATION_FILE)
+    with sqlite3.connect(conversation_path + ".tmp") as target:
+        connection.backup(target)
+    target.close()
+    os.replace(conversation_path + ".tmp", conversation_path)
+
+    manifest.update({"generation": generation, "state": state})
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+
+    for path in obsolete:
+        for extension in (".f32", ".json"):
+            if os.path.exists(path + extension):
+                os.remove(path + extension)
+
+    return written
+
+
+def _payloads(collection: QdrantCollection, ids: List[str], columns: Dict[str, List[any]]) -> List[Dict[str, any]]:
+    return [collection.data_schema(id=id, **{field: values[i] for field, values in columns.items()})
+            .model_dump(exclude={"id", "vector"}) for i, id in enumerate(ids)]
+
+
+def restore(directory: str, connection: sqlite3.Connection,
+            create_collection: Callable[[str], QdrantCollection]) -> Dict[str, any]:
+    """
+    Loads a snapshot written by save: replaces the conversation tables and fills a new
+    collection per agent, and its cold tier, from its memory mapped segments.
+    ARGS:
+        directory: snapshot directory
+        connection: connection of the conversation database
+        create_collection: creates the empty collection of an agent, with an empty cold tier
+    RETURNS:
+        the simulation state stored with the snapshot
+    """
+    manifest = _read_manifest(directory)
+
+    with sqlite3.connect(os.path.join(directory, CONVERSATION_FILE)) as source:
+        source.backup(connection)
+    source.close()
+
+    for agent_name, agent in manifest["agents"].items():
+        collection = create_collection(agent_name)
+        cold_store = collection.cold_store if collection.cold_store is not None else collection.store
+
+        for segment in agent["segments"]:
+            path = os.path.join(directory, agent["directory"], segment)
+            with open(path + ".json", "r") as f:
+                index = json.load(f)
+
+            collection.store.delete(index["deleted"])
+            if cold_store is not collection.store:
+                cold_store.delete(index["deleted"])
+
+            ids: List[str] = index["ids"]
+            cold_ids: List[str] = index["cold_ids"]
+            if ids or cold_ids:
+                vectors = np.memmap(path + ".f32", dtype=np.float32, mode="r",
+                                    shape=(len(ids) + len(cold_ids), index["dimension"]))
+                payloads = _payloads(collection, ids + cold_ids, index["columns"])
+
+                # an entry is in one of the tiers, the one it was written to last
+                if ids:
+                    if cold_store is not collection.store:
+                        cold_store.delete(ids)
+                    collection.store.upsert(ids, vectors[:len(ids)], payloads[:len(ids)])
+                if cold_ids:
+                    if cold_store is not collection.store:
+                        collection.store.delete(cold_ids)
+                    cold_store.upsert(cold_ids, vectors[len(ids):], payloads[len(ids):])
+
+            # the payload goes to the tier that holds the entry by now
+            touched = index["touched"]
+            for id, payload in zip(touched["ids"], _payloads(collection, touched["ids"], touched["columns"])):
+                if cold_store is not collection.store and not collection.store.retrieve(id, with_vector=False):
+                    cold_store.set_payload([id], payload)
+                else:
+                    collection.store.set_payload([id], payload)
+
+    return manifest.get("state", {})
@@ -0,0 +1,647 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from generative_agents.persistence.embedding_table import EmbeddingTable
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def to_number(value) -> float:
+    """ Converts a payload value to a float column value, datetimes to timestamps. """
+    if value is None:
+        return np.nan
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+class StoredPoint(NamedTuple):
+    id: str
+    payload: Dict[str, any]
+    # None unless the vector was requested
+    vector: Optional[List[float]]
+    score: float = 0.0
+
+
+class VectorStore(ABC):
+    """
+    Storage of the memory vectors of one agent. Filters are {payload field: value}
+    dicts, a point matches if all fields are equal to the given values.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, any]]):
+        pass
+
+    @abstractmethod
+    def search(self, query_vector: np.ndarray, limit: int,
+               filter: Optional[Dict[str, any]] = None) -> List[StoredPoint]:
+        """ Returns the <limit> points with the highest cosine similarity, best first, without vectors. """
+        pass
+
+    @abstractmethod
+    def retrieve(self, id: str, with_vector: bool = True) -> Optional[StoredPoint]:
+        pass
+
+    @abstractmethod
+    def set_payload(self, ids: List[str], payload: Dict[str, any]):
+        """ Overwrites the given payload fields of the points without touching the vectors. """
+        pass
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        pass
+
+    @abstractmethod
+    def scan(self) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+        """ Returns the ids, payloads and normalized vectors of all points. """
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def search_columns(self, query_vector: np.ndarray, limit: int, fields: List[str],
+                       filter: Optional[Dict[str, any]] = None) -> Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Like search, but returns the ids, the similarities and the given numeric payload
+        fields of the hits as arrays instead of points.
+        """
+        points = self.search(query_vector, limit, filter)
+        scores = np.array([point.score for point in points], dtype=np.float64)
+        columns = {field: np.array([to_number(point.payload.get(field)) for point in points], dtype=np.float64)
+                   for field in fields}
+        return [point.id for point in points], scores, columns
+
+    def search_columns_many(self, query_vectors: np.ndarray, limit: int, fields: List[str],
+                            filters: List[Optional[Dict[str, any]]]) -> List[List[Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]]]:
+        """
+        search_columns for several queries and filters, result[query][filter].
+        """
+        return [[self.search_columns(query_vector, limit, fields, filter) for filter in filters]
+                for query_vector in query_vectors]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Keeps the normalized vectors in one contiguous matrix and scores a query with a
+    single matrix vector product. Payload fields in <indexed_fields> are kept as
+    integer codes next to the matrix, so filtering on them is a vectorized comparison.
+
+    Above <hnsw_threshold> points the search switches to an HNSW index if hnswlib is
+    installed. The index is updated lazily with the points upserted since the last
+    search.
+
+    Payload fields in <numeric_fields> are also kept as float64 columns (datetimes as
+    timestamps), so search_columns does not touch the payload dicts at all.
+    """
+    _initial_capacity = 256
+
+    def __init__(self, dimension: int, dtype=np.float32, hnsw_threshold: int = 20_000,
+                 indexed_fields: tuple[str, ...] = ("memory_type",),
+                 numeric_fields: tuple[str, ...] = ("created_at", "last_accessed_at", "expiration_date",
+                                                    "importance", "poignancy")):
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.hnsw_threshold = hnsw_threshold
+
+        self._matrix = np.zeros((self._initial_capacity, dimension), dtype=self.dtype)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._payloads: List[Dict[str, any]] = []
+
+        self._codes = {field: np.zeros(self._initial_capacity, dtype=np.int32) for field in indexed_fields}
+        self._code_values: Dict[str, Dict[any, int]] = {field: {} for field in indexed_fields}
+        self._columns = {field: np.zeros(self._initial_capacity, dtype=np.float64) for field in numeric_fields}
+
+        self._hnsw = None
+        self._hnsw_dirty: set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, any]]):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            for id, vector, payload in zip(ids, vectors, payloads):
+                row = self._rows.get(id)
+                if row is None:
+                    row = len(self._ids)
+                    if row == self._capacity:
+                        self._grow()
+
+                self._set_row(row, id, payload, vector)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            deleted = False
+            for id in ids:
+                row = self._rows.pop(id, None)
+                if row is None:
+                    continue
+
+                # move the last row into the gap to keep the matrix contiguous, the
+                # vector is moved as stored instead of being decoded and written again
+                last = len(self._ids) - 1
+                self._release_vector(row)
+                if row != last:
+                    self._set_row(row, self._ids[last], self._load_payload(last))
+                    self._move_vector(last, row)
+                self._truncate(last)
+                deleted = True
+
+            if deleted:
+                # rows were moved, the hnsw index is rebuilt on the next search
+                self._hnsw = None
+                self._hnsw_dirty = set(range(len(self._ids)))
+
+    def scan(self) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+        with self._lock:
+            size = len(self._ids)
+            return (list(self._ids),
+                    [dict(self._load_payload(row)) for row in range(size)],
+                    np.array(self._exact_vectors(np.arange(size)), dtype=np.float32))
+
+    def _set_row(self, row: int, id: str, payload: Dict[str, any], vector: Optional[np.ndarray] = None):
+        """ Writes a row, row == len(self) appends one. Without a vector the vector is kept. """
+        if row == len(self._ids):
+            self._ids.append(id)
+        else:
+            self._ids[row] = id
+        self._rows[id] = row
+        self._store_payload(row, payload)
+
+        for field, codes in self._codes.items():
+            codes[row] = self._code(field, payload.get(field))
+        for field, column in self._columns.items():
+            column[row] = to_number(payload.get(field))
+
+        if vector is not None:
+            self._write_vector(row, vector)
+            self._hnsw_dirty.add(row)
+
+    def _store_payload(self, row: int, payload: Dict[str, any]):
+        if row == len(self._payloads):
+            self._payloads.append(payload)
+        else:
+            self._payloads[row] = payload
+
+    def _load_payload(self, row: int) -> Dict[str, any]:
+        return self._payloads[row]
+
+    def _truncate(self, size: int):
+        del self._ids[size:]
+        del self._payloads[size:]
+
+    def search(self, query_vector: np.ndarray, limit: int,
+               filter: Optional[Dict[str, any]] = None) -> List[StoredPoint]:
+        with self._lock:
+            rows, scores = self._search_rows(query_vector, limit, filter)
+            return [self._point(int(row), float(score), with_vector=False) for row, score in zip(rows, scores)]
+
+    def search_columns(self, query_vector: np.ndarray, limit: int, fields: List[str],
+                       filter: Optional[Dict[str, any]] = None) -> Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]:
+        if any(field not in self._columns for field in fields):
+            return super().search_columns(query_vector, limit, fields, filter)
+
+        with self._lock:
+            rows, scores = self._search_rows(query_vector, limit, filter)
+            return ([self._ids[row] for row in rows],
+                    scores.astype(np.float64),
+                    {field: self._columns[field][rows] for field in fields})
+
+    def search_columns_many(self, query_vectors: np.ndarray, limit: int, fields: List[str],
+                            filters: List[Optional[Dict[str, any]]]) -> List[List[Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]]]:
+        """
+        Scores all queries against all points with a single matrix product and selects
+        the top <limit> of every (query, filter) pair from it.
+        """
+        if any(field not in self._columns for field in fields) or (hnswlib and len(self) >= self.hnsw_threshold):
+            return super().search_columns_many(query_vectors, limit, fields, filters)
+
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            size = len(self._ids)
+            scores = self._scores(queries, size)
+            masks = [self._filter_mask(filter, size) for filter in filters]
+
+            result = []
+            for i in range(queries.shape[0]):
+                per_filter = []
+                for mask in masks:
+                    rows, row_scores = self._select_rows(scores[:, i], limit, mask, queries[i])
+                    per_filter.append(([self._ids[row] for row in rows],
+                                       row_scores.astype(np.float64),
+                                       {field: self._columns[field][rows] for field in fields}))
+                result.append(per_filter)
+
+            return result
+
+    def _search_rows(self, query_vector: np.ndarray, limit: int,
+                     filter: Optional[Dict[str, any]]) -> Tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        query = query / (np.linalg.norm(query) or 1)
+
+        size = len(self._ids)
+        mask = self._filter_mask(filter, size)
+
+        if size and hnswlib and size >= self.hnsw_threshold:
+            limit = min(limit, size if mask is None else int(mask.sum()))
+            if limit <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            return self._search_hnsw(query, limit, mask)
+
+        scores = self._scores(query[np.newaxis], size)[:, 0]
+        return self._select_rows(scores, limit, mask, query)
+
+    def _select_rows(self, scores: np.ndarray, limit: int, mask: Optional[np.ndarray],
+                     query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Selects the result rows of a query from its scores, see _top_rows. """
+        return self._top_rows(scores, limit, mask)
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, limit: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Rows of the <limit> highest scores among the rows in the mask, best first. """
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+
+        limit = min(limit, scores.shape[0] if mask is None else int(mask.sum()))
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.argpartition(-scores, limit - 1)[:limit]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+    def retrieve(self, id: str, with_vector: bool = True) -> Optional[StoredPoint]:
+        with self._lock:
+            row = self._rows.get(id)
+            return self._point(row, with_vector=with_vector) if row is not None else None
+
+    def set_payload(self, ids: List[str], payload: Dict[str, any]):
+        with self._lock:
+            for id in ids:
+                row = self._rows.get(id)
+                if row is not None:
+                    self._set_row(row, id, {**self._load_payload(row), **payload})
+
+    def _point(self, row: int, score: float = 0.0, with_vector: bool = True) -> StoredPoint:
+        vector = self._exact_vectors(np.array([row]))[0].astype(np.float32).tolist() if with_vector else None
+        return StoredPoint(self._ids[row], dict(self._load_payload(row)), vector, score)
+
+    def _code(self, field: str, value) -> int:
+        values = self._code_values[field]
+        if value not in values:
+            values[value] = len(values)
+        return values[value]
+
+    def _filter_mask(self, filter: Optional[Dict[str, any]], size: int) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+
+        mask = np.ones(size, dtype=bool)
+        for field, value in filter.items():
+            if field in self._codes:
+                code = self._code_values[field].get(value, -1)
+                mask &= self._codes[field][:size] == code
+            else:
+                mask &= np.fromiter((self._load_payload(row).get(field) == value for row in range(size)),
+                                    dtype=bool, count=size)
+        return mask
+
+    def _search_hnsw(self, query: np.ndarray, limit: int, mask: Optional[np.ndarray]):
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space="ip", dim=self.dimension)
+            self._hnsw.init_index(max_elements=self._capacity, ef_construction=200, M=16)
+
+        if self._hnsw_dirty:
+            if self._hnsw.get_max_elements() < self._capacity:
+                self._hnsw.resize_index(self._capacity)
+            rows = np.fromiter(self._hnsw_dirty, dtype=np.int64)
+            self._hnsw.add_items(self._vectors(rows).astype(np.float32), rows)
+            self._hnsw_dirty.clear()
+
+        self._hnsw.set_ef(max(64, limit * 2))
+        filter = (lambda row: bool(mask[row])) if mask is not None else None
+        rows, distances = self._hnsw.knn_query(query, k=limit, filter=filter)
+        # hnswlib returns 1 - inner product as distance
+        return rows[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def _grow(self):
+        capacity = self._capacity * 2
+        self._resize_matrix(capacity)
+
+        for field, codes in self._codes.items():
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:codes.shape[0]] = codes
+            self._codes[field] = grown
+
+        for field, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=np.float64)
+            grown[:column.shape[0]] = column
+            self._columns[field] = grown
+
+    @property
+    def _capacity(self) -> int:
+        return self._matrix.shape[0]
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        return self._matrix[rows]
+
+    def _exact_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """ The vectors of the rows in the most exact precision available. """
+        return self._vectors(rows)
+
+    def _write_vector(self, row: int, vector: np.ndarray):
+        self._matrix[row] = vector
+
+    def _move_vector(self, source: int, target: int):
+        self._matrix[target] = self._matrix[source]
+
+    def _release_vector(self, row: int):
+        """ Called before the row of a deleted point is overwritten or truncated. """
+        pass
+
+    def _scores(self, queries: np.ndarray, size: int) -> np.ndarray:
+        """ Similarities of the first <size> rows to the normalized queries, (size, queries). """
+        return (self._matrix[:size] @ queries.T.astype(self.dtype)).astype(np.float32)
+
+    def _resize_matrix(self, capacity: int):
+        matrix = np.zeros((capacity, self.dimension), dtype=self.dtype)
+        matrix[:self._matrix.shape[0]] = self._matrix
+        self._matrix = matrix
+
+
+class SharedNumpyVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore whose vectors live in an EmbeddingTable shared with the stores of
+    the other agents. The store itself only keeps the table row of every point next
+    to the payload columns. The store holds one table reference per point, -1 marks a
+    row without vector.
+
+    If the table keeps its vectors in reduced precision and exact vectors on disk, the
+    <rescore_factor> * limit best candidates are re-scored with the exact vectors.
+    """
+    rescore_factor = 4
+
+    def __init__(self, table: EmbeddingTable, **kwargs):
+        super().__init__(table.dimension, dtype=table.dtype, **kwargs)
+        self.table = table
+        self._matrix = None
+        self._table_rows = np.full(self._initial_capacity, -1, dtype=np.int64)
+
+    @property
+    def _capacity(self) -> int:
+        return self._table_rows.shape[0]
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        return self.table.get(self._table_rows[rows])
+
+    def _exact_vectors(self, rows: np.ndarray) -> np.ndarray:
+        return self.table.exact_vectors(self._table_rows[rows])
+
+    def _write_vector(self, row: int, vector: np.ndarray):
+        # the reference to the replaced vector of an updated point is given back
+        previous = self._table_rows[row]
+        self._table_rows[row] = self.table.intern(vector)[0]
+        if previous >= 0:
+            self.table.release(previous)
+
+    def _move_vector(self, source: int, target: int):
+        self._table_rows[target] = self._table_rows[source]
+        self._table_rows[source] = -1
+
+    def _release_vector(self, row: int):
+        self.table.release(self._table_rows[row])
+        self._table_rows[row] = -1
+
+    def _scores(self, queries: np.ndarray, size: int) -> np.ndarray:
+        return self.table.scores(queries, self._table_rows[:size])
+
+    def _select_rows(self, scores: np.ndarray, limit: int, mask: Optional[np.ndarray],
+                     query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.table.exact:
+            return self._top_rows(scores, limit, mask)
+
+        # re-score the best candidates of the reduced precision scores exactly
+        rows, _ = self._top_rows(scores, limit * self.rescore_factor, mask)
+        exact = self.table.exact_scores(query, self._table_rows[rows])[:, 0]
+        order = np.argsort(-exact, kind="stable")[:limit]
+        return rows[order], exact[order]
+
+    def _resize_matrix(self, capacity: int):
+        table_rows = np.full(capacity, -1, dtype=np.int64)
+        table_rows[:self._table_rows.shape[0]] = self._table_rows
+        self._table_rows = table_rows
+
+
+class DiskVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore that keeps its points on disk, used for the cold tier of the
+    memories. The vectors live in a memory mapped float32 matrix (vectors.f32), the
+    payloads in a sqlite table by row, so only the ids and the indexed and numeric
+    columns are held in memory. The store is reloaded from the directory.
+    """
+
+    def __init__(self, directory: str, dimension: int, **kwargs):
+        super().__init__(dimension, dtype=np.float32, **kwargs)
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+
+        self._connection = sqlite3.connect(os.path.join(directory, "points.sqlite"), check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT, payload TEXT)')
+        self._connection.commit()
+
+        points = self._connection.execute('SELECT row, id, payload FROM points ORDER BY row').fetchall()
+        capacity = self._initial_capacity
+        while capacity < len(points):
+            capacity *= 2
+        del self._matrix
+        self._resize_matrix(capacity)
+        for field in self._codes:
+            self._codes[field] = np.zeros(capacity, dtype=np.int32)
+        for field in self._columns:
+            self._columns[field] = np.zeros(capacity, dtype=np.float64)
+
+        for row, id, payload in points:
+            payload = json.loads(payload)
+            self._ids.append(id)
+            self._rows[id] = row
+            for field, codes in self._codes.items():
+                codes[row] = self._code(field, payload.get(field))
+            for field, column in self._columns.items():
+                column[row] = to_number(payload.get(field))
+        self._hnsw_dirty = set(range(len(self._ids)))
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, any]]):
+        super().upsert(ids, vectors, payloads)
+        self._commit()
+
+    def delete(self, ids: List[str]):
+        super().delete(ids)
+        self._commit()
+
+    def set_payload(self, ids: List[str], payload: Dict[str, any]):
+        super().set_payload(ids, payload)
+        self._commit()
+
+    def _commit(self):
+        with self._lock:
+            self._matrix.flush()
+            self._connection.commit()
+
+    def _store_payload(self, row: int, payload: Dict[str, any]):
+        self._connection.execute('INSERT OR REPLACE INTO points (row, id, payload) VALUES (?, ?, ?)',
+                                 (row, self._ids[row], json.dumps(payload, default=self._serialize)))
+
+    def _load_payload(self, row: int) -> Dict[str, any]:
+        payload, = self._connection.execute('SELECT payload FROM points WHERE row = ?', (row,)).fetchone()
+        return json.loads(payload)
+
+    def _truncate(self, size: int):
+        del self._ids[size:]
+        self._connection.execute('DELETE FROM points WHERE row >= ?', (size,))
+
+    def _resize_matrix(self, capacity: int):
+        if hasattr(self, "_matrix"):
+            self._matrix.flush()
+            del self._matrix
+
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < capacity * 4 * self.dimension:
+                f.truncate(capacity * 4 * self.dimension)
+
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                 shape=(capacity, self.dimension))
+
+    @staticmethod
+    def _serialize(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if hasattr(value, "model_dump"):
+            return value.model_dump()
+        raise TypeError(f"{type(value).__name__} is not json serializable")
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Vector store backed by a qdrant collection, e.g. a local QdrantClient(":memory:")
+    or a qdrant server.
+    """
+    # the local client must not be used from several threads at the same time, the
+    # stores of all agents share it
+    _client_lock = threading.RLock()
+
+    def __init__(self, client: QdrantClient, collection_name: str, dimension: int,
+                 indexed_fields: tuple[str, ...] = ("memory_type",)):
+        self.client = client
+        self.collection_name = collection_name
+        self.dimension = dimension
+
+        with self._client_lock:
+            if collection_name not in [collection.name for collection in self.client.get_collections().collections]:
+                vectors_config = models.VectorParams(size=dimension,
+                                                     distance=models.Distance.COSINE)
+                self.client.create_collection(
+                    collection_name, vectors_config=vectors_config)
+                for field in indexed_fields:
+                    self.client.create_payload_index(
+                        self.collection_name, field_name=field, field_schema="keyword")
+
+    def __len__(self) -> int:
+        with self._client_lock:
+            return self.client.count(collection_name=self.collection_name).count
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, any]]):
+        vectors = np.asarray(vectors, dtype=np.float32).tolist()
+        with self._client_lock:
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=models.Batch(
+                    ids=ids,
+                    payloads=payloads,
+                    vectors=vectors
+                )
+            )
+
+    def search(self, query_vector: np.ndarray, limit: int,
+               filter: Optional[Dict[str, any]] = None) -> List[StoredPoint]:
+        query_filter = None
+        if filter:
+            query_filter = models.Filter(must=[
+                models.FieldCondition(key=field, match=models.MatchValue(value=value))
+                for field, value in filter.items()
+            ])
+
+        try:
+            with self._client_lock:
+                points = self.client.search(collection_name=self.collection_name,
+                                            query_filter=query_filter,
+                                            limit=limit,
+                                            query_vector=np.asarray(query_vector, dtype=np.float32).tolist(),
+                                            with_vectors=False)
+        except Exception as e:
+            raise Exception(f"Error raised by Qdrant: {e}")
+
+        return [StoredPoint(str(point.id), point.payload, point.vector, point.score) for point in points]
+
+    def retrieve(self, id: str, with_vector: bool = True) -> Optional[StoredPoint]:
+        with self._client_lock:
+            points = self.client.retrieve(collection_name=self.collection_name,
+                                          ids=[id],
+                                          with_vectors=with_vector)
+        if not points:
+            return None
+
+        return StoredPoint(str(points[0].id), points[0].payload, points[0].vector)
+
+    def set_payload(self, ids: List[str], payload: Dict[str, any]):
+        with self._client_lock:
+            self.client.set_payload(collection_name=self.collection_name,
+                                    payload=payload,
+                                    points=ids)
+
+    def delete(self, ids: List[str]):
+        with self._client_lock:
+            self.client.delete(collection_name=self.collection_name,
+                               points_selector=models.PointIdsList(points=ids))
+
+    def scan(self) -> Tuple[List[str], List[Dict[str, any]], np.ndarray]:
+        ids, payloads, vectors = [], [], []
+        offset = None
+        while True:
+            with self._client_lock:
+                points, offset = self.client.scroll(collection_name=self.collection_name, limit=256,
+                                                    offset=offset, with_payload=True, with_vectors=True)
+            for point in points:
+                ids.append(str(point.id))
+                payloads.append(point.payload)
+                vectors.append(point.vector)
+            if offset is None:
+                break
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return ids, payloads, vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+UNREACHABLE = np.iinfo(np.uint16).max
+
+TABLES_FILE = "address_distances.npy"
+INDEX_FILE = "address_distances.json"
+
+
+def build_distance_field(walkable: np.ndarray, sources: List[int]) -> np.ndarray:
+    """
+    Breadth first search from all source tiles at once.
+    ARGS:
+        walkable: boolean (height, width) array
+        sources: flat indices of the source tiles
+    RETURNS:
+        uint16 (height, width) array with the number of steps to the closest source,
+        UNREACHABLE for tiles that cannot reach any source
+    """
+    distances = np.full(walkable.shape, UNREACHABLE, dtype=np.uint16)
+    frontier = np.zeros(walkable.shape, dtype=bool)
+    frontier.ravel()[sources] = True
+    visited = frontier.copy()
+    distances[frontier] = 0
+
+    step = 0
+    while frontier.any():
+        step += 1
+        expanded = np.zeros_like(frontier)
+        expanded[1:, :] |= frontier[:-1, :]
+        expanded[:-1, :] |= frontier[1:, :]
+        expanded[:, 1:] |= frontier[:, :-1]
+        expanded[:, :-1] |= frontier[:, 1:]
+        expanded &= walkable & ~visited
+
+        distances[expanded] = step
+        visited |= expanded
+        frontier = expanded
+
+    return distances
+
+
+class DistanceTables:
+    """
+    One distance field per named address of the maze (game objects, arenas, ...).
+
+    Agents only walk to a few hundred named addresses, so the shortest path to any of
+    them is a gradient walk on the precomputed field: from the current tile always
+    step to a neighbour that is one step closer. The fields are built once per map
+    with `python -m generative_agents.simulation.distance_tables` and stored as an
+    .npy file next to the maze folder, which is memory mapped at startup.
+    """
+
+    def __init__(self, addresses: List[str], distances: np.ndarray):
+        self.addresses = {address: i for i, address in enumerate(addresses)}
+        self.distances = distances
+        self.height, self.width = distances.shape[1:]
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.addresses
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def distance(self, address: str, index: int) -> int:
+        return int(self.distances[self.addresses[address]].ravel()[index])
+
+    def walk(self, address: str, start: int) -> List[int]:
+        """
+        Returns the shortest path as flat tile indices from start to the closest tile
+        of the address, start included. Empty if the address is not reachable.
+        """
+        field = self.distances[self.addresses[address]].ravel()
+        current = start
+        distance = int(field[current])
+
+        if distance == UNREACHABLE:
+            return []
+
+        path = [current]
+        while distance > 0:
+            x, y = current % self.width, current // self.width
+            for neighbor, valid in ((current - 1, x > 0),
+                                    (current + 1, x < self.width - 1),
+                                    (current - self.width, y > 0),
+                                    (current + self.width, y < self.height - 1)):
+                if valid and field[neighbor] == distance - 1:
+                    current = neighbor
+                    break
+            distance -= 1
+            path.append(current)
+
+        return path
+
+    @classmethod
+    def build(cls, collision: np.ndarray, address_tiles: Dict[str, List[int]]) -> 'DistanceTables':
+        """
+        Builds the distance fields for all addresses.
+        ARGS:
+            collision: boolean (height, width) collision array of the maze
+            address_tiles: flat tile indices of every address
+        """
+        walkable = ~collision
+        addresses = list(address_tiles)
+        distances = np.empty((len(addresses), *collision.shape), dtype=np.uint16)
+
+        for i, address in enumerate(addresses):
+            distances[i] = build_distance_field(walkable, address_tiles[address])
+
+        return cls(addresses, distances)
+
+    def save(self, folder: str, collision: np.ndarray):
+        np.save(os.path.join(folder, TABLES_FILE), self.distances)
+
+        with open(os.path.join(folder, INDEX_FILE), "w") as f:
+            json.dump({"signature": self.signature(collision, list(self.addresses)),
+                       "addresses": list(self.addresses)}, f, indent=4)
+
+    @classmethod
+    def load(cls, folder: str, collision: np.ndarray, addresses: List[str]) -> Optional['DistanceTables']:
+        """
+        Memory maps the tables of the folder. Returns None if there are no tables or if
+        they were built for a different collision map or address set.
+        """
+        tables_path = os.path.join(folder, TABLES_FILE)
+        index_path = os.path.join(folder, INDEX_FILE)
+
+        if not os.path.exists(tables_path) or not os.path.exists(index_path):
+            return None
+
+        with open(index_path, "r") as f:
+            index = json.load(f)
+
+        if index["signature"] != cls.signature(collision, addresses):
+            print(f"WARNING: {tables_path} is outdated, rebuild it to enable precomputed paths")
+            return None
+
+        return cls(index["addresses"], np.load(tables_path, mmap_mode="r"))
+
+    @staticmethod
+    def signature(collision: np.ndarray, addresses: List[str]) -> str:
+        signature = hashlib.sha1(np.ascontiguousarray(collision, dtype=bool).tobytes())
+        signature.update(json.dumps(sorted(addresses)).encode())
+        return signature.hexdigest()
+
+
+if __name__ == "__main__":
+    from generative_agents.simulation.maze import BASE_PATH, Maze
+
+    maze = Maze()
+    address_tiles = {address: [maze.get_index(tile) for tile in tiles]
+                     for address, tiles in maze.address_tiles.items()}
+
+    tables = DistanceTables.build(maze.collision, address_tiles)
+    tables.save(BASE_PATH, maze.collision)
+    print(f"saved distance tables for {len(tables)} addresses to {BASE_PATH}")
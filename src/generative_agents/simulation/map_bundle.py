@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BUNDLE_FILE = "maze.bundle"
+
+MAGIC = b"GAMAZE\x00\x00"
+VERSION = 1
+ALIGNMENT = 64
+
+# magic, version, length of the json header
+_PREFIX = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def source_files(folder: str) -> List[str]:
+    """
+    The csv files of a map folder the bundle is compiled from, relative to the folder.
+    """
+    files = ["maze_meta_info.json"]
+    for directory in ("special_blocks", "maze"):
+        files += sorted(os.path.join(directory, name) for name in os.listdir(os.path.join(folder, directory))
+                        if name.endswith(".csv"))
+    return files
+
+
+def source_signature(folder: str) -> str:
+    """
+    sha1 over the names, sizes and modification times of the source files of a map
+    folder, used to detect outdated bundles. Only the files are stat'ed, so checking a
+    bundle at startup does not read the csv files it replaces. A fresh checkout of the
+    folder changes the modification times and asks for a recompile.
+    """
+    signature = hashlib.sha1()
+    for name in source_files(folder):
+        stat = os.stat(os.path.join(folder, name))
+        signature.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return signature.hexdigest()
+
+
+def save_bundle(path: str, header: Dict[str, any], arrays: Dict[str, np.ndarray]):
+    """
+    Writes a map bundle: a fixed prefix (magic, version, header length), a json header
+    with the label tables and the layout of the arrays, and the raw arrays, each one
+    aligned to 64 bytes so they can be memory mapped in place.
+    ARGS:
+        path: file to write
+        header: json serializable map information
+        arrays: named numpy arrays
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    encoded_header = json.dumps({**header, "arrays": layout}).encode()
+    data_start = _align(_PREFIX.size + len(encoded_header))
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(encoded_header)))
+        f.write(encoded_header)
+
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    # replace the old bundle only once the new one is complete
+    os.replace(path + ".tmp", path)
+
+
+def load_bundle(path: str) -> Optional[Tuple[Dict[str, any], Dict[str, np.ndarray]]]:
+    """
+    Reads the header of a map bundle and memory maps its arrays.
+    RETURNS:
+        (header, arrays) or None if the file is missing or written by another version
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        magic, version, header_length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC or version != VERSION:
+            print(f"WARNING: {path} is not a version {VERSION} map bundle, recompile it")
+            return None
+        header = json.loads(f.read(header_length))
+
+    data_start = _align(_PREFIX.size + header_length)
+    arrays = {}
+    for name, layout in header.pop("arrays").items():
+        arrays[name] = np.memmap(path, dtype=np.dtype(layout["dtype"]), mode="r",
+                                 offset=data_start + layout["offset"], shape=tuple(layout["shape"]))
+
+    return header, arrays
@@ -3,10 +3,12 @@ from enum import Enum
 from functools import lru_cache
 import heapq
 import json
+import math
 import random
-from typing import List, NamedTuple, Tuple
-from pathfinding.core.grid import Grid, GridNode
-from pathfinding.finder.a_star import AStarFinder
+import threading
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+import numpy as np
 
    # create a tile class holding the following structure 
    # {'world': 'double studio', 
@@ -19,6 +21,8 @@ from pathfinding.finder.a_star import AStarFinder
 # Set current workdir to file location
 import os
 
+from generative_agents.simulation.distance_tables import DistanceTables
+from generative_agents.simulation.map_bundle import BUNDLE_FILE, load_bundle, save_bundle, source_signature
 from generative_agents.utils import get_project_root
 
 BASE_PATH = os.path.join(get_project_root(), "assets/matrix/half_ville")
@@ -33,9 +37,9 @@ MazeInfo = NamedTuple("MazeInfo", [("world_name", str),
                                    ("maze_height", int),
                                    ("sq_tile_size", int)])
 
-def _load_maze_meta_info():
+def _load_maze_meta_info(folder: str = BASE_PATH):
     """load the json file containing the maze meta information"""
-    with open(os.path.join(BASE_PATH, "maze_meta_info.json"), "r") as file:
+    with open(os.path.join(folder, "maze_meta_info.json"), "r") as file:
         data = json.load(file)
     
     return MazeInfo(data["world_name"], data["maze_width"], data["maze_height"], data["sq_tile_size"])
@@ -47,19 +51,82 @@ class Level(Enum):
     GAME_OBJECT = "game_object"
     SPAWNING_LOCATION = "spawning_location"
 
-class Tile:
-    def __init__(self, x,y, world, sector, arena, game_object, spawning_location, collision, events):
+class TileEvents(dict):
+    """
+    The events of one tile. The maze creates the event dict of a tile when it is first
+    asked for and keeps it, there is exactly one per tile. A tile joins the arena event
+    index with its first event and leaves it again with its last one.
+    """
+    __slots__ = ("_maze", "_index")
+
+    def __init__(self, maze: 'Maze', index: int):
         super().__init__()
+        self._maze = maze
+        self._index = index
+
+    def __setitem__(self, key, value):
+        with self._maze._events_lock:
+            super().__setitem__(key, value)
+            self._maze._register_events(self._index)
+
+    def __delitem__(self, key):
+        with self._maze._events_lock:
+            super().__delitem__(key)
+            if not self:
+                self._maze._unregister_events(self._index)
+
+    def pop(self, key, *default):
+        with self._maze._events_lock:
+            value = super().pop(key, *default)
+            if not self:
+                self._maze._unregister_events(self._index)
+            return value
+
+
+class Tile:
+    """
+    Lightweight view on one cell of the maze. All data lives in the arrays of the
+    maze, a tile only knows its coordinates.
+    """
+    __slots__ = ("_maze", "x", "y")
+
+    def __init__(self, maze: 'Maze', x: int, y: int):
+        self._maze = maze
         self.x = x
         self.y = y
-        self.world = world
-        self.sector = sector
-        self.arena = arena
-        self.game_object = game_object
-        self.spawning_location = spawning_location
-        self.collision = collision
-        self.events = events
-    
+
+    @property
+    def index(self) -> int:
+        return self.y * self._maze.maze_width + self.x
+
+    @property
+    def world(self) -> str:
+        return self._maze.world
+
+    @property
+    def sector(self) -> str:
+        return self._maze.labels[Level.SECTOR][self._maze.sector_ids[self.y, self.x]]
+
+    @property
+    def arena(self) -> str:
+        return self._maze.labels[Level.ARENA][self._maze.arena_ids[self.y, self.x]]
+
+    @property
+    def game_object(self) -> str:
+        return self._maze.labels[Level.GAME_OBJECT][self._maze.game_object_ids[self.y, self.x]]
+
+    @property
+    def spawning_location(self) -> str:
+        return self._maze.labels[Level.SPAWNING_LOCATION][self._maze.spawning_location_ids[self.y, self.x]]
+
+    @property
+    def collision(self) -> bool:
+        return bool(self._maze.collision[self.y, self.x])
+
+    @property
+    def events(self) -> TileEvents:
+        return self._maze.get_events(self.index)
+
     def get_unique_name(self):
         address = ""
 
@@ -130,85 +197,164 @@ class Tile:
         return (self.x, self.y) == (other.x, other.y)
     
     def __hash__(self) -> int:
-        return hash((self.get_unique_name, self.x, self.y))
-
-class SimplePathFinder():
-    def __init__(self, grid: List[List[Tile]]):
-        self.grid = grid
-    
-    def find_path(self, start, end):
-        open_set = []
-        closed_set = set()
-        heapq.heappush(open_set, (0, start))
-        came_from = {}
-        g_score = {pos: float('inf') for row in self.grid for pos in row}
-        g_score[start] = 0
-        f_score = {pos: float('inf') for row in self.grid for pos in row}
-        f_score[start] = self._heuristic(start, end)
-
-        while open_set:
-            current = heapq.heappop(open_set)[1]
-
-            if current == end:
-                path = self._reconstruct_path(came_from, current)
-                return path
-
-            closed_set.add(current)
-
-            for neighbor in self._get_neighbors(current):
-                if neighbor in closed_set:
+        return hash((self.x, self.y))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # a tile is a view on the maze, copying it must not copy the maze
+        return self
+
+class GridPathFinder():
+    """
+    A* search on a boolean collision grid with 4-neighbourhood and unit step costs.
+
+    The score buffers are preallocated int32 arrays over all tiles. Instead of
+    resetting them for every search, each search gets a new generation number and a
+    buffer entry is only valid if its stamp matches the current generation.
+
+    Paths are returned as lists of flat tile indices (y * width + x), start included.
+    """
+    # above this number of targets the heuristic costs more than it saves
+    _max_heuristic_targets = 8
+
+    def __init__(self, collision: np.ndarray):
+        self.height, self.width = collision.shape
+        size = self.height * self.width
+        walkable = ~collision.ravel()
+
+        self._g_score = np.zeros(size, dtype=np.int32)
+        self._came_from = np.zeros(size, dtype=np.int32)
+        self._seen = np.zeros(size, dtype=np.int32)
+        self._closed = np.zeros(size, dtype=np.int32)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        # walkable neighbours of every tile as plain python lists, the inner loop of
+        # the search is faster with python ints than with numpy scalars
+        self._neighbors = []
+        for index in range(size):
+            x, y = index % self.width, index // self.width
+            neighbors = []
+            if x > 0 and walkable[index - 1]:
+                neighbors.append(index - 1)
+            if x < self.width - 1 and walkable[index + 1]:
+                neighbors.append(index + 1)
+            if y > 0 and walkable[index - self.width]:
+                neighbors.append(index - self.width)
+            if y < self.height - 1 and walkable[index + self.width]:
+                neighbors.append(index + self.width)
+            self._neighbors.append(neighbors)
+
+    def find_path(self, start: int, end: int) -> List[int]:
+        return self.find_path_to_nearest(start, [end])
+
+    def find_path_to_nearest(self, start: int, targets: List[int]) -> List[int]:
+        """
+        Returns the shortest path from start to the closest of the targets, or an
+        empty list if none of them is reachable.
+        """
+        targets = set(targets)
+        if not targets:
+            return []
+
+        if len(targets) <= self._max_heuristic_targets:
+            target_coordinates = [(target % self.width, target // self.width) for target in targets]
+
+            def heuristic(index):
+                x, y = index % self.width, index // self.width
+                return min(abs(x - tx) + abs(y - ty) for tx, ty in target_coordinates)
+        else:
+            def heuristic(index):
+                return 0
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            g_score, came_from, seen, closed = self._g_score, self._came_from, self._seen, self._closed
+
+            seen[start] = generation
+            g_score[start] = 0
+            came_from[start] = -1
+            open_set = [(heuristic(start), start)]
+
+            while open_set:
+                _, current = heapq.heappop(open_set)
+
+                if closed[current] == generation:
                     continue
 
-                tentative_g_score = g_score[current] + 1
+                if current in targets:
+                    return self._reconstruct_path(came_from, current)
 
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = g_score[neighbor] + self._heuristic(neighbor, end)
-                    if neighbor not in [pos for _, pos in open_set]:
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor))
+                closed[current] = generation
+                tentative_g_score = int(g_score[current]) + 1
 
-        return []
+                for neighbor in self._neighbors[current]:
+                    if closed[neighbor] == generation:
+                        continue
 
-    @staticmethod
-    def _heuristic(start, end):
-        return abs(start.x - end.x) + abs(start.y - start.y)
-
-    def _get_neighbors(self, pos):
-        neighbors = []
-        x = pos.x
-        y = pos.y
-
-        if x > 0 and self.grid[y][x - 1].is_walkable():
-            neighbors.append(self.grid[y][x - 1])
-        if x < len(self.grid[0]) - 1 and self.grid[y][x + 1].is_walkable():
-            neighbors.append(self.grid[y][x + 1])
-        if y > 0 and self.grid[y - 1][x].is_walkable():
-            neighbors.append(self.grid[y - 1][x])
-        if y < len(self.grid) - 1 and self.grid[y + 1][x].is_walkable():
-            neighbors.append(self.grid[y + 1][x])
-        return neighbors
+                    if seen[neighbor] != generation or tentative_g_score < g_score[neighbor]:
+                        seen[neighbor] = generation
+                        g_score[neighbor] = tentative_g_score
+                        came_from[neighbor] = current
+                        heapq.heappush(open_set, (tentative_g_score + heuristic(neighbor), neighbor))
+
+        return []
 
     @staticmethod
-    def _reconstruct_path(came_from, current):
+    def _reconstruct_path(came_from: np.ndarray, current: int) -> List[int]:
         path = [current]
-        while current in came_from:
-            current = came_from[current]
+        while came_from[current] >= 0:
+            current = int(came_from[current])
             path.append(current)
         return path[::-1]
 
 
 class Maze:
-    def __init__(self):
-        maze_info = _load_maze_meta_info()
+    def __init__(self, folder: str = BASE_PATH, use_bundle: bool = True):
+        """
+        ARGS:
+            folder: map folder with the maze csv files
+            use_bundle: load the compiled map bundle of the folder if it is up to date
+                        (see manual_mapping/compile_map.py), parse the csv files otherwise
+        """
+        maze_info = _load_maze_meta_info(folder)
         self.maze_name = maze_info.world_name
         self.maze_width = maze_info.maze_width
         self.maze_height = maze_info.maze_height
         self.tile_size = maze_info.sq_tile_size
 
-        self.finder = AStarFinder()
         self.maze = []
 
+        # Events only exist on a few tiles, so they are kept in a sparse map from the
+        # flat tile index to the events of that tile, filled as the tiles are asked for.
+        # <self.arena_events> indexes the tiles with events by their arena (see
+        # get_arena_key) for perception queries. Agents are updated concurrently, the
+        # lock guards both maps and the changes of the event dicts.
+        self.events: Dict[int, TileEvents] = dict()
+        self.arena_events: Dict[int, Set[int]] = dict()
+        self._events_lock = threading.RLock()
+
+        if not (use_bundle and self._load_bundle(folder)):
+            self._load_csv(folder)
+
+        self.finder = GridPathFinder(self.collision)
+        self.distance_tables = DistanceTables.load(folder, self.collision, list(self.address_tiles))
+
+        self.__visualize_grid_as_csv()
+
+        #f = self.address_tiles["the Ville:Moreno family's house:common room"][0]
+        #t = self.address_tiles["the Ville:artist's co-living space:Abigail Chen's room"][0]
+
+        #path = self.find_path(f, t)
+        #print(self.grid)
+
+    def _load_csv(self, folder: str):
+        """
+        Parses the special blocks and maze csv files of the map folder.
+        """
         # READING IN SPECIAL BLOCKS
         # Special blocks are those that are colored in the Tiled map. 
 
@@ -221,7 +367,7 @@ class Maze:
         # Tiled export. Then we basically have the block path: 
         # World, Sector, Arena, Game Object -- again, these paths need to be 
         # unique within an instance of Reverie. 
-        blocks_folder = os.path.join(BASE_PATH, "special_blocks")
+        blocks_folder = os.path.join(folder, "special_blocks")
 
         world_blocks = self.read_special_blocks(blocks_folder + "/world_blocks.csv")
         world_block = world_blocks[0][-1]
@@ -241,7 +387,7 @@ class Maze:
         # [SECTION 3] Reading in the matrices 
         # This is your typical two dimensional matrices. It's made up of 0s and 
         # the number that represents the color block from the blocks folder. 
-        maze_folder = os.path.join(BASE_PATH, "maze")
+        maze_folder = os.path.join(folder, "maze")
 
         collision_maze_raw = self.read_special_blocks(maze_folder + "/collision_maze.csv")[0]
         sector_maze_raw = self.read_special_blocks(maze_folder + "/sector_maze.csv")[0]
@@ -249,42 +395,24 @@ class Maze:
         game_object_maze_raw = self.read_special_blocks(maze_folder + "/game_object_maze.csv")[0]
         spawning_location_maze_raw = self.read_special_blocks(maze_folder + "/spawning_location_maze.csv")[0]
 
-        # [SECTION 4] Converting the matrices to 2d lists
-        # We need to convert the matrices to 2d lists.
-        # We also need to convert the 0s to None.
+        # [SECTION 4] Converting the matrices to label id arrays
+        # Every label (e.g. the name of an arena) is interned once in <self.labels>,
+        # the maze itself only stores uint16 label ids per tile. Id 0 is the empty
+        # label of tiles that do not belong to any block.
+        self.world = world_block
+        self.labels = {Level.SECTOR: [""], Level.ARENA: [""], Level.GAME_OBJECT: [""], Level.SPAWNING_LOCATION: [""]}
 
-        collision_maze = self.convert_flat_list_to_2d_list(collision_maze_raw, self.maze_width)
-        sector_maze = self.convert_flat_list_to_2d_list(sector_maze_raw, self.maze_width)
-        arena_maze = self.convert_flat_list_to_2d_list(arena_maze_raw, self.maze_width)
-        game_object_maze = self.convert_flat_list_to_2d_list(game_object_maze_raw, self.maze_width)
-        spawning_location_maze = self.convert_flat_list_to_2d_list(spawning_location_maze_raw, self.maze_width)
+        self.sector_ids = self._to_label_ids(sector_maze_raw, sector_blocks_dict, self.labels[Level.SECTOR])
+        self.arena_ids = self._to_label_ids(arena_maze_raw, arena_blocks_dict, self.labels[Level.ARENA])
+        self.game_object_ids = self._to_label_ids(game_object_maze_raw, game_object_blocks_dict, self.labels[Level.GAME_OBJECT])
+        self.spawning_location_ids = self._to_label_ids(spawning_location_maze_raw, spawning_location_blocks_dict, self.labels[Level.SPAWNING_LOCATION])
+        self.collision = (np.array(collision_maze_raw) != "0").reshape(self.maze_height, self.maze_width)
 
         # [SECTION 5] Creating the maze
-        # We need to create the maze.
-        
-        self.tiles = []
-        
-        self.grid = Grid(self.maze_width, self.maze_height)
-
-        for i in range(self.maze_height):
-            row = []
-            for j in range(self.maze_width):
-                sector = sector_blocks_dict[sector_maze[i][j]] if sector_maze[i][j] in sector_blocks_dict else ""
-                arena = arena_blocks_dict[arena_maze[i][j]] if arena_maze[i][j] in arena_blocks_dict else ""
-                game_object = game_object_blocks_dict[game_object_maze[i][j]] if game_object_maze[i][j] in game_object_blocks_dict else ""
-                spawning_location = spawning_location_blocks_dict[spawning_location_maze[i][j]] if spawning_location_maze[i][j] in spawning_location_blocks_dict else ""
-                collision = collision_maze[i][j] != "0"
-                row += [Tile(j, i, world_block, sector, arena, game_object, spawning_location, collision, dict())]           
-                node = self.grid.node(j,i)
-                node.walkable = not collision
-                node.weight = 0 if collision else 1
-
-            self.tiles += [row]
-
         # Reverse tile access. 
         # <self.address_tiles> -- given a string address, we return a set of all 
         # tile coordinates belonging to that address (this is opposite of  
-        # self.tiles that give you the string address given a coordinate). This is
+        # the label arrays that give you the string address given a coordinate). This is
         # an optimization component for finding paths for the personas' movement. 
         # self.address_tiles['<spawn_loc>bedroom-2-a'] == {(58, 9)}
         # self.address_tiles['double studio:recreation:pool table'] 
@@ -292,27 +420,81 @@ class Maze:
         
         self.address_tiles = dict()
 
-        for row in self.tiles:
-            for tile in row:
-                if tile.collision:
-                    continue
+        for y, x in zip(*np.nonzero(~self.collision)):
+            tile = Tile(self, int(x), int(y))
+            address = tile.get_unique_name()
 
-                address = tile.get_unique_name()
+            if address in self.address_tiles: 
+                self.address_tiles[address].append(tile)
+            else: 
+                self.address_tiles[address] = [tile]
 
-                if address in self.address_tiles: 
-                    self.address_tiles[address].append(tile)
-                else: 
-                    self.address_tiles[address] = [tile]
+    def _load_bundle(self, folder: str) -> bool:
+        """
+        Memory maps the compiled map bundle of the folder.
+        RETURNS:
+            False if there is no bundle or it was compiled from other csv files
+        """
+        bundle_path = os.path.join(folder, BUNDLE_FILE)
+        bundle = load_bundle(bundle_path)
 
-        self.finder = SimplePathFinder(self.tiles)
+        if not bundle:
+            return False
 
-        self.__visualize_grid_as_csv()
+        header, arrays = bundle
+        if header["signature"] != source_signature(folder):
+            print(f"WARNING: {bundle_path} is outdated, recompile it with manual_mapping/compile_map.py")
+            return False
 
-        #f = self.address_tiles["the Ville:Moreno family's house:common room"][0]
-        #t = self.address_tiles["the Ville:artist's co-living space:Abigail Chen's room"][0]
+        self.world = header["world"]
+        self.labels = {Level(level): labels for level, labels in header["labels"].items()}
 
-        #path = self.find_path(f, t)
-        #print(self.grid)
+        self.sector_ids = arrays["sector_ids"]
+        self.arena_ids = arrays["arena_ids"]
+        self.game_object_ids = arrays["game_object_ids"]
+        self.spawning_location_ids = arrays["spawning_location_ids"]
+        self.collision = arrays["collision"]
+
+        offsets = arrays["address_offsets"].tolist()
+        indices = arrays["address_indices"].tolist()
+
+        self.address_tiles = dict()
+        for i, address in enumerate(header["addresses"]):
+            self.address_tiles[address] = [Tile(self, index % self.maze_width, index // self.maze_width)
+                                           for index in indices[offsets[i]:offsets[i + 1]]]
+
+        return True
+
+    def save_bundle(self, folder: str) -> str:
+        """
+        Compiles the maze into a map bundle in the folder, which is loaded instead of
+        the csv files from then on.
+        RETURNS:
+            path of the bundle
+        """
+        addresses = list(self.address_tiles)
+        offsets = np.cumsum([0] + [len(self.address_tiles[address]) for address in addresses])
+        indices = [self.get_index(tile) for address in addresses for tile in self.address_tiles[address]]
+
+        header = {
+            "signature": source_signature(folder),
+            "world": self.world,
+            "labels": {level.value: labels for level, labels in self.labels.items()},
+            "addresses": addresses,
+        }
+        arrays = {
+            "sector_ids": self.sector_ids,
+            "arena_ids": self.arena_ids,
+            "game_object_ids": self.game_object_ids,
+            "spawning_location_ids": self.spawning_location_ids,
+            "collision": self.collision,
+            "address_offsets": np.asarray(offsets, dtype=np.int32),
+            "address_indices": np.asarray(indices, dtype=np.int32),
+        }
+
+        bundle_path = os.path.join(folder, BUNDLE_FILE)
+        save_bundle(bundle_path, header, arrays)
+        return bundle_path
 
     def filter_address_tiles(self, fuzzy_address: str) -> List[Tile]:
         """
@@ -324,18 +506,18 @@ class Maze:
         """
         return {address: tiles for address, tiles in self.address_tiles.items() if fuzzy_address in address}
 
-    def get_random_tile(self, tile=None) -> Tile:
+    def get_random_tile(self, tile=None, rng: random.Random = random) -> Tile:
         """
         returns a random tile from the maze and make sure it is not the same as the tile given
         """
-        tiles = self.address_tiles[list(self.address_tiles)[random.randint(0, len(self.address_tiles) - 1)]]
+        tiles = self.address_tiles[list(self.address_tiles)[rng.randint(0, len(self.address_tiles) - 1)]]
 
         if tile:
             while True:
-                random_tile = tiles[random.randint(0, len(tiles) - 1)]
+                random_tile = tiles[rng.randint(0, len(tiles) - 1)]
                 if random_tile != tile:
                     return random_tile
-        return tiles[random.randint(0, len(tiles) - 1)]
+        return tiles[rng.randint(0, len(tiles) - 1)]
     
     def find_path(self, start: Tile, end: Tile) -> List[Tile]:
         """
@@ -347,21 +529,38 @@ class Maze:
             List of tiles representing the path
         """
 
-        path = self.finder.find_path(start, end)
-        
-        tiles = []
-        for node in path:
-            tiles += [self.get_tile(node.x, node.y)]
-
-        return tiles
+        return self.find_path_to_nearest(start, [end])
     
-    @lru_cache(maxsize=1000)
-    def _find_path(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[GridNode]:
-        start_node = self.grid.node(start[0], start[1])
-        end_node = self.grid.node(end[0], end[1])
+    def find_path_to_address(self, start: Tile, address: str) -> List[Tile]:
+        """
+        Calculates the path to the closest tile of a named address. Addresses with a
+        precomputed distance table are resolved by a gradient walk without search.
+        ARGS:
+            start: start tile
+            address: an address of <self.address_tiles>
+        RETURNS:
+            List of tiles representing the path, empty if the address is not reachable
+        """
+        if self.distance_tables and address in self.distance_tables:
+            path = self.distance_tables.walk(address, self.get_index(start))
+            return [self.get_tile(index % self.maze_width, index // self.maze_width) for index in path]
+
+        return self.find_path_to_nearest(start, self.address_tiles[address])
+
+    def find_path_to_nearest(self, start: Tile, targets: List[Tile]) -> List[Tile]:
+        """
+        Calculates the path to the closest of several target tiles in one search.
+        ARGS:
+            start: start tile
+            targets: candidate end tiles
+        RETURNS:
+            List of tiles representing the path, empty if no target is reachable
+        """
+        path = self.finder.find_path_to_nearest(self.get_index(start),
+                                                [self.get_index(target) for target in targets])
+
+        return [self.get_tile(index % self.maze_width, index // self.maze_width) for index in path]
 
-        return self.finder.find_path(start_node, end_node, self.grid)
-        
 
     @lru_cache(maxsize=1000)
     def get_nearby_tiles(self, tile, vision_radius): 
@@ -417,9 +616,9 @@ class Maze:
         sep: separator for the csv file
         """
         out = ""
-        for i in range(self.grid.width):
-            for j in range(self.grid.height):
-                out += str(int(self.grid.node(i, j).walkable))+sep
+        for i in range(self.maze_width):
+            for j in range(self.maze_height):
+                out += str(int(not self.collision[j, i]))+sep
             out += "\n"
         
         #write csv
@@ -469,7 +668,86 @@ class Maze:
             print(row)
 
     def get_tile(self, x, y):
-        return self.tiles[y][x]
+        return Tile(self, x, y)
+
+    def get_events(self, index: int) -> TileEvents:
+        """
+        Returns the events of the tile with the given flat index, the same TileEvents
+        for every call.
+        """
+        events = self.events.get(index)
+        if events is None:
+            with self._events_lock:
+                events = self.events.setdefault(index, TileEvents(self, index))
+        return events
+
+    def get_arena_key(self, x: int, y: int) -> int:
+        """
+        Returns an integer key that is equal for all tiles with the same arena path
+        (world:sector:arena), without building the path.
+        """
+        return int(self.sector_ids[y, x]) << 16 | int(self.arena_ids[y, x])
+
+    def get_nearby_events(self, tile: Tile, vision_radius: int, limit: int = None) -> List[Tuple[float, Tile]]:
+        """
+        Returns the tiles with events within the vision radius (the same square as
+        get_nearby_tiles) that are in the same arena as the given tile.
+        INPUT: 
+            tile: the tile of the observer
+            vision_radius: An integer representing the vision radius.
+            limit: return only the closest <limit> tiles
+        OUTPUT:
+            (distance, tile) pairs sorted by distance, ties in the order of get_nearby_tiles
+        """
+        nearby = []
+
+        with self._events_lock:
+            indices = list(self.arena_events.get(self.get_arena_key(tile.x, tile.y), ()))
+
+        for index in indices:
+            x, y = index % self.maze_width, index // self.maze_width
+
+            if abs(x - tile.x) > vision_radius or abs(y - tile.y) > vision_radius or self.collision[y, x]:
+                continue
+
+            nearby.append((math.dist((x, y), (tile.x, tile.y)), x, y))
+
+        nearby.sort()
+        return [(dist, Tile(self, x, y)) for dist, x, y in nearby[:limit]]
+
+    def _register_events(self, index: int):
+        arena_key = self.get_arena_key(index % self.maze_width, index // self.maze_width)
+        self.arena_events.setdefault(arena_key, set()).add(index)
+
+    def _unregister_events(self, index: int):
+        arena_key = self.get_arena_key(index % self.maze_width, index // self.maze_width)
+        tiles = self.arena_events.get(arena_key)
+        if tiles is None:
+            return
+
+        tiles.discard(index)
+        if not tiles:
+            del self.arena_events[arena_key]
+
+    def _to_label_ids(self, raw: List[str], blocks: Dict[str, str], labels: List[str]) -> np.ndarray:
+        """
+        Converts the raw block markers of a maze csv to label ids and interns the
+        labels in <labels>.
+        """
+        label_ids = {label: i for i, label in enumerate(labels)}
+        marker_ids = {}
+
+        for marker in dict.fromkeys(raw):
+            label = blocks.get(marker, "")
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+            marker_ids[marker] = label_ids[label]
+
+        return np.array([marker_ids[marker] for marker in raw], dtype=np.uint16).reshape(self.maze_height, self.maze_width)
+
+    def get_index(self, tile: Tile) -> int:
+        return tile.y * self.maze_width + tile.x
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Dict, Tuple
+
+from generative_agents import global_state
+from generative_agents.simulation.maze import Maze, Tile
+
+
+class RoundScheduler:
+    """
+    Updates all agents of a round concurrently and applies their results in a
+    deterministic commit phase afterwards.
+
+    Every agent perceives, retrieves, plans and executes against the state of the
+    round start: tile events and agent positions are only written during the commit
+    phase, and the other agents are handed over as frozen copies. Reactions that
+    change another agent (e.g. answering a chat) are queued by the acting agent and
+    replayed in the commit phase. The commit phase walks the agents in their
+    registration order, so a round produces the same result no matter in which order
+    the concurrent updates finish or how many workers run them.
+
+    This is not the result of the serial update loop: there an agent already sees the
+    moves and actions of the agents updated before it in the same round, here it sees
+    them one round later.
+
+    An agent takes part in at most one reaction per round: the first initiator in
+    registration order wins, the reactions of an agent that was reacted on and
+    reactions on an agent that is already engaged are dropped. A dropped chat is
+    rolled back, the initiator gets its previous action back, its chat memory is
+    removed and it stays on its tile for the round.
+
+    max_concurrency caps the number of agents updated at the same time. An agent runs
+    its independent LLM calls concurrently on the shared TaskGraph pool, so this does
+    not cap the requests to the LLM backend, LLMClient.max_in_flight does.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="agent-update")
+
+    def run_round(self, agent_runners: Dict[str, 'AgentRunner'], maze: Maze):
+        """
+        Runs one round for all agents.
+        INPUT:
+            agent_runners: the agent runners of the simulation, keyed by agent name
+            maze: the maze the agents live in
+        """
+        agents = {name: agent_runner.agent for name, agent_runner in agent_runners.items()}
+        snapshots = {name: self._snapshot(agent) for name, agent in agents.items()}
+
+        for name, agent in agents.items():
+            # seed per agent and tick so random choices do not depend on thread timing
+            agent.scratch.rng.seed(f"{global_state.tick}:{name}")
+
+        futures = {name: self._executor.submit(self._update, agent_runner, maze, snapshots)
+                   for name, agent_runner in agent_runners.items()}
+
+        # collect in registration order - exceptions of an agent update are raised here
+        updates = [(name, *futures[name].result()) for name in agent_runners]
+
+        # agents that initiated or received a reaction in this round
+        engaged: set[str] = set()
+        committed: set[str] = set()
+        for name, next_tile, duration in updates:
+            self._commit(agents[name], next_tile, maze, agents, engaged, committed)
+            committed.add(name)
+            print("updated agent in: ", duration, " seconds")
+
+    @staticmethod
+    def _update(agent_runner: 'AgentRunner', maze: Maze, snapshots: Dict[str, 'Agent']) -> Tuple[Tile, float]:
+        start = time()
+        agent = agent_runner.agent
+        print(f"scheduling update for {agent.name}")
+
+        # the agent itself is live, everybody else is seen as of the round start
+        agents = [agent if name == agent.name else snapshot for name, snapshot in snapshots.items()]
+        next_tile = agent_runner.update(global_state.time, maze, agents)
+
+        return next_tile, time() - start
+
+    @staticmethod
+    def _snapshot(agent: 'Agent') -> 'Agent':
+        """
+        Returns a frozen view of the agent. The cognitive components replace the
+        scratch attributes (action, tile, ...), but some containers are changed in
+        place (e.g. chatting_with_buffer, finished_action), so every list, dict and set
+        of the scratch is copied. Their elements are values or objects that are
+        replaced as well.
+        """
+        frozen = copy.copy(agent)
+        frozen.scratch = copy.copy(agent.scratch)
+        # chatting_with_buffer is a class attribute until it is first assigned
+        for name in [*vars(agent.scratch), "chatting_with_buffer"]:
+            value = getattr(agent.scratch, name)
+            if isinstance(value, (list, dict, set)):
+                setattr(frozen.scratch, name, copy.copy(value))
+        return frozen
+
+    @staticmethod
+    def _commit(agent: 'Agent', next_tile: Tile, maze: Maze, agents: Dict[str, 'Agent'],
+                engaged: set[str], committed: set[str]):
+        while agent.scratch.pending_reactions:
+            target, reaction, rollback = agent.scratch.pending_reactions.pop(0)
+            if agent.name in engaged or target in engaged:
+                # the agent gets its previous action back and stays where it is, its
+                # path is continued in the next round
+                rollback()
+                next_tile = agent.scratch.tile
+                continue
+
+            reaction(agents)
+            engaged.update((agent.name, target))
+            if target in committed:
+                # the target's events are already placed, they are placed again
+                # with the action of the reaction
+                RoundScheduler._place_events(agents[target], agents[target].scratch.tile)
+
+        old_tile = agent.scratch.tile
+        RoundScheduler._place_events(agent, next_tile)
+
+        object_action = agent.scratch.action.object_action
+        if object_action and object_action.event:
+            object_event = object_action.event
+            if object_action.address in maze.address_tiles:
+                maze.address_tiles[object_action.address][0].events[object_event.subject] = object_event
+            else:
+                print(f"WARNING: {object_action.address} not in maze")
+
+        agent.scratch.tile = next_tile
+
+        print(agent.name.center(80, "-"))
+        if old_tile != next_tile:
+            print(f"{agent.scratch.name} moved from {old_tile} to {next_tile}")
+        else:
+            print(f"{agent.scratch.name} is still at {next_tile}")
+        print(f"{agent.scratch.name} is {agent.emoji}")
+        print(f"{agent.scratch.name} is {agent.description}")
+
+    @staticmethod
+    def _place_events(agent: 'Agent', next_tile: Tile):
+        """ Removes the events of the agent's finished actions and places its current one on <next_tile>. """
+        old_tile = agent.scratch.tile
+
+        while agent.scratch.finished_action:
+            action = agent.scratch.finished_action.pop(0)
+            if action.event.subject in old_tile.events:
+                del old_tile.events[action.event.subject]
+
+        event = agent.scratch.action.event
+        next_tile.events[event.subject] = agent.scratch.action.event